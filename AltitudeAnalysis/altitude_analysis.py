@@ -32,7 +32,7 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
 
 from plot_performance import plot_time_vs_massflow, plot_power_vs_altitude, plot_power_vs_time
-from classes import Regime
+from classes import Regime, DesignBatch
 from spacecraft import spacecraft
 
 # Problem constants
@@ -50,6 +50,38 @@ def Get_Drag(Regime:Regime, sc_parameters:dict) -> np.ndarray:
     return 0.5 * Regime.atmos() * Regime.v_circ()**2 * sc_parameters['A_ref'] * sc_parameters['C_D']
 
 
+# Find where a quantity that decreases with altitude drops below a limit
+def Get_LimitIdx(Q:np.ndarray, limit:np.ndarray, strict:bool=False) -> np.ndarray:
+    """
+    This function finds, for each limit, the index of the first altitude at which Q is below the limit.
+    It gives the same result as np.argmax(Q[None, :] <= limit[:, None], axis=1) but without building that matrix,
+    using a binary search over Q instead, so it takes O(len(limit) * log(len(Q))) time and no extra memory.
+    Q is expected to decrease with altitude, like the drag does. If it doesn't, the search is done over its running minimum,
+    which crosses every limit at the same index as Q, so the result is the same.
+
+    INPUTS:
+        Q: quantity at each altitude, for example the drag in N. This is a one dimensional array,
+           or a two dimensional array with one profile per row (for example one per epoch).
+        limit: limits to compare Q with, for example the thrust in N. This is a scalar or a one dimensional array.
+        strict: if True, look for Q < limit instead of Q <= limit.
+
+    OUTPUTS:
+        idx: index of the first altitude where Q is below each limit, or Q.shape[-1] if it never is.
+             For a two dimensional Q there is one row of indices per profile.
+    """
+
+    # Several profiles are searched one by one
+    if np.ndim(Q) > 1:
+        return np.stack([Get_LimitIdx(q, limit, strict) for q in Q])
+
+    # Non-monotone profiles are replaced by their running minimum
+    if np.any(np.diff(Q) > 0):
+        Q = np.minimum.accumulate(Q)
+
+    # searchsorted needs increasing values, so search over -Q
+    return np.searchsorted(-Q, -np.asarray(limit), side='right' if strict else 'left')
+
+
 # Calculate the mass flow rate gain for an array of altitudes
 def Getm_gain(Regime:Regime, sc_parameters:dict) -> tuple:
 
@@ -67,9 +99,9 @@ def Getm_gain(Regime:Regime, sc_parameters:dict) -> tuple:
         earth_parameters: dictionary with the Earth parameters.
 
     OUTPUTS:
-        m_gain: the mass flow rate gain in kg/s. This is a one dimensional array.
-        m_in: the intake mass flow rate in kg/s. This is a one dimensional array.
-        m_out: the thruster mass flow rate in kg/s. This is a one dimensional array.
+        m_gain: the mass flow rate gain in kg/s. This is a one dimensional array, or n_epochs x len(h) if the regime has several epochs.
+        m_in: the intake mass flow rate in kg/s. Same shape as m_gain.
+        m_out: the thruster mass flow rate in kg/s. Same shape as m_gain.
     """
 
     # Unpack the spacecraft parameters
@@ -97,8 +129,93 @@ def Getm_gain(Regime:Regime, sc_parameters:dict) -> tuple:
     return m_gain, m_in, m_out
 
 
+# Calculate the heating rate
+def Get_Heating(Regime:Regime, sc_parameters:dict) -> np.ndarray:
+    # WORK IN PROGRESS, no heating model yet
+    return np.zeros_like(Regime.h)
+
+
+# Refine where a quantity that decreases with altitude crosses a limit
+def _SolveLimit(Regime:Regime, sc_parameters:dict, quantity, limit:np.ndarray,
+                tol:float=1e-4, max_iter:int=50) -> tuple[np.ndarray, int]:
+    """
+    This function finds the altitude at which quantity(Regime, sc_parameters) is equal to each limit.
+    The crossing is bracketed using the altitudes of the regime, which are already calculated, and then refined
+    with the Illinois method on the log of the quantity, which is almost linear with altitude for drag.
+    Every iteration solves all the limits at once, so NRLMSIS only runs once per iteration.
+
+    INPUTS:
+        Regime: Regime object used to bracket the solutions. A coarse grid of altitudes is enough.
+                If it has several epochs, each epoch is solved on its own (like Get_LimitIdx does with several profiles).
+        sc_parameters: dictionary with the spacecraft parameters.
+        quantity: function like Get_Drag, taking a Regime and the spacecraft parameters.
+        limit: value of the quantity to find. This is a scalar or a one dimensional array.
+        tol: tolerance on the altitude in km.
+        max_iter: maximum number of iterations.
+
+    OUTPUTS:
+        h_limit: altitude in km where the quantity is equal to each limit. If the quantity is below the limit over
+                the whole regime this is the lowest altitude, if it is never below the limit this is NaN.
+                If the quantity has one profile per epoch there is one row of altitudes per epoch.
+        n_evals: number of times the quantity was evaluated (and NRLMSIS was run) apart from the regime itself.
+    """
+
+    h = Regime.h
+    Q = quantity(Regime, sc_parameters)
+    limit = np.atleast_1d(np.asarray(limit, dtype=float))
+
+    # Several epochs are solved one by one, the atmosphere of each epoch is already stored in the regime
+    if np.ndim(Q) > 1:
+        solutions = [_SolveLimit(Regime.with_epoch(i), sc_parameters, quantity, limit, tol, max_iter) for i in range(len(Q))]
+        return np.stack([h_limit for h_limit, _ in solutions]), sum(n_evals for _, n_evals in solutions)
+
+    # Bracket the crossings with the regime altitudes
+    idx = Get_LimitIdx(Q, limit, strict=True)
+    h_limit = np.where(idx == 0, h[0], np.nan)
+    active = np.flatnonzero((idx > 0) & (idx < len(h)))
+
+    # Lower end of the bracket has Q >= limit (f >= 0), upper end has Q < limit (f < 0)
+    a, b = h[idx[active] - 1], h[idx[active]]
+    log_limit = np.log(limit[active])
+    with np.errstate(divide='ignore'):
+        fa, fb = np.log(Q[idx[active] - 1]) - log_limit, np.log(Q[idx[active]]) - log_limit
+    side = np.zeros(len(active))
+
+    n_evals = 0
+    while len(active) > 0 and n_evals < max_iter:
+
+        # Secant step, or bisection if the secant can't be used
+        with np.errstate(invalid='ignore', divide='ignore'):
+            c = b - fb * (b - a) / (fb - fa)
+        c = np.where(np.isfinite(c) & (c > a) & (c < b), c, 0.5 * (a + b))
+
+        with np.errstate(divide='ignore'):
+            fc = np.log(quantity(Regime.with_altitudes(c), sc_parameters)) - log_limit
+        n_evals += 1
+
+        # Move the end of the bracket on the same side as c, halving the other end if it has been kept twice (Illinois)
+        above = fc >= 0
+        fb = np.where(above & (side == -1), fb / 2, fb)
+        fa = np.where(~above & (side == 1), fa / 2, fa)
+        a, fa = np.where(above, c, a), np.where(above, fc, fa)
+        b, fb = np.where(above, b, c), np.where(above, fb, fc)
+        side = np.where(above, -1, 1)
+
+        # Store the converged solutions, when the bracket is small enough or the secant estimate of the distance to the root is
+        with np.errstate(invalid='ignore', divide='ignore'):
+            done = (b - a < tol) | (np.abs(fc * (b - a) / (fb - fa)) < tol / 10)
+        h_limit[active[done]] = c[done]
+        keep = ~done
+        active, a, b, fa, fb, side, log_limit = active[keep], a[keep], b[keep], fa[keep], fb[keep], side[keep], log_limit[keep]
+
+    # Anything that didn't converge gets the middle of its bracket
+    h_limit[active] = 0.5 * (a + b)
+
+    return h_limit, n_evals
+
+
 # How low can I fly?
-def Get_minAlts(Regime:Regime, sc_parameters:dict) -> tuple:
+def Get_minAlts(Regime:Regime, sc_parameters:dict, method:str='grid', tol:float=1e-4) -> tuple:
     """
     This function calculates the minimum altitude at which the spacecraft can fly, based on drag and heating.
     It calculates at which altitude the drag force is equal to the thrust force.
@@ -106,28 +223,47 @@ def Get_minAlts(Regime:Regime, sc_parameters:dict) -> tuple:
     It assumes simplified models for drag and heating. It also assumes no lift to help the spacecraft maintian its altitude.
     It also assumes everything assumed by the Getm_gain function.
 
+    With method='grid' the limits are the first altitudes of the regime that satisfy them, so the precision depends on how dense the regime is.
+    With method='root' the regime altitudes are only used to bracket the limits, which are then refined to tol km with a few extra NRLMSIS calls.
+    A coarse regime (a few dozen altitudes) is enough for this.
+    Both methods give the lowest altitude of the regime if a limit is met everywhere, and NaN if it is not met anywhere in the regime
+    (for example a thrust below the drag at every altitude).
+    T_max can be an array of thrust levels, in which case all of them are solved at once.
+    If the regime has several epochs the drag limits are found for each epoch, with one row per epoch.
+
     INPUTS:
-        h: altitudes in km. This is a one dimensional array.
+        Regime: Regime object with the altitudes to evaluate.
         sc_parameters: dictionary with the spacecraft parameters.
-        earth_parameters: dictionary with the Earth parameters.
+        method: 'grid' or 'root'.
+        tol: tolerance on the altitude in km for method='root'.
 
     OUTPUTS:
-        h_drag: the minimum altitude due to drag in km.
-        h_heat: the minimum altitude due to heating in km.
+        h_drag: the minimum altitude due to drag in km, NaN if the thrust never beats the drag.
+                Same shape as T_max, or n_epochs x T_max.shape for several epochs.
+        h_heat: the minimum altitude due to heating in km, NaN if the heating is never below the heat rejection rate.
     """
 
     # Unpack the spacecraft parameters
     T = sc_parameters['T_max']
     Q_rejection = sc_parameters['Q_rejection']
 
-    # Extract the point at which the drag force is equal to the thrust force
-    h_drag = h[np.argmax(Get_Drag(Regime, sc_parameters) < T)]
+    if method == 'root':
+        # Refine the points at which the drag is equal to the thrust and the heating to the heat rejection rate
+        h_drag = _SolveLimit(Regime, sc_parameters, Get_Drag, T, tol)[0].reshape(np.shape(Regime.epoch) + np.shape(T))[()]
+        h_heat = _SolveLimit(Regime, sc_parameters, Get_Heating, Q_rejection, tol)[0][..., 0]
 
-    # Calculate the heating rate WORK IN PROGRESS
-    Q_heating = 0
+    elif method == 'grid':
+        h = Regime.h
 
-    # Extract the point at which the heating rate is equal to the heat rejection rate
-    h_heat = h[np.argmax(Q_heating < Q_rejection)]
+        # Extract the point at which the drag force is equal to the thrust force, NaN if it is never reached
+        h_nan = np.append(h, np.nan)
+        h_drag = h_nan[Get_LimitIdx(Get_Drag(Regime, sc_parameters), T, strict=True)]
+
+        # Extract the point at which the heating rate is equal to the heat rejection rate
+        h_heat = h_nan[Get_LimitIdx(Get_Heating(Regime, sc_parameters), Q_rejection, strict=True)]
+
+    else:
+        raise ValueError("The method must be 'grid' or 'root'.")
 
     return h_drag, h_heat
 
@@ -167,6 +303,292 @@ def Get_PowReq(Regime:Regime, sc_parameters:dict) -> np.ndarray:
     return P_req_prop, A_solar
 
 
+# Evaluate many designs at once
+def Get_DesignSweep(Regime:Regime, designs:DesignBatch, chunk_size:int=1000, out:dict=None) -> dict:
+    """
+    This function calculates the mass flow rate gain, the propulsive power and the time to refuel for many spacecraft designs
+    over the altitudes of a regime. The atmosphere of the regime is calculated once and shared by all the designs.
+    The designs are evaluated chunk_size at a time, so the temporary arrays are at most chunk_size x len(h).
+    It uses the same models as Getm_gain and Get_PowReq.
+    If the regime has several epochs, every design is evaluated at each of them and the outputs have an extra first axis.
+
+    INPUTS:
+        Regime: Regime object with the altitudes to evaluate.
+        designs: DesignBatch with the spacecraft parameters of every design.
+        chunk_size: number of designs evaluated at a time.
+        out: optional dictionary with preallocated arrays of size n_designs x len(h) (n_epochs x n_designs x len(h) for several
+            epochs) for the outputs, for example memory-mapped arrays from np.lib.format.open_memmap when the results don't fit in memory.
+
+    OUTPUTS:
+        results: dictionary with numpy arrays of size n_designs x len(h), or n_epochs x n_designs x len(h) for several epochs:
+            'm_gain': the mass flow rate gain in kg/s.
+            'P_req': the power required by the propulsion system in W.
+            'refuel_time': the time to fill the tank in s. This is inf where there is no mass gain.
+        They have the dtype of the regime.
+    """
+
+    # Atmosphere shared by all the designs
+    rho = Regime.atmos()  # In kg/m^3
+    V = Regime.v_circ()  # In m/s
+    g0 = Regime.earth_params['g0']
+    rho_V = rho * V
+    rho_V2 = rho_V * V
+
+    # Several epochs go on the first axis, in front of the designs
+    if rho.ndim > 1:
+        rho_V, rho_V2 = rho_V[:, None, :], rho_V2[:, None, :]
+
+    if out is None:
+        shape = rho.shape[:-1] + (len(designs), len(V))
+        out = {key: np.empty(shape, dtype=rho.dtype) for key in ('m_gain', 'P_req', 'refuel_time')}
+
+    for start in range(0, len(designs), chunk_size):
+        rows = (Ellipsis, slice(start, start + chunk_size), slice(None))
+        sc = {key: value.astype(rho.dtype, copy=False) for key, value in designs[rows[1]].columns().items()}
+
+        # Drag and intake mass flow rate
+        D = 0.5 * rho_V2 * (sc['A_ref'] * sc['C_D'])
+        m_in = rho_V * (sc['A_intake'] * sc['eff_intake'])
+
+        # Mass flow rate gain, the thruster uses D / (Isp * g0)
+        m_gain = np.subtract(m_in, D / (sc['Isp'] * g0), out=out['m_gain'][rows])
+
+        # Power required by the propulsion system
+        np.multiply(D, 0.5 * sc['Isp'] * g0 / sc['n_prop'], out=out['P_req'][rows])
+
+        # Time to fill the tank, only where the spacecraft gains mass
+        with np.errstate(divide='ignore'):
+            out['refuel_time'][rows] = np.where(m_gain > 0, sc['Tank_load'] / m_gain, np.inf)
+
+    return out
+
+
+# Uncertainty of the performance
+def Get_MonteCarlo(Regime:Regime, distributions:dict, n_samples:int, sc_parameters:dict=spacecraft, seed:int=0,
+                   chunk_size:int=1_000_000, percentiles:list=(5, 25, 50, 75, 95), out:dict=None,
+                   epoch_weights:np.ndarray=None) -> dict:
+    """
+    This function draws n_samples sets of uncertain spacecraft parameters and calculates the mass flow rate gain, the power
+    required and the time to refuel of every sample at every altitude of the regime, with the same models as Getm_gain and Get_PowReq.
+    The atmosphere of the regime is calculated once and shared by all the samples.
+    Solar activity is sampled through the epochs of the regime: if it has several epochs (or several f107 values), every sample
+    uses the atmosphere of one of them, drawn at random with epoch_weights.
+
+    The samples are all drawn at the start from np.random.default_rng(seed), in the order of distributions, so the results
+    only depend on the seed and not on chunk_size. The outputs are calculated a block of altitudes at a time, with at most
+    chunk_size values (n_samples x altitudes) per array, and the percentiles of each block are taken before the next one,
+    so 1e6 samples only need the samples and one block in memory. The full n_samples x len(h) arrays are only kept if out is given.
+
+    INPUTS:
+        Regime: Regime object with the altitudes to evaluate, with one or several epochs.
+        distributions: dictionary with the uncertain parameters. Each value is a tuple with the name of a method of
+            np.random.Generator and its arguments, for example {'C_D': ('normal', 2.2, 0.2), 'eff_intake': ('uniform', 0.4, 0.8)},
+            or a function taking the generator and the number of samples.
+        n_samples: number of samples.
+        sc_parameters: dictionary with the values of the parameters that are not uncertain.
+        seed: seed of the random number generator.
+        chunk_size: largest number of values calculated at once for each output.
+        percentiles: percentiles of the bands, between 0 and 100.
+        out: optional dictionary with preallocated arrays of size n_samples x len(h) for 'm_gain', 'P_req' and 'refuel_time',
+            for example memory-mapped arrays from np.lib.format.open_memmap.
+        epoch_weights: probability of each epoch of the regime. Defaults to the same for all.
+
+    OUTPUTS:
+        results: dictionary with:
+            'samples': dictionary with the n_samples values drawn for each uncertain parameter, and 'epoch' with the index
+                of the epoch of each sample if the regime has several.
+            'percentiles': the percentiles given.
+            'm_gain', 'P_req', 'refuel_time': bands of the mass flow rate gain (kg/s), the propulsion power (W) and the time
+                to refuel (s), numpy arrays of size len(percentiles) x len(h). The refuel time is inf without mass gain,
+                so its percentiles are taken with method='lower' (inf where more samples than the percentile don't gain mass).
+            'gain_probability': fraction of the samples with a mass gain at each altitude.
+            'feasible_probability': fraction of the samples where the drag is below T_max and the heating below Q_rejection.
+    """
+
+    rng = np.random.default_rng(seed)
+    g0 = Regime.earth_params['g0']
+
+    # Draw the samples of the uncertain parameters
+    samples = {}
+    for key, distribution in distributions.items():
+        if callable(distribution):
+            samples[key] = np.asarray(distribution(rng, n_samples), dtype=float)
+        else:
+            samples[key] = getattr(rng, distribution[0])(*distribution[1:], size=n_samples)
+
+    # Atmosphere shared by all the samples, one row per epoch
+    rho = np.atleast_2d(Regime.atmos())  # In kg/m^3
+    V = Regime.v_circ()  # In m/s
+    heating = Get_Heating(Regime, sc_parameters)
+    if len(rho) > 1:
+        samples['epoch'] = rng.choice(len(rho), size=n_samples, p=epoch_weights)
+
+    # Parameters of every sample as rows of size n_samples (or scalars if they are not uncertain)
+    sc = {key: samples.get(key, sc_parameters.get(key)) for key in
+          ('A_intake', 'eff_intake', 'A_ref', 'C_D', 'Isp', 'n_prop', 'Tank_load', 'T_max', 'Q_rejection')}
+    sc = {key: np.asarray(value, dtype=float)[None, ...] for key, value in sc.items()}
+    drag_area = sc['A_ref'] * sc['C_D']
+    intake_area = sc['A_intake'] * sc['eff_intake']
+    ve = sc['Isp'] * g0
+
+    results = {key: np.empty((len(percentiles), len(V))) for key in ('m_gain', 'P_req', 'refuel_time')}
+    results['gain_probability'] = np.empty(len(V))
+    results['feasible_probability'] = np.empty(len(V))
+
+    # Blocks of altitudes, each output is a block of altitudes x n_samples
+    block = max(1, chunk_size // n_samples)
+    for start in range(0, len(V), block):
+        cols = slice(start, start + block)
+        rho_block = rho[:, cols].T
+        rho_block = rho_block[:, samples['epoch']] if 'epoch' in samples else rho_block
+        rho_V = rho_block * V[cols, None]
+
+        # Drag and mass flow rates, like Getm_gain
+        D = 0.5 * rho_V * V[cols, None] * drag_area
+        m_gain = rho_V * intake_area - D / ve
+
+        # Power required by the propulsion system, like Get_PowReq
+        P_req = D * (0.5 * ve / sc['n_prop'])
+
+        # Time to fill the tank, only where the spacecraft gains mass
+        with np.errstate(divide='ignore'):
+            refuel_time = np.where(m_gain > 0, sc['Tank_load'] / m_gain, np.inf)
+
+        # Percentile bands of the block
+        results['m_gain'][:, cols] = np.percentile(m_gain, percentiles, axis=1)
+        results['P_req'][:, cols] = np.percentile(P_req, percentiles, axis=1)
+        results['refuel_time'][:, cols] = np.percentile(refuel_time, percentiles, axis=1, method='lower')
+        results['gain_probability'][cols] = np.mean(m_gain > 0, axis=1)
+        results['feasible_probability'][cols] = np.mean((D < sc['T_max']) & (heating[cols, None] < sc['Q_rejection']), axis=1)
+
+        if out is not None:
+            out['m_gain'][:, cols] = m_gain.T
+            out['P_req'][:, cols] = P_req.T
+            out['refuel_time'][:, cols] = refuel_time.T
+
+    results['samples'] = samples
+    results['percentiles'] = list(percentiles)
+
+    return results
+
+
+# Best altitude to refuel
+def optimize_altitude(Regime:Regime, design, objective:str='m_gain', tol:float=1e-3, max_iter:int=100) -> dict:
+    """
+    This function finds the altitude with the highest mass flow rate gain (or the shortest time to refuel) for one or many designs,
+    without evaluating a dense grid of altitudes.
+    The allowed altitudes go from the drag and heating limits (see Get_minAlts with method='root') up to the top of the regime.
+    The maximum is found with a golden section search, which evaluates one new altitude per design and iteration,
+    and then compared with both ends of the interval, so an optimum on a limit is returned exactly at the limit.
+    Every evaluation runs NRLMSIS once for all the designs (or interpolates the DensityTable of the regime, if it has one).
+    The minimum time to refuel is at the same altitude as the maximum gain, since the tank load doesn't depend on altitude.
+    If the regime has several epochs, each epoch is optimized on its own and the results have an extra first axis.
+
+    INPUTS:
+        Regime: Regime object used to bracket the drag and heating limits and to set the range of altitudes.
+                A coarse grid of altitudes is enough, for example 20 points between 70 and 300 km.
+        design: dictionary with the spacecraft parameters, or a DesignBatch to optimize many designs at once.
+        objective: 'm_gain' or 'refuel_time'. It only changes the returned value.
+        tol: tolerance on the altitude in km.
+        max_iter: maximum number of golden section iterations.
+
+    OUTPUTS:
+        result: dictionary with, for each design (scalars if design is a dictionary):
+            'h_opt': the optimal altitude in km. NaN if the thrust is below the drag over the whole regime.
+            'value': the mass flow rate gain in kg/s, or the time to refuel in s (inf if there is no gain), at h_opt.
+            'constraint': the active constraint at h_opt: 'drag', 'heating', 'lower bound' (bottom of the regime),
+                          'upper bound' (top of the regime), 'none' if the optimum is between them, or 'infeasible'.
+            'n_evals': number of altitudes evaluated per design, including the regime. Shared by all the designs.
+        For several epochs 'h_opt', 'value' and 'constraint' have one row per epoch (n_epochs, or n_epochs x n_designs),
+        and 'n_evals' is the total over the epochs.
+    """
+
+    if objective not in ('m_gain', 'refuel_time'):
+        raise ValueError("The objective must be 'm_gain' or 'refuel_time'.")
+
+    # Several epochs are optimized one by one, like the limits of _SolveLimit
+    if np.ndim(Regime.epoch) > 0:
+        results = [optimize_altitude(Regime.with_epoch(i), design, objective, tol, max_iter) for i in range(len(Regime.epoch))]
+        result = {key: np.stack([np.asarray(epoch[key]) for epoch in results]) for key in ('h_opt', 'value', 'constraint')}
+        result['n_evals'] = sum(epoch['n_evals'] for epoch in results)
+        return result
+
+    single = isinstance(design, dict)
+    designs = DesignBatch(design) if single else design
+    sc = designs.params
+    h = Regime.h
+
+    # Drag limit of every design at once. The drag divided by A_ref * C_D doesn't depend on the design,
+    # so the limit T_max / (A_ref * C_D) is solved over a single profile.
+    h_drag, n_drag = _SolveLimit(Regime, {'A_ref': 1, 'C_D': 1}, Get_Drag, sc['T_max'] / (sc['A_ref'] * sc['C_D']), tol)
+
+    # Heating limit. The heating model doesn't depend on the design yet, like in Get_minAlts
+    h_heat, n_heat = _SolveLimit(Regime, designs.design(0), Get_Heating, sc['Q_rejection'], tol)
+    n_evals = len(h) + n_drag + n_heat
+
+    # Allowed altitudes of each design
+    lo = np.fmax(h_drag, h_heat)
+    lo = np.where(np.isnan(h_drag) | np.isnan(h_heat), np.nan, lo)
+    hi = np.full(len(designs), h[-1])
+    feasible = lo < hi
+
+    def m_gain(x, params=sc):
+        # Mass flow rate gain of each design at its own altitude
+        return Getm_gain(Regime.with_altitudes(x), params)[0]
+
+    # Golden section search, the interior points are c < d
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = np.where(feasible, lo, h[0]), np.where(feasible, hi, h[0])
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+
+    # The ends of the interval are evaluated with the first two interior points
+    f = m_gain(np.concatenate([a, b, c, d]), {key: np.tile(value, 4) for key, value in sc.items()}).reshape(4, -1)
+    f_lo, f_hi, fc, fd = f
+    n_evals += 4
+
+    n_iter = 0
+    while np.any(b - a > tol) and n_iter < max_iter:
+
+        # Keep the part of the interval with the better point, one of the old points is reused
+        left = fc >= fd
+        a, b = np.where(left, a, c), np.where(left, d, b)
+        c, d, fc, fd = (np.where(left, b - ratio * (b - a), d), np.where(left, c, a + ratio * (b - a)),
+                        np.where(left, np.nan, fd), np.where(left, fc, np.nan))
+
+        # Evaluate the new point of each design
+        x = np.where(left, c, d)
+        fx = m_gain(x)
+        fc, fd = np.where(left, fx, fc), np.where(left, fd, fx)
+        n_iter += 1
+
+    n_evals += n_iter
+
+    # Best of the interior point and the two ends
+    interior = np.where(fc >= fd, c, d)
+    f_interior = np.fmax(fc, fd)
+    candidates = np.stack([np.where(feasible, lo, np.nan), interior, hi])
+    values = np.stack([f_lo, f_interior, f_hi])
+    best = np.argmax(values, axis=0)
+    h_opt = np.where(feasible, candidates[best, np.arange(len(designs))], np.nan)
+    value = np.where(feasible, values[best, np.arange(len(designs))], np.nan)
+
+    # Name the active constraint
+    lower = np.where(h_drag >= h_heat, 'drag', 'heating')
+    lower = np.where(lo <= h[0], 'lower bound', lower)
+    constraint = np.choose(best, [lower, np.full(len(designs), 'none'), np.full(len(designs), 'upper bound')])
+    constraint = np.where(feasible, constraint, 'infeasible')
+
+    if objective == 'refuel_time':
+        with np.errstate(divide='ignore'):
+            value = np.where(value > 0, sc['Tank_load'] / value, np.where(feasible, np.inf, np.nan))
+
+    result = {'h_opt': h_opt, 'value': value, 'constraint': constraint, 'n_evals': n_evals}
+    if single:
+        result.update({key: result[key][0].item() for key in ('h_opt', 'value', 'constraint')})
+
+    return result
+
+
 
 if __name__ == '__main__':
 
@@ -185,7 +607,7 @@ if __name__ == '__main__':
     m_out = m_out * 3600
 
     # Calculate the minimum altitudes
-    h_drag, h_heat = Get_minAlts(regime, spacecraft)
+    h_drag, h_heat = Get_minAlts(regime, spacecraft, method='root')
 
     # Calculate the Power requirements
     P_req, A_solar = Get_PowReq(regime, spacecraft)
@@ -195,27 +617,20 @@ if __name__ == '__main__':
     time = tank_load / m_gain # Time in seconds
     time = time / 24 # Time in days
 
-    # Apply element-wise logical AND to create a boolean mask
-    mask = np.logical_and(h > h_drag, h > h_heat)
-
-    # Filter the m_gain and h arrays using the mask
-    m_crop = m_gain[mask]
-    h_crop = h[mask]  # Need to filter h too
-
     # Find the max mass flow rate and corresponding height and time of refueling
-    if len(m_crop) > 0:  # Ensure there are valid values
-        idx_max = np.argmax(m_crop)
-        h_max = h_crop[idx_max]
-        m_max = m_crop[idx_max]
+    best = optimize_altitude(Regime(np.linspace(70, 300, 20), earth), spacecraft)
+    if best['constraint'] != 'infeasible':  # Ensure there are valid values
+        h_max = best['h_opt']
+        m_max = best['value'] * 3600  # In kg/hour
         time_min = tank_load / m_max / 24  # Time in days
-        P_min = P_req[np.where(h == h_max)][0]  # Minimum power required
+        P_min = Get_PowReq(regime.with_altitudes([h_max]), spacecraft)[0][0]  # Minimum power required
     else:
         h_max = None
         m_max = None  # Handle the case where no valid values exist
 
     # Print the results
     print('The maximum mass flow rate gain is:', m_max, 'kg/hour')
-    print('The altitude at which this occurs is:', h_max, 'km')
+    print('The altitude at which this occurs is:', h_max, 'km', f"(limited by {best['constraint']})")
     print('The minimum time to refuel is:', time_min, 'days')
     print('The minimum power required is:', P_min, 'W')
 
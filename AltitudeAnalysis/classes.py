@@ -3,6 +3,7 @@
 import numpy as np
 import pymsis as msis
 import matplotlib.pyplot as plt
+from scipy.interpolate import PchipInterpolator
 
 
 class Regime:
@@ -11,56 +12,233 @@ class Regime:
     It calculates the atmospheric density, composition, orbital velocity.
     The class assumes a circular equatorial orbit for simplicity.
     It also assumes that the earth is perfectly spherical.
-    For atmospheric calculations it also assumes that the longitude and latitude are 0 degrees, and the date is 2000-01-01.
+    For atmospheric calculations it also assumes that the longitude and latitude are 0 degrees, and the date is 2000-01-01 unless another epoch is given.
+    The atmosphere and the circular velocity are only calculated the first time they are needed and then stored,
+    so several functions can use the same regime while NRLMSIS runs only once.
+    Changing h clears the stored values, changing the epoch only calculates the epochs that haven't been used yet. The h array is kept as a read-only copy so it can't be changed in place.
+    If a DensityTable is given, the atmosphere is interpolated from it instead of running NRLMSIS.
+    With dtype=np.float32 the atmosphere and velocity are given in single precision, so everything calculated from them
+    (drag, mass flow rates, refuel times) uses half the memory and bandwidth. NRLMSIS still runs and is stored in float64,
+    only the arrays given out are converted.
+
+    The epoch can also be an array of dates, for example to follow a solar cycle. Then the atmosphere has an extra first axis,
+    one row per epoch, and all the epochs are calculated with a single NRLMSIS call.
+    The space weather (f107, f107a, ap) can be given for each epoch, otherwise NRLMSIS looks it up for the dates.
+    The atmosphere of each epoch and space weather is stored separately, so changing the epochs only calculates the new ones.
 
     INPUTS:
         h: altitudes in km. This is a one dimensional array.
         earth_params: dictionary with the Earth parameters.
+        epoch: date used for the atmospheric calculations, or one dimensional array of dates. Defaults to 2000-01-01.
+        table: optional DensityTable to use instead of NRLMSIS. It must have been built for the same epoch.
+        f107: optional F10.7 of the previous day, a scalar or one value per epoch.
+        f107a: optional 81-day average of F10.7, a scalar or one value per epoch.
+        ap: optional daily Ap, a scalar or one value per epoch.
+        dtype: floating point type of the atmosphere and velocity, np.float64 (the default) or np.float32.
     
     PARAMETERS:
         h: the altitudes in km. This is a one dimensional array that you provided.
         earth_params: the Earth parameters. This is a dictionary you provided.
+        epoch: the date of the atmospheric calculations, as a numpy datetime64 or a read-only array of them.
+        f107, f107a, ap: the space weather you provided, or None.
         v_circ: the circular velocity in m/s. This is a one dimensional array.
-        rho: the atmospheric density in kg/m^3. This is a one dimensional array.
-        atmosphere: the atmospheric composition. This is a dictionary.
+        rho: the atmospheric density in kg/m^3. This is a one dimensional array, or n_epochs x len(h) for an array of epochs.
+        atmosphere: the atmospheric composition. This is a numpy array of size len(h) x 11, or n_epochs x len(h) x 11.
+        msis_calls: number of times NRLMSIS has been run for this regime. Useful to check the cache is working.
+        table: the DensityTable used for the atmosphere, or None to use NRLMSIS.
+        dtype: the floating point type of the outputs.
     """
-    def __init__(self, h:np.ndarray, earth_params:dict):
+    def __init__(self, h:np.ndarray, earth_params:dict, epoch:np.datetime64=np.datetime64('2000-01-01T00:00:00'),
+                 table:'DensityTable'=None, f107:np.ndarray=None, f107a:np.ndarray=None, ap:np.ndarray=None,
+                 dtype:type=np.float64):
 
         # Initialize the class
-        self.h = h
         self.earth_params = earth_params
+        self.msis_calls = 0
+        self._composition = None
+        self._v_circ = None
+        self._epoch_cache = {}
+        self.h = h
+        self.epoch = epoch
+        self.table = table
+        self.f107 = f107
+        self.f107a = f107a
+        self.ap = ap
+        self.dtype = dtype
+
+    # Altitudes, changing them clears the stored results
+    @property
+    def h(self) -> np.ndarray:
+        return self._h
+
+    @h.setter
+    def h(self, h:np.ndarray):
+        self._h = np.array(h, dtype=float)
+        self._h.flags.writeable = False
+        self.clear_cache()
+
+    # Date of the atmospheric calculations, changing it only keeps the results stored for each epoch
+    @property
+    def epoch(self) -> np.datetime64:
+        return self._epoch
+
+    @epoch.setter
+    def epoch(self, epoch:np.datetime64):
+        epoch = np.array(epoch, dtype='datetime64[ms]')
+        if epoch.ndim > 1:
+            raise ValueError('The epoch must be a date or a one dimensional array of dates.')
+
+        epoch.flags.writeable = False
+        self._epoch = epoch[()]
+        self._composition = None
+
+    # Space weather of each epoch, changing it only keeps the results stored for each epoch
+    @property
+    def f107(self) -> np.ndarray:
+        return self._f107
+
+    @f107.setter
+    def f107(self, f107:np.ndarray):
+        self._f107 = f107
+        self._composition = None
+
+    @property
+    def f107a(self) -> np.ndarray:
+        return self._f107a
+
+    @f107a.setter
+    def f107a(self, f107a:np.ndarray):
+        self._f107a = f107a
+        self._composition = None
+
+    @property
+    def ap(self) -> np.ndarray:
+        return self._ap
+
+    @ap.setter
+    def ap(self, ap:np.ndarray):
+        self._ap = ap
+        self._composition = None
+
+    # Optional lookup table used instead of NRLMSIS, changing it clears the stored results
+    @property
+    def table(self) -> 'DensityTable':
+        return self._table
+
+    @table.setter
+    def table(self, table:'DensityTable'):
+        self._table = table
+        self._composition = None
+
+    # Floating point type of the outputs, changing it converts the stored results again
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @dtype.setter
+    def dtype(self, dtype:type):
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError('The dtype must be np.float32 or np.float64.')
+
+        self._dtype = dtype
+        self._composition = None
+        self._v_circ = None
+
+    def with_altitudes(self, h:np.ndarray) -> 'Regime':
+        # New regime at other altitudes with the same Earth parameters, epoch, space weather, table and dtype
+        return Regime(h, self.earth_params, epoch=self.epoch, table=self.table, f107=self.f107, f107a=self.f107a, ap=self.ap,
+                      dtype=self.dtype)
+
+    def with_epoch(self, i:int) -> 'Regime':
+        # Regime of the i-th epoch of this one, with its own space weather and the atmosphere already stored for it
+        weather = [None if value is None else np.broadcast_to(np.asarray(value, dtype=float), np.shape(self.epoch))[i]
+                   for value in (self.f107, self.f107a, self.ap)]
+        regime = Regime(self.h, self.earth_params, epoch=self.epoch[i], table=self.table, f107=weather[0], f107a=weather[1],
+                        ap=weather[2], dtype=self.dtype)
+        regime._epoch_cache = self._epoch_cache
+        return regime
+
+    def clear_cache(self):
+        # Forget the stored atmosphere (of every epoch) and velocity, they will be recalculated when needed
+        self._composition = None
+        self._v_circ = None
+        self._epoch_cache = {}
 
     # Velocity
     def v_circ(self):
-        return np.sqrt(self.earth_params['mu'] / (self.earth_params['R'] + self.h)) * 1e3  # Circular velocity in m/s
+        if self._v_circ is None:
+            self._v_circ = np.sqrt(self.earth_params['mu'] / (self.earth_params['R'] + self.h)) * 1e3  # Circular velocity in m/s
+            self._v_circ = self._v_circ.astype(self.dtype, copy=False)
+            self._v_circ.flags.writeable = False
+
+        return self._v_circ
 
-    # Create lists for et, lons, and lats
+    # Atmospheric density and composition
     def atmos(self, Composition:bool=False):
-        # Create lists for et, lons, and lats
-        et = np.array([np.datetime64('2000-01-01T00:00:00') for _ in range(len(self.h))])
-        lons = np.zeros(len(self.h))
-        lats = np.zeros(len(self.h))
+        # Only run NRLMSIS the first time, after that use the stored composition
+        if self._composition is None:
+            if self.table is None:
+                self._composition = self._msis_epochs().astype(self.dtype, copy=False)
 
-        # Obtain atmospheric composition (outputs a numpy array of size len(et) x 11)
-        composition_data = msis.calculate(et, lons, lats, self.h)
+            elif np.any(self.table.epoch != self.epoch):
+                raise ValueError(f'The density table was built for {self.table.epoch}, not for {self.epoch}.')
 
-        # Replace nan entries by 0
-        composition_data = np.nan_to_num(composition_data)
+            else:
+                self._composition = self.table(self.h).astype(self.dtype, copy=False)
+                if np.ndim(self.epoch) == 1:
+                    self._composition = np.broadcast_to(self._composition, (len(self.epoch),) + self._composition.shape)
 
-        # Define atmos properties
-        rho = composition_data[:, 0]
-        atmosphere = composition_data
+            self._composition.flags.writeable = False
 
         if Composition:
-            return atmosphere 
+            return self._composition
         else:
-            return rho # Atmospheric density in kg/m^3
+            return self._composition[..., 0] # Atmospheric density in kg/m^3
+
+    def _msis_epochs(self) -> np.ndarray:
+        # Atmosphere of every epoch, running NRLMSIS only for the epochs that are not stored yet
+        epochs = np.atleast_1d(self.epoch)
+        weather = [None if value is None else np.broadcast_to(np.asarray(value, dtype=float), epochs.shape)
+                   for value in (self.f107, self.f107a, self.ap)]
+
+        # Each epoch is stored with its space weather (None when NRLMSIS looks it up)
+        keys = list(zip(epochs.astype(np.int64).tolist(), *[[None] * len(epochs) if value is None else value.tolist()
+                                                           for value in weather]))
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in self._epoch_cache and key not in missing:
+                missing[key] = i
+
+        if missing:
+            idx = np.array(list(missing.values()))
+            composition = self._run_msis(self.h, epochs[idx], *[None if value is None else value[idx] for value in weather])
+            for key, rows in zip(missing, composition):
+                rows.flags.writeable = False
+                self._epoch_cache[key] = rows
+
+        if np.ndim(self.epoch) == 0:
+            return self._epoch_cache[keys[0]]
+        return np.stack([self._epoch_cache[key] for key in keys])
+
+    def _run_msis(self, h:np.ndarray, epochs:np.ndarray, f107:np.ndarray=None, f107a:np.ndarray=None,
+                  ap:np.ndarray=None) -> np.ndarray:
+        # NRLMSIS uses the daily Ap unless it is run in storm-time mode, so it is repeated for the 3 hour values
+        aps = None if ap is None else np.repeat(ap[:, None], 7, axis=1)
+
+        # Obtain atmospheric composition over the grid of epochs and altitudes (numpy array of size len(epochs) x len(h) x 11)
+        composition_data = msis.calculate(epochs, np.zeros(1), np.zeros(1), h, f107, f107a, aps)
+        composition_data = composition_data.reshape(len(epochs), len(h), 11)
+        self.msis_calls += 1
+
+        # Replace nan entries by 0
+        return np.nan_to_num(composition_data)
 
 
     # Plotting functions for validation mostly
     def plot_rho(self):
         # Mostly for validation purposes
-        plt.plot(self.h, self.atmos())
+        plt.plot(self.h, self.atmos().T)
         plt.yscale('log')
         plt.xlabel('Altitude (km)')
         plt.ylabel('Density (kg/m^3)')
@@ -69,7 +247,7 @@ class Regime:
 
     def plot_T(self):
         # Mostly for validation purposes
-        plt.plot(self.h, self.atmos(Composition=True)[:, -1])
+        plt.plot(self.h, self.atmos(Composition=True)[..., -1].T)
         plt.xlabel('Altitude (km)')
         plt.ylabel('Temperature (K)')
         plt.title('Temperature vs Altitude')
@@ -85,6 +263,164 @@ class Regime:
 
 
 
+class DensityTable:
+    """
+    This class stores the NRLMSIS outputs over a grid of altitudes so they can be interpolated instead of running NRLMSIS again.
+    It is meant for large sweeps where the same altitude range is evaluated many times.
+    The table is built once for a single epoch and position, so it ignores latitude, longitude and date when queried.
+    The densities (first 10 columns) are interpolated in log space, the temperature linearly.
+
+    Maximum relative error against running NRLMSIS directly (70 to 500 km, 2000-01-01, lat = lon = 0, checked every 2 m):
+        dh = 0.1 km, linear: 0.002% for rho, N2, O2, He and Ar, 0.03% for O and 0.001% for T.
+        dh = 1 km, linear:   0.1% for rho, N2, O2, He and Ar, 2.5% for O and 0.1% for T.
+        dh = 1 km, pchip:    0.02% for rho, N2, O2, He and Ar, 0.25% for O and 0.04% for T.
+    The minor species (H, N, AnomalousO, NO) are NaN (stored as 0) at some altitudes, so they can be fully wrong next to those points.
+
+    INPUTS:
+        h: altitudes of the table in km. This is a one dimensional array with constant spacing.
+        composition: NRLMSIS outputs at those altitudes. This is a numpy array of size len(h) x 11.
+        epoch: date the table was built for.
+        lat: latitude the table was built for in degrees.
+        lon: longitude the table was built for in degrees.
+        method: 'linear' for log-linear interpolation or 'pchip' for monotone cubic interpolation.
+
+    PARAMETERS:
+        h, composition, epoch, lat, lon, method: the values you provided.
+        dh: the altitude spacing of the table in km.
+    """
+    def __init__(self, h:np.ndarray, composition:np.ndarray, epoch:np.datetime64=np.datetime64('2000-01-01T00:00:00'),
+                 lat:float=0, lon:float=0, method:str='linear'):
+
+        if method not in ('linear', 'pchip'):
+            raise ValueError("The interpolation method must be 'linear' or 'pchip'.")
+
+        # Initialize the class
+        self.h = np.asarray(h, dtype=float)
+        self.composition = np.asarray(composition, dtype=float)
+        self.epoch = np.datetime64(epoch, 'ms')
+        self.lat = lat
+        self.lon = lon
+        self.method = method
+        self.dh = (self.h[-1] - self.h[0]) / (len(self.h) - 1)
+
+        if not np.allclose(np.diff(self.h), self.dh):
+            raise ValueError('The table altitudes must be evenly spaced.')
+
+        # Values that are actually interpolated: log of the densities and the temperature, one row per column.
+        # Empty densities (NaN in NRLMSIS) get a very low log value so they come back as 0.
+        positive = self.composition[:, :10] > 0
+        self._values = self.composition.T.copy()
+        self._values[:10] = np.where(positive.T, np.log(np.where(positive, self.composition[:, :10], 1).T), -1e5)
+        self._slopes = np.diff(self._values, axis=1)
+
+        if method == 'pchip':
+            self._pchip = PchipInterpolator(self.h, self._values, axis=1)
+
+    @classmethod
+    def build(cls, h_min:float=70, h_max:float=500, dh:float=0.1, epoch:np.datetime64=np.datetime64('2000-01-01T00:00:00'),
+              lat:float=0, lon:float=0, method:str='linear', f107:float=None, f107a:float=None, ap:float=None):
+        """
+        Runs NRLMSIS once over an evenly spaced grid of altitudes from h_min to h_max (in km) with a spacing of about dh km.
+        The space weather (f107, f107a and the daily ap) can be given like for a Regime, otherwise NRLMSIS looks it up for the epoch.
+        """
+        h = np.linspace(h_min, h_max, int(round((h_max - h_min) / dh)) + 1)
+        et = np.full(len(h), np.datetime64(epoch, 'ms'))
+        weather = [None if value is None else np.full(len(h), value, dtype=float) for value in (f107, f107a)]
+        aps = None if ap is None else np.full((len(h), 7), ap, dtype=float)
+        composition = np.nan_to_num(msis.calculate(et, np.full(len(h), lon), np.full(len(h), lat), h, *weather, aps))
+
+        return cls(h, composition, epoch, lat, lon, method)
+
+    def save(self, filepath:str):
+        # Save the table to a .npz file
+        np.savez(filepath, h=self.h, composition=self.composition, epoch=self.epoch, lat=self.lat, lon=self.lon)
+
+    @classmethod
+    def load(cls, filepath:str, method:str='linear'):
+        # Load a table saved with save()
+        with np.load(filepath) as data:
+            return cls(data['h'], data['composition'], data['epoch'][()], float(data['lat']), float(data['lon']), method)
+
+    def __call__(self, h:np.ndarray) -> np.ndarray:
+        """
+        Interpolates the table at the altitudes h (in km).
+        Returns a numpy array of size len(h) x 11 with the same columns as NRLMSIS.
+        """
+        h = np.asarray(h, dtype=float)
+
+        if h.size and (h.min() < self.h[0] or h.max() > self.h[-1]):
+            raise ValueError(f'Altitudes must be between {self.h[0]} and {self.h[-1]} km to use this table.')
+
+        if self.method == 'pchip':
+            out = self._pchip(h)
+
+        else:
+            # The grid is evenly spaced, so the lower node of each altitude is found directly
+            x = (h - self.h[0]) / self.dh
+            i = np.minimum(x.astype(np.intp), len(self.h) - 2)
+
+            out = np.take(self._slopes, i, axis=1)
+            out *= x - i
+            out += np.take(self._values, i, axis=1)
+
+        # Back from log space
+        np.exp(out[:10], out=out[:10])
+
+        return out.T
+
+
+
+class DesignBatch:
+    """
+    This class stores many spacecraft designs at once, with one array per parameter instead of one dictionary per design.
+    It is meant for sweeps over thousands of designs, where each parameter is broadcast against the altitudes of a regime.
+    Any parameter can be a scalar, shared by all the designs, or a one dimensional array with one value per design.
+
+    INPUTS:
+        sc_parameters: dictionary with the spacecraft parameters, same keys as spacecraft.py.
+
+    PARAMETERS:
+        params: dictionary with one read-only array of length n_designs per parameter.
+        n_designs: the number of designs.
+    """
+    def __init__(self, sc_parameters:dict):
+
+        # Broadcast all the parameters to the same number of designs
+        keys = list(sc_parameters)
+        arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(sc_parameters[key], dtype=float)) for key in keys])
+
+        if arrays and arrays[0].ndim != 1:
+            raise ValueError('The design parameters must be scalars or one dimensional arrays.')
+
+        self.params = {}
+        for key, array in zip(keys, arrays):
+            self.params[key] = np.array(array)
+            self.params[key].flags.writeable = False
+
+        self.n_designs = len(arrays[0]) if arrays else 0
+
+    def __len__(self) -> int:
+        return self.n_designs
+
+    def __getitem__(self, key):
+        # A parameter name gives its array, anything else (slice, index array, mask) gives a smaller batch
+        if isinstance(key, str):
+            return self.params[key]
+        return DesignBatch({name: np.atleast_1d(array[key]) for name, array in self.params.items()})
+
+    def design(self, i:int) -> dict:
+        # Dictionary with the parameters of a single design, like spacecraft.py
+        return {key: array[i].item() for key, array in self.params.items()}
+
+    def columns(self) -> dict:
+        """
+        Dictionary with each parameter as a column of size n_designs x 1.
+        It can be passed as sc_parameters to Get_Drag, Getm_gain... to get results of size n_designs x len(h).
+        """
+        return {key: array[:, None] for key, array in self.params.items()}
+
+
+
 class Spacecraft:
     """
     This class takes a spacecraft and calculates parameters associated with it.
@@ -0,0 +1,195 @@
+# This file finds the best trade-offs between power, time to refuel and altitude, from the grids of time_analysis and
+# power_analysis or from a design sweep. A design is on the Pareto front if no other design is at least as good in
+# everything and better in something: less power, less time to refuel and a higher altitude.
+
+# Import the necessary libraries
+import numpy as np
+
+# Import own libraries
+from altitude_analysis import Get_Drag, Get_LimitIdx
+from time_analysis import time_analysis, power_analysis, earth
+from spacecraft import spacecraft
+from classes import Regime
+
+
+# Non-dominated points of two objectives within each level of a third one, already sorted
+def _front_2d(a:np.ndarray, b:np.ndarray, level:np.ndarray) -> np.ndarray:
+    # The points are sorted by level, a and then b, so a point is on the front of its level if its b is lower than the b of every
+    # point before it in the same level. The running minimum is taken over the ranks of b, shifted down for each new level so
+    # the points of the previous levels never count.
+    n = len(b)
+    shift = (level[-1] - level) * (n + 1) if n else level
+    rank = np.unique(b, return_inverse=True)[1] + shift
+    best = np.minimum.accumulate(rank)
+    keep = np.empty(n, dtype=bool)
+    keep[:1] = True
+    keep[1:] = rank[1:] < best[:-1]
+    return keep
+
+
+# Points with a point of a lower level that has a lower or equal a and b
+def _dominated_levels(a:np.ndarray, b:np.ndarray, level:np.ndarray) -> np.ndarray:
+    # Divide and conquer over the levels, all the blocks of the same size at once. In blocks of 2^(k+1) levels, the second half
+    # of each block is checked against the first half by going through the block in order of a and keeping the lowest b of the
+    # first half so far. Points with the same a are sorted by level, so the ones of a lower level come first.
+    # The points are sorted by level, a and then b, and the points of the same level are not checked against each other.
+    n = len(a)
+    by_a = np.empty(n, dtype=np.int64)
+    by_a[np.argsort(a, kind='stable')] = np.arange(n)
+    rank = np.unique(b, return_inverse=True)[1].astype(np.int64)
+    level = level.astype(np.int64)
+    dominated = np.zeros(n, dtype=bool)
+
+    # The points are moved around with their level, position in order of a and rank of b
+    order = np.arange(n)
+    top = level[-1]
+    k = 0
+    while (1 << k) <= top:
+        # Sort each block of 2^(k+1) levels by a. The halves are already sorted, so the stable sort only has to merge them
+        block = level >> (k + 1)
+        sort = np.argsort(block * n + by_a, kind='stable')
+        order, level, by_a, rank, block = order[sort], level[sort], by_a[sort], rank[sort], block[sort]
+        first = (level >> k) & 1 == 0
+        second = ~first
+
+        # Lowest rank of b of the first half so far, shifted down for each new block like in _front_2d
+        shift = (block[-1] - block) * (n + 1)
+        best = np.minimum.accumulate(np.where(first, rank, n) + shift)
+        dominated[order[second]] |= best[second] - shift[second] <= rank[second]
+        k += 1
+
+    return dominated
+
+
+# Find the Pareto front
+def pareto_front(power:np.ndarray, refuel_time:np.ndarray, altitude:np.ndarray=None,
+                 maximize_altitude:bool=True) -> np.ndarray:
+    """
+    This function finds the points that are not dominated by any other point, minimizing the power and the time to refuel and
+    maximizing the altitude (or minimizing it with maximize_altitude=False).
+    The inputs can have any shape, like the Isp x T_max grids of time_analysis and power_analysis or the n_designs x len(h)
+    arrays of Get_DesignSweep, as long as they can be broadcast together.
+
+    The points are sorted once by altitude (best first), power and time, so every point that dominates another one comes before it.
+    First, the points that are dominated by another point of the same altitude are dropped with a running minimum of the time,
+    which is all that is needed without altitude. The remaining points are then checked against the points before them with a
+    divide and conquer over their position, O(n log^2 n) with numpy operations only, so the time doesn't depend on the number of
+    different altitudes (a few seconds for a million points with all the altitudes different).
+
+    Points with no mass gain (refuel time that is negative, inf or nan) are ignored. If several points have the same power,
+    time and altitude, only the first one is kept.
+
+    ### INPUTS:
+        power: power required in W.
+        refuel_time: time to refuel, in any unit.
+        altitude: optional altitude in km.
+        maximize_altitude: whether a higher altitude is better.
+
+    ### OUTPUTS:
+        idx: flat indices of the points of the front in the broadcast inputs, sorted by power.
+             np.unravel_index(idx, shape) gives the position in the grid.
+    """
+
+    # Flatten the inputs and drop the points without mass gain
+    arrays = np.broadcast_arrays(power, refuel_time) if altitude is None else np.broadcast_arrays(power, refuel_time, altitude)
+    a, b = arrays[0].ravel(), arrays[1].ravel()
+    c = np.zeros(len(a)) if altitude is None else arrays[2].ravel() * (-1 if maximize_altitude else 1)
+    valid = np.flatnonzero(np.isfinite(a) & np.isfinite(b) & np.isfinite(c) & (b > 0))
+    a, b, c = a[valid], b[valid], c[valid]
+
+    # Sort by altitude (best first), then power and then time
+    order = np.lexsort((b, a, c))
+    a, b, c = a[order], b[order], c[order]
+
+    # Front of each altitude on its own
+    level = np.cumsum(np.diff(c, prepend=c[:1]) != 0)
+    front = np.flatnonzero(_front_2d(a, b, level))
+
+    # Points dominated by a better altitude
+    if len(level) and level[-1] > 0:
+        front = front[~_dominated_levels(a[front], b[front], level[front])]
+
+    front = front[np.lexsort((b[front], a[front]))]
+
+    return valid[order[front]]
+
+
+class ParetoFront:
+    """
+    This class keeps the Pareto front of a sweep that arrives in chunks, like the chunks of designs of Get_DesignSweep.
+    Every update finds the front of the points stored so far and the new ones, so only the front is kept in memory.
+    A point that is dominated can never come back to the front, so the result is the same as pareto_front on all the points.
+
+    INPUTS:
+        maximize_altitude: whether a higher altitude is better.
+
+    PARAMETERS:
+        power, refuel_time, altitude: the objectives of the points of the front, sorted by power.
+        data: dictionary with any other values given for each point, for example the design index, Isp or T_max.
+        n_points: number of points seen so far, including the ones that were dropped.
+    """
+    def __init__(self, maximize_altitude:bool=True):
+        self.maximize_altitude = maximize_altitude
+        self.power = np.empty(0)
+        self.refuel_time = np.empty(0)
+        self.altitude = None
+        self.data = {}
+        self.n_points = 0
+
+    def __len__(self) -> int:
+        return len(self.power)
+
+    def update(self, power:np.ndarray, refuel_time:np.ndarray, altitude:np.ndarray=None, **data) -> np.ndarray:
+        """
+        Adds a chunk of points, with the same shapes as in pareto_front. The keyword arguments are stored for the points
+        that stay on the front, they are broadcast against the objectives. Every update needs the same data keys, and the altitude
+        if the first one had it.
+        Returns the flat indices of the new points that are on the front now, they can still be dropped by later updates.
+        """
+        if len(self) and (altitude is None) != (self.altitude is None):
+            raise ValueError('Every update must have an altitude, or none of them.')
+        if len(self) and set(data) != set(self.data):
+            raise ValueError(f'Every update must have the same data, {sorted(self.data)}.')
+
+        # Flatten the new points
+        objectives = (power, refuel_time) if altitude is None else (power, refuel_time, altitude)
+        arrays = np.broadcast_arrays(*objectives, *data.values())
+        new = [array.ravel() for array in arrays]
+        new_data = dict(zip(data, new[len(objectives):]))
+        self.n_points += len(new[0])
+
+        # Stored front first, so a new point equal to a stored one is dropped
+        old = [self.power, self.refuel_time] + ([] if altitude is None else [self.altitude])
+        old = [value if len(self) else np.empty(0) for value in old]
+        merged = [np.concatenate([stored, value]) for stored, value in zip(old, new)]
+        merged_data = {key: np.concatenate([self.data[key], value]) if len(self) else value for key, value in new_data.items()}
+
+        idx = pareto_front(*merged, maximize_altitude=self.maximize_altitude)
+        self.power, self.refuel_time = merged[0][idx], merged[1][idx]
+        self.altitude = None if altitude is None else merged[2][idx]
+        self.data = {key: value[idx] for key, value in merged_data.items()}
+
+        return idx[idx >= len(old[0])] - len(old[0])
+
+
+if __name__ == '__main__':
+    # Create the regime
+    h = np.linspace(70, 500, 50000)
+    regime = Regime(h, earth)
+
+    # Grids of time to refuel and power
+    T_max = np.linspace(0.01, 10, 1000) # Thrust in N
+    Isp = np.linspace(1500, 5000, 1000) # Specific impulse in s
+    time = time_analysis(regime, spacecraft, Isp, T_max)
+    power = power_analysis(spacecraft, Isp, T_max)
+
+    # Altitude of each thrust, where the thrust beats the drag
+    altitude = h[Get_LimitIdx(Get_Drag(regime, spacecraft), T_max) % len(h)]
+
+    # Best trade-offs
+    idx = pareto_front(power, time, altitude[None, :])
+    i, j = np.unravel_index(idx, time.shape)
+    print(f'{len(idx)} of {time.size} designs on the Pareto front')
+    for k in np.linspace(0, len(idx) - 1, 10).astype(int):
+        print(f'Isp {Isp[i[k]]:6.0f} s, T {T_max[j[k]]:5.2f} N: {power[i[k], j[k]] / 1000:8.1f} kW, '
+              f'{time[i[k], j[k]]:8.1f} days, {altitude[j[k]]:6.1f} km')
@@ -9,11 +9,12 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 # Import own libraries
-from altitude_analysis import Get_Drag
+from altitude_analysis import Get_Drag, Get_LimitIdx
 from spacecraft import spacecraft
-from classes import Regime
+from classes import Regime, DesignBatch
 
 # Constants
 earth = {
@@ -24,6 +25,27 @@ earth = {
 }
 
 
+# Intake mass flow rate at the lowest altitude each thrust can hold
+def _intake_at_thrust(Regime:Regime, spacecraft:dict, T_max:np.ndarray) -> np.ndarray:
+    # Shape (len(T_max), ), or (n_epochs, len(T_max)) for several epochs
+    D = Get_Drag(Regime, spacecraft) # Shape (k, ) k being the ln(h) of the regime object, or (n_epochs, k)
+    rho = Regime.atmos()
+    V = Regime.v_circ()
+
+    # Vectorized calculation 
+    # Indices where the thrust is higher than the drag, found with a binary search over the drag
+    idxs = Get_LimitIdx(D, T_max)
+
+    # If the thrust never beats the drag use the first altitude, like np.argmax would
+    idxs[idxs == D.shape[-1]] = 0
+
+    # Get the corresponding rho and V
+    rho = np.take_along_axis(rho, idxs, axis=-1)
+    V = V[idxs]
+
+    return spacecraft['A_intake'] * spacecraft['eff_intake'] * (V * rho)
+
+
 # Refueling analysis
 def time_analysis(Regime:Regime, spacecraft:dict, Isp:np.ndarray, T_max:np.ndarray, 
                   PLOT:bool=False, SAVE:bool=True) -> np.ndarray:
@@ -34,40 +56,35 @@ def time_analysis(Regime:Regime, spacecraft:dict, Isp:np.ndarray, T_max:np.ndarr
 
     ### INPUTS:
         Regime: Regime object with the atmospheric properties. This object must be created before calling the function. The regime object should be created with a very large number of oints for height to get smooth plotting.
+            If the regime has several epochs, the time is calculated for each of them (only one epoch can be plotted).
         spacecraft: dictionary with the spacecraft parameters
         Isp: specific impulse in s
         T_max: Thrust in N
         PLOT: boolean to plot the results
 
     ### OUTPUTS:
-        time: time to refuel in days
+        time: time to refuel in days. Shape (len(Isp), len(T_max)), or (n_epochs, len(Isp), len(T_max)) for several epochs.
+            It has the dtype of the regime, Isp and T_max are converted to it.
     """
 
+    if PLOT and np.ndim(Regime.epoch) > 0:
+        raise ValueError('The refuel time can only be plotted for a regime with a single epoch.')
+
+    # Work in the precision of the regime
+    Isp = np.asarray(Isp, dtype=Regime.dtype)
+    T_max = np.asarray(T_max, dtype=Regime.dtype)
+
     # Unpack constants
     m_tank = spacecraft['Tank_load']
-    eff_intake = spacecraft['eff_intake']
-    A_intake = spacecraft['A_intake']
     ve = Isp * spacecraft['g0']
 
-    # Calculate atmospheric properties
-    D = Get_Drag(Regime, spacecraft) # Shape (k, ) k being the ln(h) of the regime object
-    rho = Regime.atmos()
-    V = Regime.v_circ()
-
-    # Vectorized calculation 
-    # #TODO: improve the way I get the point of T=D
-    # Indices where the thrust is higher than the drag
-    idxs = np.argmax(D[None, :] <= T_max[:, None], axis=1)
-
-    # Get the corresponding rho and V
-    rho = rho[idxs]
-    V = V[idxs]
+    # Intake mass flow rate at the altitude of each thrust
+    m_in = _intake_at_thrust(Regime, spacecraft, T_max)
 
     # Calculate the time to refuel
-    V_rho = V * rho
     thrust_ve = T_max[None, :] / ve[:, None]
 
-    time = m_tank / (A_intake * eff_intake * V_rho - thrust_ve) / 3600 / 24 # In days
+    time = m_tank / (m_in[..., None, :] - thrust_ve) / 3600 / 24 # In days
 
     if PLOT:
 
@@ -118,7 +135,7 @@ def power_analysis(spacecraft:dict, Isp:np.ndarray, T_max:np.ndarray,
         PLOT: boolean to plot the results
 
     ### OUTPUTS:
-        power: power in W
+        power: power in W. It is in float32 if Isp and T_max are.
     """
 
     # Unpack constants
@@ -167,6 +184,227 @@ def power_analysis(spacecraft:dict, Isp:np.ndarray, T_max:np.ndarray,
     return power
 
 
+# Refueling and power analysis over grids too large for memory
+def tiled_analysis(Regime:Regime, spacecraft:dict, Isp:np.ndarray, T_max:np.ndarray, time_path:str=None,
+                   power_path:str=None, max_memory:float=256e6, workers:int=1) -> tuple[np.ndarray, np.ndarray]:
+
+    """
+    This function calculates the same time to refuel and power as time_analysis and power_analysis, bit for bit,
+    but one tile of the Isp x T_max grid at a time, so grids of 1e5 x 1e5 can be written to disk.
+    Each tile is calculated in a single buffer, reused for the power and the time of every epoch, and copied to the outputs,
+    which can be .npy files opened as memory-mapped arrays.
+    The tiles take whole rows of the grid when they fit, so they are written to the files in order.
+    The tiles can be calculated by several threads, numpy releases the GIL for the operations on the arrays.
+
+    ### INPUTS:
+        Regime: Regime object with the atmospheric properties, like for time_analysis. It can have several epochs.
+        spacecraft: dictionary with the spacecraft parameters
+        Isp: specific impulse in s
+        T_max: Thrust in N
+        time_path, power_path: optional .npy files to write the outputs to. They are kept in memory if not given.
+        max_memory: largest memory used by the tile buffers of all the workers together (one buffer per worker), in bytes.
+        workers: number of threads.
+
+    ### OUTPUTS:
+        time: time to refuel in days. Shape (len(Isp), len(T_max)), or (n_epochs, len(Isp), len(T_max)) for several epochs.
+        power: power in W. Shape (len(Isp), len(T_max)).
+        Both have the dtype of the regime, like time_analysis. Isp and T_max are converted to it.
+        Both are numpy memory-mapped arrays when a path is given.
+    """
+
+    # Work in the precision of the regime
+    Isp = np.asarray(Isp, dtype=Regime.dtype)
+    T_max = np.asarray(T_max, dtype=Regime.dtype)
+
+    # Unpack constants
+    m_tank = spacecraft['Tank_load']
+    n_prop = spacecraft['n_prop']
+    ve = Isp * spacecraft['g0']
+
+    # Intake mass flow rate at the altitude of each thrust, shared by all the tiles
+    m_in = _intake_at_thrust(Regime, spacecraft, T_max)
+    shape = (len(Isp), len(T_max))
+
+    # Outputs
+    def output(path, shape):
+        if path is None:
+            return np.empty(shape, dtype=Regime.dtype)
+        return np.lib.format.open_memmap(path, mode='w+', dtype=Regime.dtype, shape=shape)
+
+    time = output(time_path, m_in.shape[:-1] + shape)
+    power = output(power_path, shape)
+
+    # Tile size, every worker has a single buffer that is reused for the power and the time of every epoch
+    size = max(int(max_memory // (Regime.dtype.itemsize * max(workers, 1))), 1)
+    cols = min(len(T_max), size)
+    rows = max(size // cols, 1)
+    tiles = [(slice(i, i + rows), slice(j, j + cols)) for i in range(0, shape[0], rows) for j in range(0, shape[1], cols)]
+
+    def tile(rows, cols):
+        # Same operations as time_analysis and power_analysis, in a buffer of the size of the tile
+        buffer = np.empty((len(ve[rows]), len(T_max[cols])), dtype=Regime.dtype)
+
+        np.multiply(T_max[None, cols], ve[rows, None], out=buffer)
+        np.divide(buffer, 2 * n_prop, out=buffer)
+        power[rows, cols] = buffer
+
+        for i in np.ndindex(m_in.shape[:-1]):
+            np.divide(T_max[None, cols], ve[rows, None], out=buffer)
+            np.subtract(m_in[i + (None, cols)], buffer, out=buffer)
+            np.divide(m_tank, buffer, out=buffer)
+            buffer /= 3600
+            buffer /= 24
+            time[i + (rows, cols)] = buffer
+
+    if workers <= 1:
+        for rows, cols in tiles:
+            tile(rows, cols)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda block: tile(*block), tiles))
+
+    for array in (time, power):
+        if isinstance(array, np.memmap):
+            array.flush()
+
+    return time, power
+
+
+# Closed loop refueling simulation
+def fill_simulation(Regime:Regime, designs:DesignBatch, h0:np.ndarray, dt:float=86400, t_max:float=1000 * 86400,
+                    max_dh:float=0.5, dry_mass:float=7000, P_max:float=np.inf) -> dict:
+
+    """
+    This function simulates the refueling of many spacecraft designs starting from many altitudes at once, stepping in time
+    instead of assuming constant conditions like time_analysis. Every spacecraft follows a circular orbit and its thruster
+    compensates the drag to keep the altitude, as long as the thrust, the power and the propellant allow it:
+        T = min(D, T_max, 2 * n_prop * P_max / (Isp * g0)), and no more than the intake brings in when the tank is empty.
+    The tank gains A_intake * eff_intake * rho * V - T / (Isp * g0). When the thrust is short of the drag the orbit decays,
+    (da/dt = 2 a^2 V (T - D) / (mu * m)) more slowly as the tank fills and the spacecraft gets heavier,
+    and the spacecraft is lost if it falls below the lowest altitude of the regime.
+    A spacecraft that keeps its altitude with a positive gain stays like that, so its fill time is found directly.
+    The others are stepped with dt, or less so the altitude doesn't change more than max_dh in a step.
+    All the spacecraft still flying are stepped together, and the ones that are done are dropped from the arrays.
+
+    ### INPUTS:
+        Regime: Regime object with the atmosphere, with a single epoch. Its altitudes are interpolated (log of the density).
+        designs: DesignBatch with the spacecraft parameters. It can also have 'dry_mass' (kg) and 'P_max' (W) per design.
+        h0: initial altitudes in km.
+        dt: largest time step in s.
+        t_max: time after which the simulation stops, in s.
+        max_dh: largest change of altitude in a step in km.
+        dry_mass: mass of the spacecraft with an empty tank in kg, if the designs don't have it (7000 kg like the GMAT example).
+        P_max: power available for the thruster in W, if the designs don't have it.
+
+    ### OUTPUTS:
+        results: dictionary with numpy arrays of size n_designs x len(h0):
+            'fill_time': time to fill the tank in s, inf if it is never filled.
+            'status': 0 filled, 1 lost (fell below the regime), 2 never fills (the altitude is kept with no gain), 3 not filled by t_max.
+            'altitude': altitude at the end in km.
+            'tank': propellant in the tank at the end in kg.
+        and the distribution of the fill times over the designs, for each initial altitude:
+            'percentiles': the percentiles given, [5, 25, 50, 75, 95].
+            'fill_time_percentiles': numpy array of size 5 x len(h0) (inf where less designs than the percentile are filled).
+            'filled_fraction': fraction of the designs that fill the tank.
+    """
+
+    if np.ndim(Regime.epoch) > 0:
+        raise ValueError('The fill simulation needs a regime with a single epoch.')
+
+    # Atmosphere of the regime, interpolated in log space
+    h_grid = Regime.h
+    log_rho = np.log(np.maximum(Regime.atmos().astype(np.float64), 1e-300))  # The integration is always in float64
+    R, mu, g0 = Regime.earth_params['R'], Regime.earth_params['mu'], Regime.earth_params['g0']
+
+    # Parameters of every spacecraft, one per design and initial altitude
+    h0 = np.atleast_1d(np.asarray(h0, dtype=float))
+    n_designs, n_h = len(designs), len(h0)
+    design = np.repeat(np.arange(n_designs), n_h)
+
+    def param(key, default=None):
+        values = designs.params[key] if key in designs.params else np.full(n_designs, float(default))
+        return values[design]
+
+    drag_area = param('A_ref') * param('C_D')
+    intake_area = param('A_intake') * param('eff_intake')
+    ve = param('Isp') * g0
+    T_lim = np.minimum(param('T_max'), 2 * param('n_prop') * param('P_max', P_max) / ve)
+    tank = param('Tank_load')
+    dry = param('dry_mass', dry_mass)
+
+    # Results
+    fill_time = np.full(n_designs * n_h, np.inf)
+    status = np.full(n_designs * n_h, 3, dtype=np.int8)
+    h_end = np.tile(h0, n_designs)
+    m_end = np.zeros(n_designs * n_h)
+
+    # State of the spacecraft still flying
+    index = np.arange(n_designs * n_h)
+    h, m, t = h_end.copy(), m_end.copy(), np.zeros(n_designs * n_h)
+
+    while len(index):
+
+        # Forces at the current altitude
+        rho = np.exp(np.interp(h, h_grid, log_rho))
+        V = np.sqrt(mu / (R + h)) * 1e3  # In m/s
+        D = 0.5 * rho * V**2 * drag_area
+        m_in = intake_area * rho * V
+
+        # Thrust to keep the altitude, limited by the thruster, the power and the propellant
+        T = np.minimum(D, T_lim)
+        T = np.where(m > 0, T, np.minimum(T, m_in * ve))
+        gain = m_in - T / ve
+
+        # Steady spacecraft, the altitude is kept so nothing changes until the tank is full
+        hold = T >= D
+        with np.errstate(divide='ignore'):
+            remaining = np.where(gain > 0, (tank - m) / gain, np.inf)
+        filled = hold & (gain > 0) & (t + remaining <= t_max)
+        never = hold & (gain <= 0)
+
+        # The rest decays, with steps limited in time and altitude
+        r = R + h
+        dh_dt = 2 * r**2 * (V / 1e3) * (T - D) / (mu * (dry + m)) / 1e3  # In km/s
+        with np.errstate(divide='ignore'):
+            step = np.minimum(np.minimum(dt, t_max - t), max_dh / np.abs(dh_dt))
+        filled |= ~hold & (remaining <= step)
+
+        # The ones that fill stop when the tank is full, the steady ones that don't fill jump to t_max
+        step = np.where(hold, t_max - t, step)
+        step = np.where(filled, remaining, np.where(never, 0, step))
+        h = h + np.where(hold, 0, dh_dt * step)
+        m = np.where(filled, tank, np.maximum(m + gain * step, 0))
+        t = t + step
+        lost = ~filled & (h < h_grid[0])
+        timeout = ~filled & ~lost & ~never & (t >= t_max)
+
+        # Store the spacecraft that are done
+        fill_time[index[filled]] = t[filled]
+        for done, code in ((filled, 0), (lost, 1), (never, 2), (timeout, 3)):
+            status[index[done]] = code
+            h_end[index[done]] = h[done]
+            m_end[index[done]] = m[done]
+
+        # Keep only the ones still flying
+        keep = ~(filled | lost | never | timeout)
+        index, h, m, t = index[keep], h[keep], m[keep], t[keep]
+        drag_area, intake_area, ve, T_lim, tank, dry = [value[keep] for value in (drag_area, intake_area, ve, T_lim, tank, dry)]
+
+    # Distribution of the fill times over the designs
+    fill_time = fill_time.reshape(n_designs, n_h)
+    percentiles = [5, 25, 50, 75, 95]
+
+    return {
+        'fill_time': fill_time,
+        'status': status.reshape(n_designs, n_h),
+        'altitude': h_end.reshape(n_designs, n_h),
+        'tank': m_end.reshape(n_designs, n_h),
+        'percentiles': percentiles,
+        'fill_time_percentiles': np.percentile(fill_time, percentiles, axis=0, method='lower'),
+        'filled_fraction': np.mean(np.isfinite(fill_time), axis=0)
+    }
+
+
 if __name__ == '__main__':
     # Create the regime
     h = np.linspace(70, 500, 50000)
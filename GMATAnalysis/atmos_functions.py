@@ -7,14 +7,280 @@ import sys
 # Add the parent directory to the path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
 
+import glob
+import hashlib
 import numpy as np
 import pymsis as msis
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
 from spacecraft import spacecraft
+from GMATAnalysis.data import IterGeoPos, SpaceWeather, FindPasses, PassMask
+
+# Species in the NRLMSIS output, in the order of its columns (the last column is the temperature)
+SPECIES = ('rho', 'N2', 'O2', 'O', 'He', 'H', 'Ar', 'N', 'AnomalousO', 'NO')
+
+# Default folder of the CompositionCache, in GMAT_Data of the repository wherever the scripts are run from
+CACHE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'GMAT_Data', 'composition_cache'))
+
 
 # ----------- ATMOSPHERE FUNCTIONS ------------
-def GetComposition(data: dict) -> dict:
+class CompositionCache:
+    """
+    This class stores NRLMSIS results on disk so GetComposition doesn't recompute them for a trajectory it has already seen.
+    Every result is saved as a .npy file named after a hash of the altitudes, latitudes, longitudes, dates and NRLMSIS options,
+    so changing only spacecraft parameters (intake area, h_max...) reuses the stored atmosphere.
+    When the files take more than max_bytes the least recently used ones are deleted.
+
+    INPUTS:
+        folder: folder where the results are stored. It is created if it doesn't exist.
+            Defaults to GMAT_Data/composition_cache in the repository (not in the current directory).
+        max_bytes: maximum size of the stored results in bytes.
+
+    PARAMETERS:
+        folder, max_bytes: the values you provided.
+        hits: number of results found in the cache since it was created.
+        misses: number of results that had to be calculated.
+    """
+    def __init__(self, folder:str=CACHE_FOLDER, max_bytes:float=1e9):
+
+        # Initialize the class
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, et:np.ndarray, lons:np.ndarray, lats:np.ndarray, alts:np.ndarray, options:dict=None,
+            weather:tuple=()) -> str:
+        # Hash of the inputs of NRLMSIS, dates are converted to datetime64 so lists of datetimes give the same key.
+        # weather holds the f107, f107a and ap arrays when they are given instead of looked up by pymsis.
+        digest = hashlib.sha1(repr((msis.__version__, sorted((options or {}).items()))).encode())
+        for values in (np.asarray(et, dtype='datetime64[ms]'), lons, lats, alts, *weather):
+            values = np.ascontiguousarray(values)
+            digest.update(f'{values.dtype.str}{values.shape}'.encode())
+            digest.update(values.view(np.uint8))
+
+        return digest.hexdigest()
+
+    def get(self, key:str) -> np.ndarray:
+        # Stored result for a key, or None if there isn't one
+        filepath = os.path.join(self.folder, key + '.npy')
+        try:
+            composition_data = np.load(filepath)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # Mark it as recently used
+        os.utime(filepath)
+        self.hits += 1
+        return composition_data
+
+    def put(self, key:str, composition_data:np.ndarray):
+        # Store a result, then delete the least recently used ones if the cache is too big
+        filepath = os.path.join(self.folder, key + '.npy')
+        np.save(filepath + '.tmp.npy', composition_data)
+        os.replace(filepath + '.tmp.npy', filepath)
+
+        files = sorted(glob.glob(os.path.join(self.folder, '*.npy')), key=os.path.getmtime)
+        total = sum(os.path.getsize(file) for file in files)
+        for file in files[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(file)
+            os.remove(file)
+
+    def stats(self) -> dict:
+        # Hit and miss counts and what is stored on disk
+        files = glob.glob(os.path.join(self.folder, '*.npy'))
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / max(self.hits + self.misses, 1),
+            'entries': len(files),
+            'bytes': sum(os.path.getsize(file) for file in files)
+        }
+
+
+class CompositionGrid:
+    """
+    This class gives an approximate composition of the atmosphere for long trajectories that go through the same places many times,
+    like the perigee passes of an eccentric orbit, running NRLMSIS far fewer times than there are samples.
+    Every sample is moved to the nearest node of a grid of latitudes, longitudes and times (every dlat, dlon and dt),
+    and NRLMSIS is only run at the nodes used, at altitudes every dh km. The composition of each sample is then interpolated
+    between the two altitudes around it (in log space for the densities, linearly for the temperature, like DensityTable).
+    The nodes calculated are kept, so later calls (or the next chunks of a file) going through the same cells reuse them.
+
+    The error comes mostly from the size of the cells, so check_samples random samples of every call are also calculated exactly
+    and compared, giving the largest relative error in density (see stats). These extra NRLMSIS runs are counted separately.
+
+    INPUTS:
+        dh: altitude spacing in km.
+        dlat, dlon: latitude and longitude spacing in degrees. 360 / dlon should be an integer.
+        dt: time spacing in seconds.
+        check_samples: number of samples of every call compared with NRLMSIS run exactly. 0 to skip the check.
+
+    PARAMETERS:
+        dh, dlat, dlon, dt, check_samples: the values you provided.
+        samples: number of samples interpolated since the grid was created.
+        msis_points: number of nodes calculated with NRLMSIS.
+        check_points: number of samples calculated exactly to check the error.
+        max_error: largest relative error in density found in the checks.
+    """
+    def __init__(self, dh:float=5, dlat:float=1, dlon:float=1, dt:float=600, check_samples:int=1000):
+
+        # Initialize the class
+        self.dh = dh
+        self.dlat = dlat
+        self.dlon = dlon
+        self.dt = dt
+        self.check_samples = check_samples
+        self.samples = 0
+        self.msis_points = 0
+        self.check_points = 0
+        self.max_error = 0.0
+
+        # Number of nodes along each axis, the nodes are numbered with a single integer key
+        self._n_alt = int(1e5 / dh) + 2  # Altitudes up to 100000 km
+        self._n_lat = int(np.rint(180 / dlat)) + 1
+        self._n_lon = int(np.rint(360 / dlon))
+        self._n_time = 2**63 // (self._n_alt * self._n_lat * self._n_lon)
+        if self._n_time < 1000:
+            raise ValueError('The grid is too fine, use larger spacings.')
+        self._time0 = None
+
+        # Nodes calculated so far, sorted by key, with the log of the densities and the temperature
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._values = np.zeros((0, 11))
+
+    def __call__(self, et:np.ndarray, lons:np.ndarray, lats:np.ndarray, alts:np.ndarray, workers:int=1, chunk_size:int=100_000,
+                 space_weather:'SpaceWeather'=None) -> np.ndarray:
+        """
+        Interpolates the composition at the given points, running NRLMSIS at the nodes that are not calculated yet.
+        The inputs are the same as RunMsis, space_weather is a SpaceWeather used at the nodes (and checked samples).
+        Returns a numpy array of size len(alts) x 11 like NRLMSIS, with NaN already replaced by 0.
+        """
+        alts = np.asarray(alts, dtype=float)
+        t = np.asarray(et, dtype='datetime64[ms]').astype(np.int64) / (self.dt * 1e3)
+
+        if alts.size and (alts.min() < 0 or alts.max() >= 1e5):
+            raise ValueError('CompositionGrid only supports altitudes between 0 and 100000 km.')
+
+        # Node of each sample, the first time the grid is used sets the origin of times
+        if self._time0 is None:
+            self._time0 = int(np.rint(t.min())) - self._n_time // 2 if t.size else 0
+        x = alts / self.dh
+        i_alt = np.floor(x).astype(np.int64)
+        i_lat = np.rint((np.asarray(lats) + 90) / self.dlat).astype(np.int64)
+        i_lon = np.rint(np.asarray(lons) / self.dlon).astype(np.int64) % self._n_lon
+        i_time = np.rint(t).astype(np.int64) - self._time0
+        if i_time.size and (i_time.min() < 0 or i_time.max() >= self._n_time):
+            raise ValueError('The dates are too far from the ones used before with this grid.')
+
+        keys = ((i_time * self._n_lon + i_lon) * self._n_lat + i_lat) * self._n_alt + i_alt
+
+        # Cells used, and the nodes below and above each one
+        cells, inverse = np.unique(keys, return_inverse=True)
+        nodes = np.union1d(cells, cells + 1)
+        new = np.setdiff1d(nodes, self._keys, assume_unique=True)
+        if len(new):
+            self._AddNodes(new, workers, chunk_size, space_weather)
+
+        lower = np.searchsorted(self._keys, cells)[inverse]
+        upper = np.searchsorted(self._keys, cells + 1)[inverse]
+
+        # Interpolate in altitude
+        frac = (x - i_alt)[:, None]
+        composition_data = self._values[lower]
+        composition_data += frac * (self._values[upper] - composition_data)
+        np.exp(composition_data[:, :10], out=composition_data[:, :10])
+        self.samples += len(alts)
+
+        # Compare some samples with NRLMSIS
+        if self.check_samples and len(alts):
+            idx = np.random.default_rng(self.samples).choice(len(alts), min(self.check_samples, len(alts)), replace=False)
+            weather = () if space_weather is None else space_weather(np.asarray(et)[idx])
+            exact = np.nan_to_num(msis.calculate(np.asarray(et)[idx], np.asarray(lons)[idx], np.asarray(lats)[idx], alts[idx], *weather))
+            valid = exact[:, 0] > 0
+            if np.any(valid):
+                error = np.abs(composition_data[idx, 0][valid] / exact[valid, 0] - 1)
+                self.max_error = max(self.max_error, float(error.max()))
+            self.check_points += len(idx)
+
+        return composition_data
+
+    def _AddNodes(self, keys:np.ndarray, workers:int, chunk_size:int, space_weather:'SpaceWeather'):
+        # Run NRLMSIS at new nodes and add them to the sorted ones
+        rest, i_alt = np.divmod(keys, self._n_alt)
+        rest, i_lat = np.divmod(rest, self._n_lat)
+        i_time, i_lon = np.divmod(rest, self._n_lon)
+
+        alts = i_alt * self.dh
+        lats = np.clip(i_lat * self.dlat - 90, -90, 90)
+        lons = i_lon * self.dlon
+        et = ((i_time + self._time0) * self.dt * 1e3).astype(np.int64).astype('datetime64[ms]')
+        weather = () if space_weather is None else space_weather(et)
+
+        composition_data = np.nan_to_num(RunMsis(et, lons, lats, alts, workers, chunk_size, *weather))
+        self.msis_points += len(keys)
+
+        # Log of the densities, empty densities get a very low value so they come back as 0
+        values = composition_data.copy()
+        positive = values[:, :10] > 0
+        values[:, :10] = np.where(positive, np.log(np.where(positive, values[:, :10], 1)), -1e5)
+
+        keys = np.concatenate([self._keys, keys])
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._values = np.concatenate([self._values, values])[order]
+
+    def stats(self) -> dict:
+        # How much NRLMSIS was avoided and the error found
+        return {
+            'samples': self.samples,
+            'msis_points': self.msis_points,
+            'check_points': self.check_points,
+            'hit_rate': 1 - self.msis_points / max(self.samples, 1),
+            'nodes': len(self._keys),
+            'max_error': self.max_error
+        }
+
+
+def RunMsis(et:np.ndarray, lons:np.ndarray, lats:np.ndarray, alts:np.ndarray, workers:int=1, chunk_size:int=100_000,
+            f107s:np.ndarray=None, f107as:np.ndarray=None, aps:np.ndarray=None) -> np.ndarray:
+    """
+    This function runs NRLMSIS over a set of points, optionally splitting them in chunks evaluated by a pool of processes.
+    Every point is independent, so the result is the same as a single call, in the same order.
+
+    Inputs:
+        et, lons, lats, alts: dates, longitudes (in degrees), latitudes (in degrees) and altitudes (in km) of the points.
+        workers: number of processes. With 1 (the default) NRLMSIS runs in this process.
+        chunk_size: number of points sent to a process at a time.
+        f107s, f107as, aps: optional space weather of each point, see SpaceWeather. If None, pymsis looks it up.
+
+    Returns:
+        composition_data: NRLMSIS output, a numpy array of size len(alts) x 11.
+    """
+    if workers <= 1 or len(alts) <= chunk_size:
+        return msis.calculate(et, lons, lats, alts, f107s, f107as, aps)
+
+    chunks = (tuple(None if values is None else values[i:i + chunk_size] for values in (et, lons, lats, alts, f107s, f107as, aps))
+              for i in range(0, len(alts), chunk_size))
+
+    # map returns the results in the same order as the chunks
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return np.concatenate(list(pool.map(_MsisChunk, chunks)))
+
+
+def _MsisChunk(chunk:tuple) -> np.ndarray:
+    # Run NRLMSIS on one chunk, this has to be a module level function to be sent to the worker processes
+    return msis.calculate(*chunk)
+
+
+def GetComposition(data: dict, table=None, verbose:bool=True, workers:int=1, chunk_size:int=100_000,
+                   cache:CompositionCache=None, Matrix:bool=False, space_weather:SpaceWeather=None,
+                   grid:CompositionGrid=None) -> dict:
     """
     This function will return the composition of the atmosphere at the given position points.
 
@@ -24,6 +290,19 @@ def GetComposition(data: dict) -> dict:
             - 'latitude': list of latitudes (in degrees)
             - 'longitude': list of longitudes (in degrees)
             - 'date': list of datetime objects
+        table: optional DensityTable (from AltitudeAnalysis.classes) to interpolate instead of running NRLMSIS.
+            The table only depends on altitude, so latitude, longitude and date are ignored when it is used.
+        verbose: if False, don't print the progress messages.
+        workers: number of processes used to run NRLMSIS, see RunMsis. Scripts using more than 1 need an if __name__ == '__main__' guard.
+        chunk_size: number of points sent to each process at a time.
+        cache: optional CompositionCache. If the same positions and dates were calculated before, NRLMSIS is not run again.
+        Matrix: if True, return the NRLMSIS output as a numpy array of size len(altitude) x 11 instead of a dictionary.
+            The columns are in the same order as the dictionary keys below (see SPECIES).
+        space_weather: optional SpaceWeather with the F10.7 and Ap history to use. If None, pymsis looks them up in its own file,
+            downloading it if it isn't there.
+        grid: optional CompositionGrid to interpolate an approximate composition from a grid of NRLMSIS nodes instead of
+            running it at every point. The grid keeps its nodes between calls and reports the error in grid.stats().
+            The cache is not used with a grid.
 
     Returns:
         composition: dictionary with the composition of the atmosphere at the given positions, containing numpy arrays:
@@ -46,14 +325,33 @@ def GetComposition(data: dict) -> dict:
     lons = np.array(data['longitude'])
     et = np.array(data['date'])
 
+    # Solar and geomagnetic activity at each date
+    weather = () if space_weather is None or table is not None or grid is not None else space_weather(et)
+
     # Obtain atmospheric composition (outputs a numpy array of size len(et) x 11)
-    print('Calculating atmospheric composition...')
-    composition_data = msis.calculate(et, lons, lats, alts)  # Adjust solar activity as needed
-    print('Composition calculation complete!')
+    if verbose:
+        print('Calculating atmospheric composition...')
+    if table is not None:
+        composition_data = table(alts)
+    elif grid is not None:
+        composition_data = grid(et, lons, lats, alts, workers, chunk_size, space_weather)
+    elif cache is None:
+        composition_data = RunMsis(et, lons, lats, alts, workers, chunk_size, *weather)
+    else:
+        key = cache.key(et, lons, lats, alts, weather=weather)
+        composition_data = cache.get(key)
+        if composition_data is None:
+            composition_data = RunMsis(et, lons, lats, alts, workers, chunk_size, *weather)
+            cache.put(key, composition_data)
+    if verbose:
+        print('Composition calculation complete!')
 
     # Replace nan entries by 0
     composition_data = np.nan_to_num(composition_data)
 
+    if Matrix:
+        return composition_data
+
     # Create a dictionary with the composition of the atmosphere
     composition = {
         'rho':        composition_data[:, 0],  # In kg/m^3
@@ -73,19 +371,26 @@ def GetComposition(data: dict) -> dict:
 
 
 # ----------- MASS FLOW FUNCTIONS ------------
-def GetMassFlow(states:dict, composition:dict, h_max:float=None) -> tuple[dict, dict]:
+def GetMassFlowMatrix(states:dict, composition_data:np.ndarray, h_max:float=None,
+                      passes:np.ndarray=None, dtype:type=np.float64) -> tuple[np.ndarray, np.ndarray]:
     """
-    This function calculates the mass flow rate and total mass captured by the spacecraft.
+    This function calculates the mass flow rate and total mass captured by the spacecraft for all the species at once.
+    It fills one matrix with the mass flow of every species,
+    and the totals are a single matrix-vector product with the trapezoidal rule weights of the time samples.
 
     Inputs:
         states: dictionary with the data from the spacecraft simulation.
-        composition: dictionary with the composition of the atmosphere at the spacecraft positions.
-        h_max: maximum altitude for the intake to be active (in km). If None, the intake is always active. 
-            This is basically equivalent to turning off the intake at a certain altitude.
+        composition_data: NRLMSIS output at the spacecraft positions, a numpy array of size N x 11 (or N x 10 without temperature),
+            like GetComposition(..., Matrix=True). The dictionary returned by GetComposition also works.
+        h_max: maximum altitude for the intake to be active (in km). If None, the intake is always active.
+        passes: start and stop indices of the samples where the intake is active, like FindPasses. h_max is the same
+            as passes=FindPasses(states['altitude'], h_max).
+        dtype: floating point type of m_dot. np.float32 halves its memory, the integral is still calculated in float64.
 
     Returns:
-        m_dot: dictionary with the mass flow rates of each component at each location.
-        m_total: dictionay with the total mass captured by the spacecraft of each component.
+        m_dot: mass flow rates, a numpy array of size 10 x N with one row per species in the order of SPECIES.
+            The first row is in kg/s, the rest in particles/s.
+        m_total: total mass captured of each species, a numpy array of size 10 in float64. The first one is in kg, the rest in particles.
     """
 
     # Extract data
@@ -93,45 +398,326 @@ def GetMassFlow(states:dict, composition:dict, h_max:float=None) -> tuple[dict,
     velocities = states['velocity']  # In m/s
     elapsed_seconds = states['elapsed_seconds'] # In seconds
 
-    # Create effective area array based on altitude, this is like turning on and off the intake at a certain altitude
-    if h_max is None:
+    # Create effective area array based on the passes, this is like turning on and off the intake at a certain altitude
+    if h_max is not None:
+        if h_max < 70:
+            raise ValueError('The maximum altitude for the intake to be active must be above 70 km to be realistic.')
+        passes = FindPasses(altitudes, h_max)
+
+    if passes is None:
         A_intake_eff = spacecraft['A_intake']
-    elif h_max < 70:
-        raise ValueError('The maximum altitude for the intake to be active must be above 70 km to be realistic.')
     else:
-        A_intake_eff = np.where(altitudes < h_max, spacecraft['A_intake'], 0)
-
-    # Calculate the mass flow rate for each component
-    m_dot = {
-        'rho':        composition['rho'] *        A_intake_eff * spacecraft['eff_intake'] * velocities,  # In kg/s
-        'N2':         composition['N2']  *        A_intake_eff * spacecraft['eff_intake'] * velocities,  # In particles/s
-        'O2':         composition['O2']  *        A_intake_eff * spacecraft['eff_intake'] * velocities,  # In particles/s
-        'O':          composition['O']   *        A_intake_eff * spacecraft['eff_intake'] * velocities,  # In particles/s
-        'He':         composition['He']  *        A_intake_eff * spacecraft['eff_intake'] * velocities,  # In particles/s
-        'H':          composition['H']   *        A_intake_eff * spacecraft['eff_intake'] * velocities,  # In particles/s
-        'Ar':         composition['Ar']  *        A_intake_eff * spacecraft['eff_intake'] * velocities,  # In particles/s
-        'N':          composition['N']   *        A_intake_eff * spacecraft['eff_intake'] * velocities,  # In particles/s
-        'AnomalousO': composition['AnomalousO'] * A_intake_eff * spacecraft['eff_intake'] * velocities,  # In particles/s
-        'NO':         composition['NO']  *        A_intake_eff * spacecraft['eff_intake'] * velocities   # In particles/s
-    }
+        A_intake_eff = np.where(PassMask(passes, len(altitudes)), spacecraft['A_intake'], 0)
 
-    # Calculate the total mass captured for each component by integrating the mass flow rate over time
-    m_total = {
-        'rho':        np.trapz(m_dot['rho'], x=elapsed_seconds),  # In kg
-        'N2':         np.trapz(m_dot['N2'], x=elapsed_seconds),   # In particles
-        'O2':         np.trapz(m_dot['O2'], x=elapsed_seconds),   # In particles
-        'O':          np.trapz(m_dot['O'], x=elapsed_seconds),    # In particles
-        'He':         np.trapz(m_dot['He'], x=elapsed_seconds),   # In particles
-        'H':          np.trapz(m_dot['H'], x=elapsed_seconds),    # In particles
-        'Ar':         np.trapz(m_dot['Ar'], x=elapsed_seconds),   # In particles
-        'N':          np.trapz(m_dot['N'], x=elapsed_seconds),    # In particles
-        'AnomalousO': np.trapz(m_dot['AnomalousO'], x=elapsed_seconds),  # In particles
-        'NO':         np.trapz(m_dot['NO'], x=elapsed_seconds)    # In particles
-    }
+    # Volume flow through the intake at each sample, the same for every species
+    V_dot = A_intake_eff * spacecraft['eff_intake'] * velocities  # In m^3/s
+
+    # Calculate the mass flow rate of every species, one row each, without temporary arrays
+    m_dot = np.empty((len(SPECIES), len(V_dot)), dtype=dtype)
+    for i, key in enumerate(SPECIES):
+        density = composition_data[key] if isinstance(composition_data, dict) else composition_data[:, i]
+        np.multiply(density, V_dot, out=m_dot[i], casting='same_kind')
+
+    # Integrate over time with the trapezoidal rule, in float64 one species at a time
+    weights = _TrapezoidWeights(elapsed_seconds)
+    if m_dot.dtype == np.float64:
+        m_total = m_dot @ weights
+    else:
+        m_total = np.array([np.dot(row.astype(np.float64), weights) for row in m_dot])
 
     return m_dot, m_total
 
 
+def GetMassFlow(states:dict, composition:dict, h_max:float=None, dtype:type=np.float64) -> tuple[dict, dict]:
+    """
+    This function calculates the mass flow rate and total mass captured by the spacecraft.
+    It uses GetMassFlowMatrix and returns its results as dictionaries, the arrays in m_dot are views of its rows.
+
+    Inputs:
+        states: dictionary with the data from the spacecraft simulation.
+        composition: dictionary with the composition of the atmosphere at the spacecraft positions,
+            or the matrix returned by GetComposition(..., Matrix=True).
+        h_max: maximum altitude for the intake to be active (in km). If None, the intake is always active. 
+            This is basically equivalent to turning off the intake at a certain altitude.
+        dtype: floating point type of the mass flow rates, see GetMassFlowMatrix.
+
+    Returns:
+        m_dot: dictionary with the mass flow rates of each component at each location. In kg/s for 'rho', particles/s for the rest.
+        m_total: dictionay with the total mass captured by the spacecraft of each component. In kg for 'rho', particles for the rest.
+    """
+
+    m_dot, m_total = GetMassFlowMatrix(states, composition, h_max, dtype=dtype)
+
+    return dict(zip(SPECIES, m_dot)), dict(zip(SPECIES, m_total))
+
+
+def GetPassStatistics(states:dict, composition_data:np.ndarray, h_max:float=None, passes:np.ndarray=None) -> dict:
+    """
+    This function gives the statistics of every pass through the atmosphere (see FindPasses), all at once.
+    The intake is only active during the passes, so the captured masses add up to the total of GetMassFlowMatrix.
+    The samples of all the passes are gathered one after the other, and each statistic is a single reduction
+    (np.add.reduceat, np.minimum.reduceat...) over them, so the samples outside the atmosphere cost nothing.
+
+    Inputs:
+        states: dictionary with the data from the spacecraft simulation.
+        composition_data: NRLMSIS output at the spacecraft positions, like in GetMassFlowMatrix.
+        h_max: altitude where the passes start and end (in km).
+        passes: start and stop indices of the passes, instead of h_max.
+
+    Returns:
+        Passes: dictionary with one value per pass:
+            'start', 'stop': index of the first sample of the pass and the one after its last.
+            'date': date of the lowest point.
+            'min_altitude': lowest altitude in km.
+            'duration': time between the first and last samples in s.
+            'max_dynamic_pressure': highest 0.5 * rho * V^2 in Pa.
+            'm_total': mass captured in the pass, a numpy array of size 10 x n_passes in the order of SPECIES
+                (kg for the first row, particles for the rest).
+    """
+    altitudes = np.asarray(states['altitude'])
+    t = np.asarray(states['elapsed_seconds'], dtype=float)
+
+    if passes is None:
+        if h_max is None:
+            raise ValueError('Either h_max or passes must be given.')
+        passes = FindPasses(altitudes, h_max)
+    start, stop = passes[:, 0], passes[:, 1]
+
+    if len(passes) == 0:
+        empty = np.zeros(0)
+        return {'start': start, 'stop': stop, 'date': np.asarray(states['date'])[start], 'min_altitude': empty,
+                'duration': empty, 'max_dynamic_pressure': empty, 'm_total': np.zeros((len(SPECIES), 0))}
+
+    # Samples of the passes, one pass after the other, and where each pass starts among them
+    inside = np.flatnonzero(PassMask(passes, len(t)))
+    offsets = np.concatenate([[0], np.cumsum(stop - start)[:-1]])
+
+    # Densities and volume flow through the intake, weighted for the trapezoidal rule over the whole trajectory
+    if isinstance(composition_data, dict):
+        density = np.column_stack([np.asarray(composition_data[key])[inside] for key in SPECIES])
+    else:
+        density = composition_data[inside, :len(SPECIES)]
+    velocity = np.asarray(states['velocity'])[inside]
+    V_dot = spacecraft['A_intake'] * spacecraft['eff_intake'] * velocity * _TrapezoidWeights(t)[inside]  # In m^3
+
+    # Lowest point of each pass, the first sample of the pass at its minimum altitude
+    altitude = altitudes[inside]
+    min_altitude = np.minimum.reduceat(altitude, offsets)
+    at_min = np.flatnonzero(altitude == np.repeat(min_altitude, stop - start))
+    lowest = inside[at_min[np.searchsorted(at_min, offsets)]]
+
+    return {
+        'start': start,
+        'stop': stop,
+        'date': np.asarray(states['date'])[lowest],
+        'min_altitude': min_altitude,
+        'duration': t[stop - 1] - t[start],
+        'max_dynamic_pressure': np.maximum.reduceat(0.5 * density[:, 0] * velocity**2, offsets),
+        'm_total': np.add.reduceat(density * V_dot[:, None], offsets, axis=0).T
+    }
+
+
+def GetCumulativeMass(states:dict, m_dot, start:np.ndarray=None):
+    """
+    This function calculates the mass captured from the first sample up to every sample, for all the species at once.
+    Each step of the trapezoidal rule is added to the previous ones with a single cumulative sum, so the last value is
+    the total of GetMassFlow (up to rounding) and the whole curve costs about the same as the total.
+
+    Inputs:
+        states: dictionary with the data from the spacecraft simulation.
+        m_dot: mass flow rates, the matrix of GetMassFlowMatrix or the dictionary of GetMassFlow.
+        start: optional mass already captured at the first sample, one value per species (used to continue a curve).
+
+    Returns:
+        cumulative: mass captured up to each sample, in the same format as m_dot (a 10 x N matrix or a dictionary).
+            In kg for 'rho', particles for the rest.
+    """
+    is_dict = isinstance(m_dot, dict)
+    if is_dict:
+        m_dot = np.stack([m_dot[key] for key in SPECIES])
+
+    # Steps of the trapezoidal rule, added up in place
+    t = np.asarray(states['elapsed_seconds'], dtype=float)
+    cumulative = np.empty(m_dot.shape)
+    cumulative[:, 0] = 0 if start is None else start
+    np.add(m_dot[:, :-1], m_dot[:, 1:], out=cumulative[:, 1:])
+    cumulative[:, 1:] *= np.diff(t) / 2
+    np.cumsum(cumulative, axis=1, out=cumulative)
+
+    return dict(zip(SPECIES, cumulative)) if is_dict else cumulative
+
+
+def TimeToMass(states:dict, m_dot, cumulative, targets, species:str='rho') -> np.ndarray:
+    """
+    This function finds when the captured mass of a species first reaches each target, for example the tank load.
+    The sample where each target is reached is found with a binary search over the cumulative curve (which never decreases),
+    then the time inside that step is solved exactly for the trapezoidal rule (the mass flow changes linearly in the step).
+
+    Inputs:
+        states: dictionary with the data from the spacecraft simulation.
+        m_dot: mass flow rates, like in GetCumulativeMass.
+        cumulative: mass captured up to each sample, from GetCumulativeMass.
+        targets: masses to reach, a number or an array (in kg for 'rho', particles for the rest).
+        species: species of the targets, one of SPECIES.
+
+    Returns:
+        times: elapsed seconds when each target is reached, the same shape as targets. np.inf if it is never reached.
+    """
+    t = np.asarray(states['elapsed_seconds'], dtype=float)
+    row = SPECIES.index(species)
+    flow = m_dot[species] if isinstance(m_dot, dict) else m_dot[row]
+    curve = cumulative[species] if isinstance(cumulative, dict) else cumulative[row]
+    targets = np.asarray(targets, dtype=float)
+
+    # First sample at or above each target
+    k = np.searchsorted(curve, targets, side='left')
+    reached = k < len(curve)
+    i = np.clip(k - 1, 0, len(curve) - 2)
+
+    # Inside the step the mass is M0 + a * tau + (b - a) * tau^2 / (2 * dt), solved for tau in a stable form
+    a, b, dt = flow[i], flow[i + 1], t[i + 1] - t[i]
+    dM = np.maximum(targets - curve[i], 0)
+    root = np.sqrt(np.maximum(a**2 + 2 * (b - a) * dM / np.where(dt > 0, dt, 1), 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = np.where(dM > 0, 2 * dM / (a + root), 0)
+
+    return np.where(reached, np.where(k == 0, t[0], np.minimum(t[i] + tau, t[i + 1])), np.inf)
+
+
+def _TrapezoidWeights(t:np.ndarray) -> np.ndarray:
+    # Weight of each sample in the trapezoidal rule, so that the integral of y over t is y @ weights
+    dt = np.diff(t) / 2
+    weights = np.zeros(len(t))
+    weights[:-1] += dt
+    weights[1:] += dt
+    return weights
+
+
+# ----------- STREAMING FUNCTIONS ------------
+def IterMassFlow(filepath:str, chunk_rows:int=1_000_000, h_max:float=None, table=None, workers:int=1,
+                 cache:CompositionCache=None, space_weather:SpaceWeather=None, grid:CompositionGrid=None):
+    """
+    This function runs the whole pipeline (reading, composition and mass flow) over a GMAT GeoPos file in chunks of chunk_rows rows.
+    Only one chunk is in memory at a time, so the peak memory depends on chunk_rows and not on the size of the file.
+    The total captured mass is integrated chunk by chunk, adding the trapezoid between the last sample of a chunk and the first
+    of the next one, so the final totals are the same as running GetMassFlow over the whole file (up to rounding).
+
+    Inputs:
+        filepath: path to the GMAT GeoPos file.
+        chunk_rows: number of rows processed at a time.
+        h_max: maximum altitude for the intake to be active (in km), like in GetMassFlow.
+        table: optional DensityTable to use instead of NRLMSIS, like in GetComposition.
+        workers: number of processes used to run NRLMSIS on each chunk, like in GetComposition.
+        cache: optional CompositionCache, every chunk is stored separately.
+        space_weather: optional SpaceWeather, like in GetComposition.
+        grid: optional CompositionGrid, like in GetComposition. The nodes of a chunk are reused by the next ones.
+
+    Yields, for every chunk:
+        states: dictionary with the states of the chunk, like ReadGeoPos.
+        m_dot: dictionary with the mass flow rates of each component in the chunk, like GetMassFlow.
+        m_total: dictionary with the total mass captured from the start of the file to the end of the chunk.
+    """
+
+    m_total = None
+    for states in IterGeoPos(filepath, chunk_rows):
+
+        composition_data = GetComposition(states, table=table, verbose=False, workers=workers, cache=cache, Matrix=True,
+                                          space_weather=space_weather, grid=grid)
+        m_dot, chunk_total = GetMassFlowMatrix(states, composition_data, h_max=h_max)
+
+        if m_total is None:
+            m_total = chunk_total
+        else:
+            # Add the chunk and the step between the previous chunk and this one
+            dt = states['elapsed_seconds'][0] - last_time
+            m_total = m_total + chunk_total + dt * (last_m_dot + m_dot[:, 0]) / 2
+
+        # Keep the last sample for the next step
+        last_time = states['elapsed_seconds'][-1]
+        last_m_dot = m_dot[:, -1]
+
+        yield states, dict(zip(SPECIES, m_dot)), dict(zip(SPECIES, m_total))
+
+
+def GetMassFlowStream(filepath:str, chunk_rows:int=1_000_000, h_max:float=None, table=None, workers:int=1,
+                      cache:CompositionCache=None, space_weather:SpaceWeather=None, grid:CompositionGrid=None) -> dict:
+    """
+    This function calculates the total mass captured over a GMAT GeoPos file, reading it in chunks with IterMassFlow.
+    Use it instead of ReadGeoPos, GetComposition and GetMassFlow when the file doesn't fit in memory.
+
+    Returns:
+        m_total: dictionay with the total mass captured by the spacecraft of each component, like GetMassFlow.
+    """
+    m_total = None
+    for _, _, m_total in IterMassFlow(filepath, chunk_rows, h_max, table, workers, cache, space_weather, grid):
+        pass
+
+    return m_total
+
+
+def IterCumulativeMass(filepath:str, chunk_rows:int=1_000_000, h_max:float=None, table=None, workers:int=1,
+                       cache:CompositionCache=None, space_weather:SpaceWeather=None, grid:CompositionGrid=None):
+    """
+    This function runs IterMassFlow and gives the mass captured up to every sample, chunk by chunk.
+    The running total is carried from the last sample of a chunk to the first of the next one (adding the step between them),
+    so joining the chunks gives the same curve as GetCumulativeMass over the whole file.
+    The inputs are the same as IterMassFlow.
+
+    Yields, for every chunk:
+        states: dictionary with the states of the chunk, like ReadGeoPos.
+        m_dot: mass flow rates in the chunk, a numpy array of size 10 x chunk length.
+        cumulative: mass captured from the start of the file up to each sample of the chunk, the same size as m_dot.
+    """
+    last = None
+    for states, m_dot, _ in IterMassFlow(filepath, chunk_rows, h_max, table, workers, cache, space_weather, grid):
+        m_dot = np.stack([m_dot[key] for key in SPECIES])
+
+        # Mass at the first sample of the chunk
+        if last is None:
+            start = None
+        else:
+            last_time, last_m_dot, last_cumulative = last
+            start = last_cumulative + (states['elapsed_seconds'][0] - last_time) * (last_m_dot + m_dot[:, 0]) / 2
+
+        cumulative = GetCumulativeMass(states, m_dot, start)
+        last = states['elapsed_seconds'][-1], m_dot[:, -1], cumulative[:, -1]
+
+        yield states, m_dot, cumulative
+
+
+def GetTimeToMassStream(filepath:str, targets, species:str='rho', chunk_rows:int=1_000_000, h_max:float=None, table=None,
+                        workers:int=1, cache:CompositionCache=None, space_weather:SpaceWeather=None,
+                        grid:CompositionGrid=None) -> np.ndarray:
+    """
+    This function finds when the captured mass reaches each target over a GMAT GeoPos file, reading it in chunks with
+    IterCumulativeMass. It stops reading as soon as every target is reached.
+    The other inputs are the same as IterMassFlow.
+
+    Returns:
+        times: elapsed seconds when each target is reached, like TimeToMass. np.inf if it is never reached.
+    """
+    targets = np.asarray(targets, dtype=float)
+    times = np.full(targets.shape, np.inf)
+
+    previous = None
+    for states, m_dot, cumulative in IterCumulativeMass(filepath, chunk_rows, h_max, table, workers, cache, space_weather, grid):
+
+        # Put the last sample of the previous chunk in front, for the targets reached between the two chunks
+        t = states['elapsed_seconds']
+        if previous is not None:
+            t = np.concatenate([[previous[0]], t])
+            m_dot = np.concatenate([previous[1], m_dot], axis=1)
+            cumulative = np.concatenate([previous[2], cumulative], axis=1)
+        previous = t[-1], m_dot[:, -1:], cumulative[:, -1:]
+
+        pending = np.isinf(times)
+        times[pending] = TimeToMass({'elapsed_seconds': t}, m_dot, cumulative, targets[pending], species)
+        if not np.any(np.isinf(times)):
+            break
+
+    return times
+
+
 # ----------- TESTING ------------
 if __name__ == '__main__':
 
@@ -3,117 +3,556 @@
 
 # This file is dedicated to reading and processing the data from GMAT simulations.
 
+import os
+import re
+import json
+import hashlib
 import numpy as np
-from datetime import datetime
+from itertools import islice
+
+# GMAT column name endings used by ReadGeoPos and the key each one is stored under
+GEOPOS_COLUMNS = {
+    '.Altitude': 'altitude',
+    '.Latitude': 'latitude',
+    '.Longitude': 'longitude',
+    'Gregorian': 'date',
+    '.VMAG': 'velocity',
+    '.ElapsedSecs': 'elapsed_seconds'
+}
+
+# WGS-84 ellipsoid and rotation of the Earth, used to convert the state vectors to altitude, latitude and longitude
+WGS84_RADIUS = 6378.137  # km
+WGS84_FLATTENING = 1 / 298.257223563
+EARTH_ROTATION = 7.292115e-5  # rad/s
+TT_UT1 = 69.184  # s, TT - UT1 since 2017 (TAI - UTC = 37 s, UT1 ~ UTC)
+
+# Month abbreviations in GMAT Gregorian dates, as 3 byte integer codes
+_MONTH_CODES = np.array([int.from_bytes(m, 'big') for m in
+                         (b'Jan', b'Feb', b'Mar', b'Apr', b'May', b'Jun', b'Jul', b'Aug', b'Sep', b'Oct', b'Nov', b'Dec')])
+
 
 # ----------- DATA READING FUNCTIONS ------------
 
-def ReadState(filepath:str) -> np.ndarray:
+def ReadState(filepath:str, cache:bool=False) -> np.ndarray:
     """
     This function reads the state vector data from a GMAT simulation file and returns it as a numpy array.
     Inputs:
         filepath: path to the GMAT simulation file. The file contains the state vector data, including mass and time.
+        cache: if True, use (or create) the binary cache of the file, see ReadReport.
     Returns:
-        data: numpy array with the data from the GMAT simulation ordered as [x, y, z, vx, vy, vz, m, t].
+        data: numpy array with the data from the GMAT simulation ordered as [vx, vy, vz, x, y, z, m, t].
     """
-    data = np.loadtxt(filepath, skiprows=1)
+    data = np.column_stack(list(ReadReport(filepath, cache).values()))
     return data
 
 
-def ReadGeoPos(filepath: str='GMAT_Data/GeoPosData.txt') -> tuple[dict, dict]:
+def ReadReport(filepath:str, cache:bool=False) -> dict:
+    """
+    This function reads a GMAT report file into a dictionary of numpy arrays, one per column.
+    The columns are found from the header, so any set of GMAT parameters in any order can be read.
+    GMAT writes fixed width columns, so the whole file is read at once and every column is converted in bulk.
+    If the columns are not aligned (for example a value wider than its column) the file is split on whitespace instead, which is slower.
+
+    With cache=True the columns are also saved as .npy files in a folder next to the report (filepath + '.cache'),
+    and the next reads memory-map them instead of parsing the text again.
+    The cache is keyed on the size, modification time and hash of the report, so it is rebuilt when the report changes.
+    If the modification time changes but the contents don't (for example after copying the file), the cache is kept.
+    Rebuilding the cache replaces its files instead of writing over them, so arrays returned by earlier reads stay valid.
+
+    Inputs:
+        filepath: path to the GMAT report file.
+        cache: if True, use (or create) the binary cache of the file.
+
+    Returns:
+        report: dictionary with the GMAT column names as keys (e.g. 'TestSC.Earth.Altitude').
+                Gregorian date columns are numpy datetime64[ms] arrays, every other column is a float array.
+                Arrays loaded from the cache are read-only memory maps.
+    """
+    if cache:
+        report = _LoadCache(filepath)
+        if report is not None:
+            return report
+
+    stat = os.stat(filepath)
+    with open(filepath, 'rb') as file:
+        header = file.readline()
+        body = file.read()
+
+    report = _ParseReport(header, body)
+
+    if cache:
+        _SaveCache(filepath, report, stat, hashlib.sha1(header + body).hexdigest())
+
+    return report
+
+
+def ReadGeoPos(filepath: str='GMAT_Data/GeoPosData.txt', cache:bool=False) -> dict:
     """
     This function reads the altitude data from a GMAT simulation file and stores it in a dictionary.
 
     Inputs:
         filepath: path to the GMAT simulation file. 
                 The file contains altitude, latitude, longitude, date, velocity magnitude and elapsed seconds data.
+                The columns are found by the end of their GMAT names (see GEOPOS_COLUMNS), so their order doesn't matter.
+        cache: if True, use (or create) the binary cache of the file, see ReadReport.
 
     Returns:
         States: dictionary with keys ['altitude', 'latitude', 'longitude', 'date', 'velocity', 'elapsed_seconds'].
-                Each key maps to a pre-allocated list of corresponding data.
-    """
-    # Determine the number of lines in the file (excluding the header)
-    with open(filepath, 'r') as file:
-        num_lines = sum(1 for _ in file) - 1  # Subtract 1 for the header line
-
-    # Pre-allocate lists
-    altitude = [0.0] * num_lines
-    latitude = [0.0] * num_lines
-    longitude = [0.0] * num_lines
-    date = [None] * num_lines  # Pre-allocate for datetime objects
-    velocity = [0.0] * num_lines
-    elapsed_seconds = [0.0] * num_lines
-
-    # Read the file and populate the lists
-    with open(filepath, 'r') as file:
-        next(file)  # Skip the header
-
-        for i, line in enumerate(file):
-            parts = line.split()
-            altitude[i] = float(parts[0])
-            latitude[i] = float(parts[1])
-            longitude[i] = float(parts[2])
-
-            # Parse the date string into a datetime object
-            date_str = " ".join(parts[3:7])
-            date[i] = datetime.strptime(date_str, "%d %b %Y %H:%M:%S.%f")
-            
-            velocity[i] = float(parts[7]) * 1000  # Convert from km/s to m/s
-            elapsed_seconds[i] = float(parts[8])
-
-    # Store all lists in a dictionary
-    States = {
-        "altitude": np.array(altitude),
-        "latitude": np.array(latitude),
-        "longitude": np.array(longitude),
-        "date": np.array(date),
-        "velocity": np.array(velocity),
-        "elapsed_seconds": np.array(elapsed_seconds)
-    }
+                Each key maps to a numpy array, 'date' is a datetime64[ms] array and 'velocity' is in m/s.
+    """
+    return _GeoPosStates(ReadReport(filepath, cache), filepath)
+
+
+def IterReport(filepath:str, chunk_rows:int=1_000_000):
+    """
+    This function reads a GMAT report file in chunks of chunk_rows rows, so files larger than the memory can be processed.
+    It is a generator, every chunk is a dictionary like the one returned by ReadReport.
+    """
+    with open(filepath, 'rb') as file:
+        header = file.readline()
+
+        while True:
+            lines = list(islice(file, chunk_rows))
+            if not lines:
+                break
+            yield _ParseReport(header, b''.join(lines))
+
+
+def IterGeoPos(filepath:str='GMAT_Data/GeoPosData.txt', chunk_rows:int=1_000_000):
+    """
+    This function reads a GMAT GeoPos file in chunks of chunk_rows rows.
+    It is a generator, every chunk is a dictionary like the one returned by ReadGeoPos.
+    """
+    for report in IterReport(filepath, chunk_rows):
+        yield _GeoPosStates(report, filepath)
+
+
+def _LoadCache(filepath:str) -> dict:
+    # Memory-map the cached columns of a report, or return None if there is no valid cache
+    folder = str(filepath) + '.cache'
+    try:
+        with open(os.path.join(folder, 'manifest.json')) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    stat = os.stat(filepath)
+    if manifest['size'] != stat.st_size:
+        return None
+
+    if manifest['mtime_ns'] != stat.st_mtime_ns:
+        # The file was touched, only keep the cache if the contents are the same
+        with open(filepath, 'rb') as file:
+            if hashlib.sha1(file.read()).hexdigest() != manifest['hash']:
+                return None
+        manifest['mtime_ns'] = stat.st_mtime_ns
+        _WriteManifest(folder, manifest)
+
+    return {column['name']: np.load(os.path.join(folder, column['file']), mmap_mode='r') for column in manifest['columns']}
+
+
+def _SaveCache(filepath:str, report:dict, stat:os.stat_result, digest:str):
+    # Save every column of a report as .npy, the manifest is written last so a half written cache is never used
+    folder = str(filepath) + '.cache'
+    try:
+        os.makedirs(folder, exist_ok=True)
+        if os.path.exists(os.path.join(folder, 'manifest.json')):
+            os.remove(os.path.join(folder, 'manifest.json'))
+
+        columns = []
+        for i, (name, values) in enumerate(report.items()):
+            # Write to a new file and swap it in, the memory maps of an older cache keep the old file
+            with open(os.path.join(folder, f'{i}.npy.tmp'), 'wb') as file:
+                np.save(file, values)
+            os.replace(os.path.join(folder, f'{i}.npy.tmp'), os.path.join(folder, f'{i}.npy'))
+            columns.append({'name': name, 'file': f'{i}.npy'})
+
+        _WriteManifest(folder, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest, 'columns': columns})
+
+    except OSError:
+        # The cache is optional, for example the folder could be read-only
+        pass
+
+
+def _WriteManifest(folder:str, manifest:dict):
+    # Written to a new file and swapped in, so a reader never sees half of it
+    try:
+        with open(os.path.join(folder, 'manifest.json.tmp'), 'w') as file:
+            json.dump(manifest, file, indent=4)
+        os.replace(os.path.join(folder, 'manifest.json.tmp'), os.path.join(folder, 'manifest.json'))
+    except OSError:
+        pass
+
+
+def _GeoPosStates(report:dict, filepath:str) -> dict:
+    # Pick the GeoPos columns out of a GMAT report, in the order of GEOPOS_COLUMNS
+    States = {}
+    for ending, key in GEOPOS_COLUMNS.items():
+        names = [name for name in report if name.endswith(ending)]
+        if not names:
+            raise ValueError(f'No column ending in {ending} found in {filepath}.')
+        States[key] = report[names[0]]
+
+    States['velocity'] = States['velocity'] * 1000  # Convert from km/s to m/s
 
     return States
 
 
+def _ParseReport(header:bytes, body:bytes) -> dict:
+    # Column names and the position where each one starts in the header
+    columns = [(match.group().decode(), match.start()) for match in re.finditer(rb'\S+', header)]
+
+    # Make sure the last line ends like the others
+    eol = b'\r\n' if header.endswith(b'\r\n') else b'\n'
+    if body and not body.endswith(eol):
+        body += eol
+
+    report = _ParseFixedWidth(body, columns, eol)
+    if report is None:
+        report = _ParseTokens(body, columns)
+
+    return report
+
+
+def _ParseFixedWidth(body:bytes, columns:list, eol:bytes) -> dict:
+    # Read every line as a row of a byte matrix and every column as a block of it. Returns None if the lines are not aligned
+    line_len = body.find(b'\n') + 1
+    if line_len == 0 or len(body) % line_len:
+        return None
+
+    rows = np.frombuffer(body, dtype=np.uint8).reshape(-1, line_len)
+    starts = [start for _, start in columns]
+    stops = starts[1:] + [line_len - len(eol)]
+
+    # Every line has to end in the same place and have a space before each column
+    if not np.all(rows[:, -1] == ord('\n')) or any(np.any(rows[:, start - 1] != ord(' ')) for start in starts[1:]):
+        return None
+
+    report = {}
+    for (name, start), stop in zip(columns, stops):
+        if name.endswith('Gregorian'):
+            report[name] = _ParseGregorian(rows[:, start:stop])
+        else:
+            report[name] = np.ascontiguousarray(rows[:, start:stop]).view(f'S{stop - start}').ravel().astype(np.float64)
+
+    return report
+
+
+def _ParseTokens(body:bytes, columns:list) -> dict:
+    # Split the file on whitespace. Gregorian dates take 4 tokens ('01 Jan 2025 12:00:37.184')
+    widths = [4 if name.endswith('Gregorian') else 1 for name, _ in columns]
+    tokens = np.array(body.split()).reshape(-1, sum(widths))
+
+    report = {}
+    k = 0
+    for (name, _), width in zip(columns, widths):
+        if width == 4:
+            # Put the date back together in the fixed width layout
+            field = np.full((len(tokens), 24), ord(' '), dtype=np.uint8)
+            for token, (start, size) in enumerate([(0, 2), (3, 3), (7, 4), (12, 12)]):
+                field[:, start:start + size] = np.frombuffer(tokens[:, k + token].astype(f'S{size}').tobytes(), dtype=np.uint8).reshape(-1, size)
+            report[name] = _ParseGregorian(field)
+        else:
+            report[name] = tokens[:, k].astype(np.float64)
+        k += width
+
+    return report
+
+
+def _ParseGregorian(field:np.ndarray) -> np.ndarray:
+    # Convert a byte matrix of GMAT Gregorian dates ('DD Mon YYYY HH:MM:SS.mmm', one per row) to datetime64[ms]
+    def number(start, stop):
+        value = np.zeros(len(field), dtype=np.int64)
+        for i in range(start, stop):
+            value = value * 10 + field[:, i] - ord('0')
+        return value
+
+    # Look up the month from its 3 letters
+    code = (field[:, 3].astype(np.int64) << 16) | (field[:, 4].astype(np.int64) << 8) | field[:, 5]
+    order = np.argsort(_MONTH_CODES)
+    idx = np.minimum(np.searchsorted(_MONTH_CODES[order], code), 11)
+    if np.any(_MONTH_CODES[order][idx] != code):
+        raise ValueError('Unknown month in GMAT Gregorian date.')
+    month = order[idx]
+
+    # Build the dates from years, months and days, then add the time of the day
+    date = (number(7, 11) - 1970).astype('datetime64[Y]').astype('datetime64[M]') + month
+    date = date.astype('datetime64[D]') + (number(0, 2) - 1)
+    ms = ((number(12, 14) * 60 + number(15, 17)) * 60 + number(18, 20)) * 1000 + number(21, 24)
+
+    return date.astype('datetime64[ms]') + ms
+
+
+# ----------- SPACE WEATHER ------------
+class SpaceWeather:
+    """
+    This class reads a local space weather file once and gives the F10.7 and Ap inputs of NRLMSIS for any number of dates,
+    so the atmosphere follows the real solar and geomagnetic activity without downloading anything.
+    The file is in the CelesTrak SW-All.csv format (https://celestrak.org/SpaceData/SW-All.csv), the same one pymsis uses,
+    and the values are the ones pymsis would look up for the same dates:
+        f107: observed F10.7 of the previous day. Values above 400 (solar radio bursts) or missing are replaced by f107a.
+        f107a: observed F10.7 averaged over 81 days centered on the date.
+        ap: daily Ap, 3-hour ap of the date and of 3, 6 and 9 hours before, and averages of the eight 3-hour values
+            from 12 to 33 and from 36 to 57 hours before. Only the daily Ap is used unless NRLMSIS runs in storm-time mode.
+    Monthly predictions (PRM rows) are skipped. Only the columns used are required, found by name in the header:
+    DATE, F10.7_OBS, F10.7_OBS_CENTER81, AP_AVG and optionally AP1 to AP8.
+    The days are kept sorted. If none is missing the interval of each date is found directly from its time,
+    otherwise with a binary search over the days, so millions of dates take a fraction of a second.
+
+    INPUTS:
+        filepath: path to the space weather file.
+
+    PARAMETERS:
+        dates: the days in the file, sorted, as datetime64[D].
+        f107, f107a: F10.7 values used for each day.
+        ap_times: start of each 3 hour interval, as datetime64[m].
+        ap: numpy array of size len(ap_times) x 7 with the Ap values of each interval, as described above.
+    """
+    def __init__(self, filepath:str='GMAT_Data/SW-All.csv'):
+
+        # Read the columns by name, skipping the monthly predictions
+        with open(filepath) as file:
+            header = file.readline().strip().split(',')
+            rows = [line.rstrip('\n').split(',') for line in file if line.strip() and ',PRM,' not in line]
+        columns = dict(zip(header, zip(*rows)))
+
+        def number(name):
+            # Numeric column with empty fields as NaN and negative values (missing data) as NaN
+            values = np.array([float(value) if value else np.nan for value in columns[name]])
+            values[values < 0] = np.nan
+            return values
+
+        # Sort by date and drop repeated days
+        dates = np.array(columns['DATE'], dtype='datetime64[D]')
+        dates, idx = np.unique(dates, return_index=True)
+        self.dates = dates
+
+        # F10.7 of the previous day, bad values replaced by the 81 day average
+        f107_obs, self.f107a = number('F10.7_OBS')[idx], number('F10.7_OBS_CENTER81')[idx]
+        f107_obs = np.where((f107_obs > 0) & (f107_obs <= 400), f107_obs, self.f107a)
+        self.f107 = np.concatenate([[np.nan], f107_obs[:-1]])
+
+        # 3-hour ap values, or the daily value if the file only has that
+        daily_ap = number('AP_AVG')[idx]
+        if all(f'AP{i}' in columns for i in range(1, 9)):
+            ap3 = np.stack([number(f'AP{i}')[idx] for i in range(1, 9)], axis=1).ravel()
+        else:
+            ap3 = np.repeat(daily_ap, 8)
+        self.ap_times = (np.repeat(dates, 8).astype('datetime64[m]') +
+                         np.tile(np.arange(0, 24 * 60, 180), len(dates)).astype('timedelta64[m]'))
+
+        # Columns of the ap input of NRLMSIS, earlier values are NaN at the start of the file
+        self.ap = np.full((len(ap3), 7), np.nan)
+        self.ap[:, 0] = np.repeat(daily_ap, 8)
+        for k in range(4):
+            self.ap[k:, 1 + k] = ap3[:len(ap3) - k]
+        rolling_mean = np.convolve(ap3, np.ones(8) / 8, mode='valid')
+        self.ap[11:, 5] = rolling_mean[:-4]
+        self.ap[19:, 6] = rolling_mean[:-12]
+
+        # Start of each day in ms as integers, for fast binary searches. Files without missing days don't need them.
+        self._day_ms = self.dates.astype('datetime64[ms]').astype(np.int64)
+        self._end_ms = self._day_ms[-1] + 86_400_000
+        self._contiguous = bool(np.all(np.diff(self.dates) == np.timedelta64(1, 'D')))
+
+    def __call__(self, dates:np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Looks up the space weather of each date.
+        Returns f107 and f107a as arrays of the same length as dates, and ap as an array of size len(dates) x 7,
+        ready to pass to pymsis.calculate or GetComposition.
+        """
+        t = np.ascontiguousarray(dates, dtype='datetime64[ms]').view(np.int64)
+        is_sorted = bool(np.all(t[1:] >= t[:-1]))
+        t_min, t_max = (t[0], t[-1]) if is_sorted else (t.min(), t.max()) if t.size else (0, 0)
+
+        if t.size and (t_min < self._day_ms[0] or t_max >= self._end_ms):
+            raise ValueError(f'The space weather file covers {self.dates[0]} to {self.dates[-1]}, not all the dates requested.')
+
+        if self._contiguous:
+            # Every day is in the file, so the 3 hour interval of each date is found directly
+            interval = (t - self._day_ms[0]) // 10_800_000
+            day = interval >> 3
+            return np.take(self.f107, day), np.take(self.f107a, day), np.take(self.ap, interval, axis=0)
+
+        # Last day starting at or before each date
+        if is_sorted and len(t) > len(self._day_ms):
+            # For a trajectory (sorted dates) it is faster to search where each day starts among the dates,
+            # then the day of every date is the number of days starting before it
+            starts = np.searchsorted(t, self._day_ms, side='left')
+            day = np.cumsum(np.bincount(starts, minlength=len(t) + 1)[:len(t)]) - 1
+        else:
+            day = np.searchsorted(self._day_ms, t, side='right') - 1
+
+        # Every day has 8 intervals of 3 hours. Dates in a gap of the file use the last interval before them.
+        interval = 8 * day + np.minimum((t - np.take(self._day_ms, day)) // 10_800_000, 7)
+
+        return np.take(self.f107, day), np.take(self.f107a, day), np.take(self.ap, interval, axis=0)
+
+
+# ----------- COORDINATE FUNCTIONS ------------
+def EciToGeodetic(r:np.ndarray, dates:np.ndarray, tt_ut1:float=TT_UT1) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    This function converts positions in the EarthMJ2000Eq frame of GMAT to WGS-84 altitude, latitude and longitude.
+    The positions are rotated to the mean equator of date with the IAU 1976 precession and then by the Greenwich
+    mean sidereal time (IAU 1982). Nutation and polar motion are left out, which moves the latitude by less than 0.003 deg.
+    The geodetic coordinates come from the closed form of Bowring, accurate to the mm for any orbit around the Earth.
+    Every step works on whole arrays, so millions of rows take about a second.
+
+    Inputs:
+        r: numpy array of size N x 3 with the positions in km.
+        dates: dates of the positions, in the TDB scale of GMAT (like the date column of GeoPosData.txt).
+        tt_ut1: difference between TT (~TDB) and UT1 in seconds, used for the rotation of the Earth.
+    Returns:
+        altitude: altitude over the WGS-84 ellipsoid in km.
+        latitude: geodetic latitude in deg.
+        longitude: longitude between -180 and 180 deg.
+    """
+    r = np.asarray(r, dtype=float)
+    x, y, z = r[:, 0], r[:, 1], r[:, 2]
+
+    # Julian centuries from J2000, in TT for the precession and in UT1 for the sidereal time
+    seconds = (np.asarray(dates, dtype='datetime64[ms]') - np.datetime64('2000-01-01T12:00:00', 'ms')).astype(float) / 1e3
+    T = seconds / (86400 * 36525)
+    T_ut1 = (seconds - tt_ut1) / (86400 * 36525)
+
+    # Precession angles (IAU 1976)
+    arcsec = np.pi / (180 * 3600)
+    zeta = (2306.2181 + (0.30188 + 0.017998 * T) * T) * T * arcsec
+    theta = (2004.3109 - (0.42665 + 0.041833 * T) * T) * T * arcsec
+    zeta_z = (2306.2181 + (1.09468 + 0.018203 * T) * T) * T * arcsec
+
+    # Greenwich mean sidereal time (IAU 1982) in rad
+    gmst = 67310.54841 + (876600 * 3600 + 8640184.812866 + (0.093104 - 6.2e-6 * T_ut1) * T_ut1) * T_ut1
+    gmst = (gmst - 86400 * np.floor(gmst / 86400)) * (2 * np.pi / 86400)
+
+    # Mean equator of date, Rz(-z) Ry(theta) Rz(-zeta) r, then rotate the x axis to Greenwich
+    cos, sin = np.cos(zeta), np.sin(zeta)
+    x, y = cos * x - sin * y, sin * x + cos * y
+    cos, sin = np.cos(theta), np.sin(theta)
+    x, z = cos * x - sin * z, sin * x + cos * z
+    cos, sin = np.cos(gmst - zeta_z), np.sin(gmst - zeta_z)
+    x, y = cos * x + sin * y, cos * y - sin * x
+
+    # Geodetic coordinates (Bowring)
+    a, f = WGS84_RADIUS, WGS84_FLATTENING
+    b = a * (1 - f)
+    e2 = f * (2 - f)
+    p = np.hypot(x, y)
+    u = np.arctan2(z * a, p * b)
+    lat = np.arctan2(z + e2 / (1 - e2) * b * np.sin(u)**3, p - e2 * a * np.cos(u)**3)
+    sin_lat = np.sin(lat)
+    altitude = p * np.cos(lat) + z * sin_lat - a * np.sqrt(1 - e2 * sin_lat**2)
+
+    return altitude, np.degrees(lat), np.degrees(np.arctan2(y, x))
+
+
+def RelativeWind(r:np.ndarray, v:np.ndarray) -> np.ndarray:
+    """
+    This function calculates the velocity of the spacecraft relative to the atmosphere, assuming it rotates with the Earth.
+    This is the velocity of the flow entering the intake, lower than the inertial velocity for prograde orbits.
+
+    Inputs:
+        r: numpy array of size N x 3 with the positions in km, in EarthMJ2000Eq.
+        v: numpy array of size N x 3 with the velocities in km/s, in EarthMJ2000Eq.
+    Returns:
+        v_rel: numpy array of size N x 3 with the relative velocities in km/s, v - w x r.
+    """
+    r = np.asarray(r, dtype=float)
+    v_rel = np.array(v, dtype=float)
+    v_rel[:, 0] += EARTH_ROTATION * r[:, 1]
+    v_rel[:, 1] -= EARTH_ROTATION * r[:, 0]
+
+    return v_rel
+
+
+def StateToGeoPos(state:np.ndarray, epoch:np.datetime64|str, tt_ut1:float=TT_UT1) -> dict:
+    """
+    This function turns the output of ReadState into the same dictionary as ReadGeoPos, so the whole analysis can run
+    from the state vector file alone.
+
+    Inputs:
+        state: numpy array from ReadState, with the columns [vx, vy, vz, x, y, z, m, t].
+        epoch: date of the first row (elapsed seconds 0) as a datetime64 or ISO string, in the TDB scale of GMAT.
+        tt_ut1: difference between TT and UT1 in seconds, see EciToGeodetic.
+    Returns:
+        States: dictionary with keys ['altitude', 'latitude', 'longitude', 'date', 'velocity', 'elapsed_seconds'].
+            Unlike GeoPosData.txt, the velocity is relative to the atmosphere (see RelativeWind), in m/s.
+    """
+    v, r, t = state[:, 0:3], state[:, 3:6], state[:, 7]
+    dates = np.datetime64(epoch, 'ms') + np.rint(t * 1000).astype('timedelta64[ms]')
+    altitude, latitude, longitude = EciToGeodetic(r, dates, tt_ut1)
+    v_rel = RelativeWind(r, v)
+
+    return {
+        'altitude': altitude,
+        'latitude': latitude,
+        'longitude': longitude,
+        'date': dates,
+        'velocity': np.sqrt(v_rel[:, 0]**2 + v_rel[:, 1]**2 + v_rel[:, 2]**2) * 1000,  # Convert from km/s to m/s
+        'elapsed_seconds': t
+    }
+
+
 # ----------- DATA PROCESSING FUNCTIONS ------------
+def FindPasses(altitude:np.ndarray, h_max:float, inclusive:bool=False) -> np.ndarray:
+    """
+    This function finds the passes through the atmosphere of a trajectory, the runs of consecutive samples below h_max.
+    The edges of the runs are where the boolean mask changes, so the whole trajectory is scanned once without any loop.
+
+    Inputs:
+        altitude: altitudes of the trajectory in km.
+        h_max: altitude where a pass starts and ends in km.
+        inclusive: if True, samples at exactly h_max are part of the passes.
+    Returns:
+        passes: numpy array of size n_passes x 2 with the index of the first sample of each pass and the one after its last.
+            A pass that reaches the start or end of the data is cut there.
+    """
+    below = np.asarray(altitude) <= h_max if inclusive else np.asarray(altitude) < h_max
+
+    # Changes of the mask, with the data padded by samples outside the atmosphere on both sides
+    edges = np.flatnonzero(np.diff(below, prepend=False, append=False))
+
+    return edges.reshape(-1, 2)
+
+
+def PassMask(passes:np.ndarray, n:int) -> np.ndarray:
+    """
+    This function gives a boolean mask of length n that is True inside the passes (see FindPasses).
+    """
+    change = np.zeros(n + 1, dtype=np.int8)
+    change[passes[:, 0]] = 1
+    change[passes[:, 1]] = -1
+
+    return np.cumsum(change[:n], dtype=np.int8).astype(bool)
+
+
 def CropData(GeoPos:dict, VelHist:dict, max_alt:float) -> dict:
     """
-    This function removes data above a certain altitude.
+    This function removes data above a certain altitude, keeping the samples of the passes below it (see FindPasses).
 
     Inputs:
         GeoPos: dictionary with keys ['altitude', 'latitude', 'longitude', 'date'].
+        VelHist: dictionary with keys ['velocity', 'elapsed_seconds'].
         max_alt: maximum altitude to keep in the data.
 
     Returns:
         GeoPos: dictionary with the data cropped above the maximum altitude.
-        VelHist: dictionary with the velocity data above below the maximum altitude.
+        VelHist: dictionary with the velocity data below the maximum altitude.
     """
-    # Find the indices where the altitude is above the minimum
-    indices = [i for i, alt in enumerate(GeoPos['altitude']) if alt <= max_alt]
-
-    # Create a new dictionary with the cropped GeoPos data
-    New_GeoPos = {
-        'altitude': [GeoPos['altitude'][i] for i in indices],
-        'latitude': [GeoPos['latitude'][i] for i in indices],
-        'longitude': [GeoPos['longitude'][i] for i in indices],
-        'date': [GeoPos['date'][i] for i in indices]
-    }
-
-    # Create a new dictionary with the cropped velocity data
-    New_VelHist = {
-        'velocity': [VelHist['velocity'][i] for i in indices],
-        'elapsed_seconds': [VelHist['elapsed_seconds'][i] for i in indices]
-    }
+    # Samples inside the passes below the maximum altitude
+    keep = PassMask(FindPasses(GeoPos['altitude'], max_alt, inclusive=True), len(GeoPos['altitude']))
 
+    # Create new dictionaries with the cropped data
+    New_GeoPos = {key: np.asarray(GeoPos[key])[keep] for key in ('altitude', 'latitude', 'longitude', 'date')}
+    New_VelHist = {key: np.asarray(VelHist[key])[keep] for key in ('velocity', 'elapsed_seconds')}
 
     return New_GeoPos, New_VelHist
 
 
-
-
 # ----------- TESTING ------------
 if __name__ == '__main__':
 
-    geodata, velhist = ReadGeoPos('GMAT_Data/GeoPosData.txt')
+    geodata = velhist = ReadGeoPos('GMAT_Data/GeoPosData.txt')
 
     # Test cropping
     h_max = 150
@@ -1,21 +1,64 @@
 # Lucas Calderon
 # 03/02/2025
 
-from GMATAnalysis.atmos_functions import GetComposition, GetMassFlow
+import os
+import sys
+import argparse
+
+from GMATAnalysis.atmos_functions import (GetComposition, GetMassFlow, GetMassFlowStream, GetPassStatistics, GetCumulativeMass,
+                                          TimeToMass, CompositionCache, CompositionGrid)
 from GMATAnalysis.plotting import plot_atmos_data, plot_time_vs_massflow
-from GMATAnalysis.data import ReadGeoPos, CropData
+from GMATAnalysis.data import ReadGeoPos, ReadState, StateToGeoPos, SpaceWeather
+from spacecraft import spacecraft
 
 
 if __name__ == '__main__':
 
-    # Read the data
-    states = ReadGeoPos('GMAT_Data/GeoPosData.txt')
+    parser = argparse.ArgumentParser(description='Composition of the atmosphere and captured mass along a GMAT trajectory.')
+    parser.add_argument('--state', help='GMAT state vector report (like GMAT_Data/StateVectorTest1.txt) to use instead of '
+                                        'GMAT_Data/GeoPosData.txt, converted to geodetic coordinates and relative wind.')
+    parser.add_argument('--epoch', default='2025-01-01T12:00:37.184', help='Date of the first state of --state, in TDB.')
+    parser.add_argument('--grid', action='store_true', help='Interpolate an approximate composition from a grid of NRLMSIS '
+                                                            'nodes instead of running it at every point, much faster for long trajectories.')
+    parser.add_argument('--stream', action='store_true', help='Read GMAT_Data/GeoPosData.txt in chunks and only calculate the '
+                                                              'total captured mass, for files that don\'t fit in memory.')
+    args = parser.parse_args()
+    if args.stream and args.state is not None:
+        parser.error('--stream reads the GeoPos report, it can\'t be used with --state.')
+
+    # Real solar and geomagnetic activity from a local CelesTrak file, if there is one (otherwise pymsis looks it up)
+    space_weather = SpaceWeather('GMAT_Data/SW-All.csv') if os.path.exists('GMAT_Data/SW-All.csv') else None
+    h_max = None
+
+    if args.stream:
+        # Chunked pipeline, the totals are the same as below but only one chunk of the file is in memory at a time
+        print('Calculating mass flow in chunks...')
+        grid = CompositionGrid(dh=5, dlat=1, dlon=1, dt=600) if args.grid else None
+        m_total = GetMassFlowStream('GMAT_Data/GeoPosData.txt', chunk_rows=1_000_000, h_max=h_max, space_weather=space_weather,
+                                    grid=grid)
+        print('Total captured mass:', m_total['rho'], 'kg')
+        plot_atmos_data(m_total)
+        sys.exit()
+
+    # Read the data, from the GeoPos report or from the state vectors alone
+    if args.state is None:
+        states = ReadGeoPos('GMAT_Data/GeoPosData.txt')
+    else:
+        states = StateToGeoPos(ReadState(args.state), args.epoch)
 
     # Get the composition of the atmosphere for the spacecraft flythrough
-    composition = GetComposition(states)
+    if args.grid:
+        # Approximate composition from a grid of NRLMSIS nodes
+        grid = CompositionGrid(dh=5, dlat=1, dlon=1, dt=600)
+        composition = GetComposition(states, grid=grid, space_weather=space_weather)
+        print('Composition grid:', grid.stats())
+    else:
+        # The cache keeps it between runs, so changing h_max or the spacecraft doesn't run NRLMSIS again
+        cache = CompositionCache()
+        composition = GetComposition(states, cache=cache, space_weather=space_weather)
+        print('Composition cache:', cache.stats())
 
     # Get mass flow and total captured mass
-    h_max = None
     print('Calculating mass flow...')
     m_dot, m_total = GetMassFlow(states, composition, h_max=h_max)
     print('Mass flow calculation complete!')
@@ -23,6 +66,16 @@ if __name__ == '__main__':
     # Print the total captured mass
     print('Total captured mass:', m_total['rho'], 'kg')
 
+    # When the tank is full, from the mass captured up to every sample
+    cumulative = GetCumulativeMass(states, m_dot)
+    print('Tank full after:', TimeToMass(states, m_dot, cumulative, spacecraft['Tank_load']) / 3600, 'hours')
+
+    # Statistics of every pass through the atmosphere
+    Passes = GetPassStatistics(states, composition, h_max=150)
+    for i in range(len(Passes['start'])):
+        print(f"Pass {i}: {Passes['date'][i]}, perigee {Passes['min_altitude'][i]:.1f} km, {Passes['duration'][i]:.0f} s, "
+              f"max q {Passes['max_dynamic_pressure'][i]:.2f} Pa, captured {Passes['m_total'][0, i]:.3f} kg")
+
     # Plot the composition of the atmosphere
     plot_atmos_data(m_total)
     # plot_time_vs_massflow(states, m_dot)
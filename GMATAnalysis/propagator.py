@@ -0,0 +1,224 @@
+# Lucas Calderon
+# 18/10/2026
+
+# This file is dedicated to propagating orbits without GMAT, for many spacecraft at once.
+
+import os
+import sys
+
+# Add the parent directory to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import numpy as np
+import pymsis as msis
+
+from spacecraft import spacecraft
+from GMATAnalysis.data import EciToGeodetic, RelativeWind, SpaceWeather, WGS84_RADIUS
+
+# Gravity field of the Earth (EGM-96 values, like GMAT)
+MU = 398600.4415  # km^3/s^2
+J2 = 1.0826269e-3
+
+
+# ----------- INITIAL CONDITIONS ------------
+def OrbitState(h_perigee:np.ndarray, h_apogee:np.ndarray, inclination:np.ndarray=0, raan:np.ndarray=0,
+               arg_perigee:np.ndarray=0, true_anomaly:np.ndarray=0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    This function gives the position and velocity of orbits defined by their perigee and apogee altitudes.
+    All inputs can be arrays of the same length (or scalars) to build many initial conditions at once.
+
+    Inputs:
+        h_perigee, h_apogee: perigee and apogee altitudes over the equatorial radius in km.
+        inclination, raan, arg_perigee, true_anomaly: orientation of the orbit and position on it in deg.
+    Returns:
+        r: numpy array of size N x 3 with the positions in km, in EarthMJ2000Eq.
+        v: numpy array of size N x 3 with the velocities in km/s.
+    """
+    r_p = WGS84_RADIUS + np.asarray(h_perigee, dtype=float)
+    r_a = WGS84_RADIUS + np.asarray(h_apogee, dtype=float)
+    i, raan, w, nu = [np.radians(np.asarray(angle, dtype=float)) for angle in (inclination, raan, arg_perigee, true_anomaly)]
+    r_p, r_a, i, raan, w, nu = np.broadcast_arrays(*[np.atleast_1d(value) for value in (r_p, r_a, i, raan, w, nu)])
+
+    # Position and velocity in the plane of the orbit
+    e = (r_a - r_p) / (r_a + r_p)
+    p = r_p * (1 + e)
+    r = p / (1 + e * np.cos(nu))
+    r_orbit = np.stack([r * np.cos(nu), r * np.sin(nu), np.zeros_like(r)], axis=-1)
+    v_orbit = np.sqrt(MU / p)[:, None] * np.stack([-np.sin(nu), e + np.cos(nu), np.zeros_like(r)], axis=-1)
+
+    # Rotate to the equator, Rz(raan) Rx(i) Rz(w)
+    c_O, s_O, c_i, s_i, c_w, s_w = np.cos(raan), np.sin(raan), np.cos(i), np.sin(i), np.cos(w), np.sin(w)
+    R = np.stack([
+        np.stack([c_O * c_w - s_O * s_w * c_i, -c_O * s_w - s_O * c_w * c_i, s_O * s_i], axis=-1),
+        np.stack([s_O * c_w + c_O * s_w * c_i, -s_O * s_w + c_O * c_w * c_i, -c_O * s_i], axis=-1),
+        np.stack([s_w * s_i, c_w * s_i, c_i], axis=-1)
+    ], axis=-2)
+
+    return np.einsum('nij,nj->ni', R, r_orbit), np.einsum('nij,nj->ni', R, v_orbit)
+
+
+# ----------- PROPAGATION ------------
+def Propagate(r0:np.ndarray, v0:np.ndarray, epoch:np.datetime64|str, duration:float, step:float=10,
+              sc_parameters:dict=spacecraft, mass:np.ndarray=1000, thrust:str='drag', table=None, save_every:int=1,
+              space_weather:SpaceWeather=None, dry_mass:np.ndarray=0) -> dict:
+    """
+    This function propagates many spacecraft at once with a fixed step Runge-Kutta 4 integrator, every step working on
+    the whole batch. The forces are the gravity of the Earth with J2, the drag of the atmosphere (moving with the Earth)
+    and the thrust of the engine. The intake collects air and the engine spends it, so the mass changes as
+        dm/dt = A_intake * eff_intake * rho * V - T / (Isp * g0)
+    where V is the velocity relative to the atmosphere, and the drag is 0.5 * rho * V^2 * A_ref * C_D like in Get_Drag.
+    The mass never goes below dry_mass: once the propellant is spent, the thrust is limited to what the intake collects
+    (T <= A_intake * eff_intake * rho * V * Isp * g0), so an engine thrusting T_max or more than the intake provides runs dry
+    and then only spends the air it takes in.
+
+    The density comes from table (any callable from altitudes in km to NRLMSIS outputs, like DensityTable) or, if there
+    isn't one, from NRLMSIS at the real position and date of every stage, which is exact but much slower.
+    Above the top of the table there is no drag, below the bottom the lowest value is used.
+
+    Inputs:
+        r0, v0: positions (km) and velocities (km/s) in EarthMJ2000Eq, of size N x 3 (or 3 for a single spacecraft).
+        epoch: date of the initial states, in the TDB scale of GMAT.
+        duration: time to propagate in s.
+        step: time step in s.
+        sc_parameters: dictionary with the spacecraft parameters. The values can also be arrays with one value per spacecraft.
+        mass: initial mass in kg, one value or one per spacecraft.
+        dry_mass: mass without propellant in kg, one value or one per spacecraft. It must not be above the initial mass.
+        thrust: 'drag' to thrust along the relative velocity as much as the drag (up to T_max), 'max' to always thrust
+            T_max, or None for no thrust.
+        table: optional density table, see above.
+        save_every: store one every save_every steps.
+        space_weather: optional SpaceWeather with the F10.7 and Ap history used by NRLMSIS when there is no table, like in
+            GetComposition. If None, pymsis looks them up in its own file, downloading it if it isn't there.
+    Returns:
+        States: dictionary with the same keys as ReadGeoPos, ['altitude', 'latitude', 'longitude', 'date', 'velocity',
+            'elapsed_seconds'], each of size N x n_saved (n_saved for a single spacecraft). The velocity is relative to
+            the atmosphere in m/s, like in StateToGeoPos. It also has 'r' and 'v' (N x n_saved x 3, km and km/s),
+            'mass' (kg), 'drag' and 'thrust' (N). {key: value[i] for key, value in States.items()} is the trajectory
+            of spacecraft i, ready for GetComposition and GetMassFlow.
+    """
+    if thrust not in ('drag', 'max', None):
+        raise ValueError("thrust must be 'drag', 'max' or None.")
+
+    single = np.ndim(r0) == 1
+    r = np.atleast_2d(np.array(r0, dtype=float))
+    v = np.atleast_2d(np.array(v0, dtype=float))
+    n = len(r)
+    m = np.array(np.broadcast_to(np.asarray(mass, dtype=float), (n,)))
+    m_dry = np.broadcast_to(np.asarray(dry_mass, dtype=float), (n,))
+    if np.any(m < m_dry):
+        raise ValueError('The initial mass must not be below the dry mass.')
+
+    # Spacecraft parameters, one value per spacecraft
+    sc = {key: np.broadcast_to(np.asarray(sc_parameters[key], dtype=float), (n,))
+          for key in ('A_intake', 'eff_intake', 'A_ref', 'C_D', 'Isp', 'g0', 'T_max')}
+    epoch = np.datetime64(epoch, 'ms')
+
+    def Forces(t, r, v, m):
+        # Drag, thrust (N), relative velocity (km/s) and intake mass flow (kg/s) of every spacecraft at time t
+        date = epoch + np.timedelta64(int(round(t * 1000)), 'ms')
+        altitude, latitude, longitude = EciToGeodetic(r, np.full(n, date))
+        rho = Density(altitude, latitude, longitude, date)
+
+        v_rel = RelativeWind(r, v)
+        V = np.sqrt(v_rel[:, 0]**2 + v_rel[:, 1]**2 + v_rel[:, 2]**2) * 1000  # m/s
+        drag = 0.5 * rho * V**2 * sc['A_ref'] * sc['C_D']
+
+        if thrust == 'drag':
+            T = np.minimum(drag, sc['T_max'])
+        elif thrust == 'max':
+            T = np.array(sc['T_max'])
+        else:
+            T = np.zeros(n)
+
+        # Without propellant left the engine can only spend what the intake collects
+        m_in = sc['A_intake'] * sc['eff_intake'] * rho * V
+        T = np.where(m > m_dry, T, np.minimum(T, m_in * sc['Isp'] * sc['g0']))
+
+        m_dot = m_in - T / (sc['Isp'] * sc['g0'])
+        return drag, T, v_rel, m_dot
+
+    def Density(altitude, latitude, longitude, date):
+        # Mass density of the atmosphere in kg/m^3
+        if table is None:
+            dates = np.full(n, date)
+            weather = () if space_weather is None else space_weather(dates)
+            return np.nan_to_num(msis.calculate(dates, longitude, latitude, altitude, *weather)[:, 0])
+
+        top = table.h[-1] if hasattr(table, 'h') else np.inf
+        bottom = table.h[0] if hasattr(table, 'h') else -np.inf
+        rho = table(np.clip(altitude, bottom, top))[:, 0]
+        return np.where(altitude > top, 0.0, rho)
+
+    def Derivatives(t, r, v, m):
+        # Time derivatives of the position, velocity and mass
+        drag, T, v_rel, m_dot = Forces(t, r, v, m)
+
+        # Gravity with J2
+        r2 = r[:, 0]**2 + r[:, 1]**2 + r[:, 2]**2
+        r_norm = np.sqrt(r2)
+        z2 = r[:, 2]**2 / r2
+        j2 = 1.5 * J2 * WGS84_RADIUS**2 / r2
+        a = -(MU / (r2 * r_norm))[:, None] * r
+        a[:, :2] *= (1 + j2 * (1 - 5 * z2))[:, None]
+        a[:, 2] *= 1 + j2 * (3 - 5 * z2)
+
+        # Drag against the relative velocity and thrust along it, from N to km/s^2
+        V = np.sqrt(v_rel[:, 0]**2 + v_rel[:, 1]**2 + v_rel[:, 2]**2)
+        a += ((T - drag) / (m * 1000 * np.where(V > 0, V, 1)))[:, None] * v_rel
+
+        return v, a, m_dot
+
+    # Storage
+    n_steps = int(np.ceil(duration / step))
+    n_saved = n_steps // save_every + 1
+    r_saved = np.empty((n, n_saved, 3))
+    v_saved = np.empty((n, n_saved, 3))
+    m_saved = np.empty((n, n_saved))
+    t_saved = np.arange(n_saved) * (step * save_every)
+    r_saved[:, 0], v_saved[:, 0], m_saved[:, 0] = r, v, m
+
+    # Runge-Kutta 4
+    t = 0.0
+    for i in range(1, n_steps + 1):
+        h = min(step, duration - t)
+        k1 = Derivatives(t, r, v, m)
+        k2 = Derivatives(t + h / 2, r + h / 2 * k1[0], v + h / 2 * k1[1], m + h / 2 * k1[2])
+        k3 = Derivatives(t + h / 2, r + h / 2 * k2[0], v + h / 2 * k2[1], m + h / 2 * k2[2])
+        k4 = Derivatives(t + h, r + h * k3[0], v + h * k3[1], m + h * k3[2])
+
+        r = r + h / 6 * (k1[0] + 2 * k2[0] + 2 * k3[0] + k4[0])
+        v = v + h / 6 * (k1[1] + 2 * k2[1] + 2 * k3[1] + k4[1])
+        m = np.maximum(m + h / 6 * (k1[2] + 2 * k2[2] + 2 * k3[2] + k4[2]), m_dry)  # The last step before running dry can overshoot
+        t += h
+
+        if i % save_every == 0:
+            r_saved[:, i // save_every], v_saved[:, i // save_every], m_saved[:, i // save_every] = r, v, m
+            t_saved[i // save_every] = t
+
+    # Geodetic coordinates and forces at the stored points
+    dates = epoch + np.rint(t_saved * 1000).astype('timedelta64[ms]')
+    altitude, latitude, longitude = EciToGeodetic(r_saved.reshape(-1, 3), np.tile(dates, n))
+    v_rel = RelativeWind(r_saved.reshape(-1, 3), v_saved.reshape(-1, 3))
+    drag = np.empty((n, n_saved))
+    T = np.empty((n, n_saved))
+    for j in range(n_saved):
+        drag[:, j], T[:, j] = Forces(t_saved[j], r_saved[:, j], v_saved[:, j], m_saved[:, j])[:2]
+
+    States = {
+        'altitude': altitude.reshape(n, n_saved),
+        'latitude': latitude.reshape(n, n_saved),
+        'longitude': longitude.reshape(n, n_saved),
+        'date': np.broadcast_to(dates, (n, n_saved)),
+        'velocity': np.sqrt(np.sum(v_rel**2, axis=1)).reshape(n, n_saved) * 1000,  # Convert from km/s to m/s
+        'elapsed_seconds': np.broadcast_to(t_saved, (n, n_saved)),
+        'r': r_saved,
+        'v': v_saved,
+        'mass': m_saved,
+        'drag': drag,
+        'thrust': T
+    }
+
+    if single:
+        States = {key: value[0] for key, value in States.items()}
+
+    return States
@@ -0,0 +1,76 @@
+# Benchmark of the cumulative captured mass (GetCumulativeMass, TimeToMass) against integrating prefixes of the
+# trajectory, and of the streaming query that stops reading the file once the tank is full.
+# Run from the repository root: python benchmarks/bench_cumulative_mass.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the repository root and the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from GMATAnalysis.atmos_functions import (GetComposition, GetMassFlowMatrix, GetCumulativeMass, TimeToMass,
+                                          GetMassFlowStream, GetTimeToMassStream)
+from classes import DensityTable
+from synthetic import GeoPosArrays, GeoPosFile
+
+H_MAX = 150
+
+# The prefix search is only timed for this many targets, and scaled to all of them
+PREFIX_TARGETS = 20
+
+
+def TimeToMassPrefix(states:dict, m_dot:np.ndarray, target:float) -> float:
+    # First sample where the integral of the prefix reaches the target, by bisection over the prefixes
+    t = states['elapsed_seconds']
+    low, high = 0, len(t) - 1
+    if np.trapezoid(m_dot[0], t) < target:
+        return np.inf
+    while low < high:
+        middle = (low + high) // 2
+        if np.trapezoid(m_dot[0, :middle + 1], t[:middle + 1]) >= target:
+            high = middle
+        else:
+            low = middle + 1
+    return t[low]
+
+
+if __name__ == '__main__':
+
+    table = DensityTable.build(70, 8700, dh=0.5)
+
+    # One sample every 10 s for about 4 months
+    n_rows = 1_000_000
+    states = GeoPosArrays(n_rows)
+    states['velocity'] = states['velocity'] * 1000  # Convert from km/s to m/s, like ReadGeoPos
+    m_dot, m_total = GetMassFlowMatrix(states, GetComposition(states, table=table, verbose=False, Matrix=True), h_max=H_MAX)
+    targets = np.linspace(0, 1, 1000) * m_total[0]
+    print(f'{n_rows:,} samples, {m_total[0]:.1f} kg captured, {len(targets)} targets')
+
+    start = time.perf_counter()
+    cumulative = GetCumulativeMass(states, m_dot)
+    times = TimeToMass(states, m_dot, cumulative, targets)
+    curve_time = time.perf_counter() - start
+    print(f'Cumulative curve and search: {curve_time:7.3f} s')
+
+    start = time.perf_counter()
+    expected = [TimeToMassPrefix(states, m_dot, target) for target in targets[:PREFIX_TARGETS]]
+    prefix_time = (time.perf_counter() - start) * len(targets) / PREFIX_TARGETS
+    print(f'Prefix bisection:            {prefix_time:7.3f} s (from {PREFIX_TARGETS} targets, {prefix_time / curve_time:.0f}x), '
+          f'times within one step: {np.all((expected - times[:PREFIX_TARGETS] >= 0) & (expected - times[:PREFIX_TARGETS] < 10))}')
+
+    # Streaming over a file, the tank is full long before the end
+    filepath = GeoPosFile(n_rows)
+    tank = 0.1 * m_total[0]
+
+    start = time.perf_counter()
+    GetMassFlowStream(filepath, chunk_rows=100_000, h_max=H_MAX, table=table)
+    full_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    time_full = GetTimeToMassStream(filepath, tank, chunk_rows=100_000, h_max=H_MAX, table=table)
+    stream_time = time.perf_counter() - start
+    print(f'Streaming, time to {tank:.1f} kg: {stream_time:6.2f} s against {full_time:6.2f} s for the whole file '
+          f'(tank full after {time_full / 86400:.1f} days, in memory {TimeToMass(states, m_dot, cumulative, tank) / 86400:.1f} days)')
@@ -0,0 +1,41 @@
+# Benchmark of the DensityTable against running NRLMSIS directly.
+# Run from the repository root: python benchmarks/bench_density_table.py
+
+import os
+import sys
+import time
+import numpy as np
+import pymsis as msis
+
+# Add the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from classes import DensityTable
+
+
+if __name__ == '__main__':
+
+    n = 1_000_000
+    rng = np.random.default_rng(0)
+    h = rng.uniform(70, 500, n)
+    et = np.full(n, np.datetime64('2000-01-01T00:00:00', 'ms'))
+
+    # Direct NRLMSIS
+    start = time.perf_counter()
+    direct = np.nan_to_num(msis.calculate(et, np.zeros(n), np.zeros(n), h))
+    t_direct = time.perf_counter() - start
+    print(f'NRLMSIS, {n:.0e} points: {t_direct:.3f} s')
+
+    for dh, method in [(0.1, 'linear'), (1, 'linear'), (1, 'pchip')]:
+
+        start = time.perf_counter()
+        table = DensityTable.build(70, 500, dh, method=method)
+        t_build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        interp = table(h)
+        t_query = time.perf_counter() - start
+
+        rel = np.abs(interp[:, 0] - direct[:, 0]) / direct[:, 0]
+        print(f'Table dh={dh} km {method:6s}: build {t_build:.3f} s, query {t_query:.3f} s, '
+              f'speedup x{t_direct / t_query:.1f}, max rho error {rel.max() * 100:.4f}%')
@@ -0,0 +1,64 @@
+# Benchmark of the batched design sweep against a Python loop over one dictionary per design.
+# Run from the repository root: python benchmarks/bench_design_sweep.py
+
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# Add the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from altitude_analysis import Getm_gain, Get_PowReq, Get_DesignSweep, earth
+from classes import Regime, DesignBatch
+from spacecraft import spacecraft
+
+
+def loop(regime, designs):
+    # One design at a time, like calling Getm_gain and Get_PowReq from a script
+    m_gain = np.empty((len(designs), len(regime.h)))
+    P_req = np.empty_like(m_gain)
+    for i in range(len(designs)):
+        sc = designs.design(i)
+        m_gain[i] = Getm_gain(regime, sc)[0]
+        P_req[i] = Get_PowReq(regime, sc)[0]
+    return m_gain, P_req
+
+
+def measure(function, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == '__main__':
+
+    n_designs, n_h = 10_000, 1000
+    rng = np.random.default_rng(0)
+    A_intake = rng.uniform(1, 10, n_designs)
+    designs = DesignBatch(dict(spacecraft, A_intake=A_intake, A_ref=A_intake,
+                               eff_intake=rng.uniform(0.3, 0.9, n_designs),
+                               C_D=rng.uniform(1.5, 3, n_designs),
+                               Isp=rng.uniform(1000, 6000, n_designs),
+                               T_max=rng.uniform(0.1, 10, n_designs),
+                               n_prop=rng.uniform(0.5, 0.9, n_designs)))
+
+    regime = Regime(np.linspace(70, 500, n_h), earth)
+    regime.atmos()  # Run NRLMSIS before timing, both methods share it
+    print(f'{n_designs:.0e} designs x {n_h} altitudes, outputs {3 * n_designs * n_h * 8 / 1e6:.0f} MB')
+
+    (m_gain, P_req), t_loop, m_loop = measure(loop, regime, designs)
+    print(f'Loop over designs:      {t_loop:6.3f} s, peak {m_loop / 1e6:7.1f} MB')
+
+    for chunk_size in (100, 1000, 10_000):
+        results, t_sweep, m_sweep = measure(Get_DesignSweep, regime, designs, chunk_size=chunk_size)
+        # m_gain is a difference that crosses zero, so it is compared to the largest gain of each design
+        scale = np.abs(m_gain).max(axis=1, keepdims=True)
+        assert np.all(np.abs(results['m_gain'] - m_gain) <= 1e-12 * scale)
+        assert np.allclose(results['P_req'], P_req, rtol=1e-12, atol=0)
+        print(f'Sweep, chunks of {chunk_size:6d}: {t_sweep:6.3f} s, peak {m_sweep / 1e6:7.1f} MB, {t_loop / t_sweep:5.1f}x')
@@ -0,0 +1,59 @@
+# Benchmark of the drag limit search used by time_analysis.
+# Compares the old dense T >= D mask with the binary search in Get_LimitIdx.
+# Run from the repository root: python benchmarks/bench_drag_limit.py
+
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# Add the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from altitude_analysis import Get_LimitIdx
+
+# Largest mask (in elements) the old method is allowed to build
+MAX_MASK = 5e8
+
+
+def dense_mask(D, T_max):
+    return np.argmax(D[None, :] <= T_max[:, None], axis=1)
+
+
+def binary_search(D, T_max):
+    idxs = Get_LimitIdx(D, T_max)
+    idxs[idxs == len(D)] = 0
+    return idxs
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == '__main__':
+
+    for n_T, n_h in [(1_000, 50_000), (10_000, 100_000), (10_000, 1_000_000)]:
+
+        # Synthetic exponential drag profile, same order of magnitude as the real one
+        h = np.linspace(70, 500, n_h)
+        D = 5e3 * np.exp(-(h - 70) / 8)
+        T_max = np.linspace(0, 10, n_T)
+
+        new, t_new, m_new = measure(binary_search, D, T_max)
+        line = f'{n_T:.0e} thrusts x {n_h:.0e} altitudes: search {t_new * 1e3:8.2f} ms, {m_new / 1e6:8.2f} MB'
+
+        if n_T * n_h <= MAX_MASK:
+            old, t_old, m_old = measure(dense_mask, D, T_max)
+            assert np.array_equal(old, new)
+            line += f' | mask {t_old * 1e3:8.2f} ms, {m_old / 1e6:8.2f} MB'
+        else:
+            line += f' | mask skipped (would need {n_T * n_h / 1e9:.0f} GB)'
+
+        print(line)
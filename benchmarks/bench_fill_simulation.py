@@ -0,0 +1,63 @@
+# Benchmark of the closed loop fill simulation for a batch of designs and initial altitudes, against simulating one
+# design at a time, and comparison with the constant conditions refuel time of Get_DesignSweep.
+# Run from the repository root: python benchmarks/bench_fill_simulation.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from altitude_analysis import Get_DesignSweep, earth
+from time_analysis import fill_simulation
+from classes import Regime, DesignBatch
+from spacecraft import spacecraft
+
+# The loop is only timed over this many designs, and scaled to the whole batch
+LOOP_DESIGNS = 50
+
+
+if __name__ == '__main__':
+
+    n_designs = 20_000
+    h0 = np.arange(100, 210, 10.0)
+    rng = np.random.default_rng(0)
+    A_intake = rng.uniform(1, 10, n_designs)
+    designs = DesignBatch(dict(spacecraft, A_intake=A_intake, A_ref=A_intake,
+                               eff_intake=rng.uniform(0.3, 0.9, n_designs),
+                               C_D=rng.uniform(1.5, 3, n_designs),
+                               Isp=rng.uniform(1000, 6000, n_designs),
+                               T_max=rng.uniform(0.1, 10, n_designs),
+                               n_prop=rng.uniform(0.5, 0.9, n_designs),
+                               P_max=rng.uniform(5e3, 1e5, n_designs)))
+
+    regime = Regime(np.linspace(70, 500, 2000), earth)
+    regime.atmos()  # Run NRLMSIS before timing, both methods share it
+    print(f'{n_designs} designs x {len(h0)} initial altitudes, one day steps up to 1000 days')
+
+    start = time.perf_counter()
+    results = fill_simulation(regime, designs, h0)
+    batch_time = time.perf_counter() - start
+    print(f'Batch:          {batch_time:6.2f} s')
+
+    start = time.perf_counter()
+    for i in range(LOOP_DESIGNS):
+        single = fill_simulation(regime, designs[i:i + 1], h0)
+        assert np.array_equal(single['fill_time'][0], results['fill_time'][i])
+    loop_time = (time.perf_counter() - start) * n_designs / LOOP_DESIGNS
+    print(f'One at a time:  {loop_time:6.2f} s (from {LOOP_DESIGNS} designs), {loop_time / batch_time:.0f}x slower')
+
+    # Outcomes and fill times in days
+    counts = [np.mean(results['status'] == code) for code in range(4)]
+    print(f'Filled {counts[0]:.0%}, fell {counts[1]:.0%}, no gain {counts[2]:.0%}, not full in 1000 days {counts[3]:.0%}')
+    print('h0 [km]  filled   ' + '  '.join(f'p{p:<5d}' for p in results['percentiles']) + ' [days]')
+    for j, h in enumerate(h0):
+        days = results['fill_time_percentiles'][:, j] / 86400
+        print(f'{h:7.0f}  {results["filled_fraction"][j]:6.0%}   ' + '  '.join(f'{d:6.1f}' for d in days))
+
+    # Constant conditions overestimate what is possible when the thrust or the power can't hold the altitude
+    sweep = Get_DesignSweep(Regime(h0, earth), designs)
+    optimistic = np.mean(np.isfinite(sweep['refuel_time']) & np.isinf(results['fill_time']))
+    print(f'Cases with a finite constant conditions refuel time that never fill: {optimistic:.0%}')
@@ -0,0 +1,91 @@
+# Benchmark of the float32 mode against float64: time, peak memory and largest relative error on the standard
+# time_analysis grid, a design sweep and the GMAT mass flow pipeline.
+# Run from the repository root: python benchmarks/bench_float32.py
+
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# Add the repository root and the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from time_analysis import time_analysis, tiled_analysis, earth
+from altitude_analysis import Get_DesignSweep
+from classes import Regime, DesignBatch, DensityTable
+from spacecraft import spacecraft
+from GMATAnalysis.atmos_functions import GetComposition, GetMassFlowMatrix
+from synthetic import GeoPosArrays
+
+REPEATS = 3
+
+
+def measure(function, *args, **kwargs):
+    # Best time of a few runs, and the peak memory of the last one
+    elapsed = np.inf
+    for _ in range(REPEATS):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = min(elapsed, time.perf_counter() - start)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def compare(name, double, single, reference):
+    # Time, memory and relative error of the float32 run against the float64 one
+    (value64, t64, m64), (value32, t32, m32) = double, single
+    with np.errstate(divide='ignore', invalid='ignore'):
+        error = np.abs(value32.astype(np.float64) - value64) / np.abs(value64)
+    error = error[np.isfinite(error)]
+    print(f'{name}')
+    print(f'  float64: {t64:7.3f} s, peak {m64 / 1e6:7.0f} MB')
+    print(f'  float32: {t32:7.3f} s, peak {m32 / 1e6:7.0f} MB ({t64 / t32:.1f}x faster, {m64 / m32:.1f}x less memory)')
+    print(f'  Relative error: max {error.max():.1e}, 99.9% below {np.percentile(error, 99.9):.1e}, median {np.median(error):.1e}'
+          + (f', {reference}' if reference else ''))
+
+
+if __name__ == '__main__':
+
+    # Standard time_analysis grid, like running time_analysis.py
+    h = np.linspace(70, 500, 50000)
+    T_max = np.linspace(0, 10, 1000)
+    Isp = np.linspace(1500, 5000, 1000)
+    double, single = Regime(h, earth), Regime(h, earth, dtype=np.float32)
+    double.atmos(), single.atmos()  # Run NRLMSIS before timing
+
+    results64 = measure(time_analysis, double, spacecraft, Isp, T_max)
+    results32 = measure(time_analysis, single, spacecraft, Isp, T_max)
+    compare(f'time_analysis, {len(Isp)} x {len(T_max)} grid', results64, results32,
+            'the largest errors are where the gain is close to 0')
+
+    compare('tiled_analysis, 5000 x 5000 grid, time to refuel',
+            *[(result[0][0], result[1], result[2]) for result in
+              (measure(tiled_analysis, regime, spacecraft, np.linspace(1500, 5000, 5000), np.linspace(0, 10, 5000))
+               for regime in (double, single))], None)
+
+    # Design sweep
+    rng = np.random.default_rng(0)
+    n_designs = 10_000
+    A_intake = rng.uniform(1, 10, n_designs)
+    designs = DesignBatch(dict(spacecraft, A_intake=A_intake, A_ref=A_intake,
+                               eff_intake=rng.uniform(0.3, 0.9, n_designs),
+                               C_D=rng.uniform(1.5, 3, n_designs),
+                               Isp=rng.uniform(1000, 6000, n_designs)))
+    double, single = Regime(np.linspace(120, 400, 1000), earth), Regime(np.linspace(120, 400, 1000), earth, dtype=np.float32)
+    double.atmos(), single.atmos()
+    results = [measure(Get_DesignSweep, regime, designs) for regime in (double, single)]
+    compare(f'Get_DesignSweep, {n_designs} designs x 1000 altitudes, power',
+            *[(result[0]['P_req'], result[1], result[2]) for result in results], None)
+
+    # Mass flow of a trajectory, the composition stays in float64
+    table = DensityTable.build(70, 8700, dh=0.5)
+    states = GeoPosArrays(1_000_000)
+    states['velocity'] = states['velocity'] * 1000  # Convert from km/s to m/s, like ReadGeoPos
+    composition = GetComposition(states, table=table, verbose=False, Matrix=True)
+    results = [measure(GetMassFlowMatrix, states, composition, h_max=150, dtype=dtype) for dtype in (np.float64, np.float32)]
+    compare('GetMassFlowMatrix, 1e6 samples, mass flow rates', *[(result[0][0], result[1], result[2]) for result in results],
+            f'total mass {abs(results[1][0][1][0] / results[0][0][1][0] - 1):.1e}')
@@ -0,0 +1,59 @@
+# Benchmark of the species-vectorized mass flow against the previous version with one dictionary entry per species.
+# Run from the repository root: python benchmarks/bench_mass_flow.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the repository root to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from GMATAnalysis.atmos_functions import GetMassFlow, GetMassFlowMatrix, SPECIES
+from spacecraft import spacecraft
+from synthetic import GeoPosArrays
+
+
+def legacy_mass_flow(states, composition):
+    # Previous implementation, kept here for comparison
+    velocities = states['velocity']
+    elapsed_seconds = states['elapsed_seconds']
+    A_intake_eff = spacecraft['A_intake']
+
+    m_dot = {key: composition[key] * A_intake_eff * spacecraft['eff_intake'] * velocities for key in SPECIES}
+    m_total = {key: np.trapezoid(m_dot[key], elapsed_seconds) for key in SPECIES}
+    return m_dot, m_total
+
+
+def best_of(function, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+if __name__ == '__main__':
+
+    n = 10_000_000
+    states = GeoPosArrays(n)
+    states['velocity'] = states['velocity'] * 1000  # m/s, like ReadGeoPos
+
+    # Random composition, the mass flow doesn't depend on its values
+    rng = np.random.default_rng(0)
+    composition_data = rng.random((n, 11))
+    composition = {key: composition_data[:, i] for i, key in enumerate(SPECIES)}
+    print(f'{n:.0e} samples, {len(SPECIES)} species')
+
+    (_, expected), t_legacy = best_of(legacy_mass_flow, states, composition)
+    print(f'Dictionary per species: {t_legacy:6.3f} s')
+
+    (_, m_total), t_dict = best_of(GetMassFlow, states, composition)
+    print(f'GetMassFlow:            {t_dict:6.3f} s, {t_legacy / t_dict:4.1f}x')
+
+    (_, m_total_matrix), t_matrix = best_of(GetMassFlowMatrix, states, composition_data)
+    print(f'GetMassFlowMatrix:      {t_matrix:6.3f} s, {t_legacy / t_matrix:4.1f}x')
+
+    difference = max(abs(m_total_matrix[i] / expected[key] - 1) for i, key in enumerate(SPECIES))
+    print(f'Largest relative difference in the totals: {difference:.1e}')
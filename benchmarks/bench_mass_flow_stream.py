@@ -0,0 +1,44 @@
+# Benchmark of the chunked mass flow pipeline against reading the whole GMAT file in memory.
+# Run from the repository root: python benchmarks/bench_mass_flow_stream.py
+
+import os
+import sys
+import time
+import tracemalloc
+
+# Add the repository root to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from GMATAnalysis.atmos_functions import GetComposition, GetMassFlow, GetMassFlowStream
+from GMATAnalysis.data import ReadGeoPos
+from synthetic import GeoPosFile
+
+
+def in_memory(filepath):
+    states = ReadGeoPos(filepath)
+    return GetMassFlow(states, GetComposition(states, verbose=False))[1]
+
+
+def measure(function, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == '__main__':
+
+    n_rows = 1_000_000
+    filepath = GeoPosFile(n_rows)
+    print(f'{n_rows:.0e} rows, file size {os.path.getsize(filepath) / 1e6:.0f} MB')
+
+    expected, elapsed, peak = measure(in_memory, filepath)
+    print(f'In memory:              {elapsed:6.2f} s, peak {peak / 1e6:7.1f} MB')
+
+    for chunk_rows in [10_000, 100_000]:
+        m_total, elapsed, peak = measure(GetMassFlowStream, filepath, chunk_rows=chunk_rows)
+        error = abs(m_total['rho'] - expected['rho']) / expected['rho']
+        print(f'Chunks of {chunk_rows:7,d} rows: {elapsed:6.2f} s, peak {peak / 1e6:7.1f} MB, relative difference {error:.1e}')
@@ -0,0 +1,70 @@
+# Benchmark of the Monte Carlo uncertainty of the performance against a loop over one dictionary per sample, and of the
+# memory used with 1e6 samples.
+# Run from the repository root: python benchmarks/bench_monte_carlo.py
+
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# Add the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from altitude_analysis import Getm_gain, Get_PowReq, Get_MonteCarlo, earth
+from classes import Regime
+from spacecraft import spacecraft
+
+# The loop is only timed over this many samples, and scaled to all of them
+LOOP_SAMPLES = 1000
+
+DISTRIBUTIONS = {
+    'eff_intake': ('uniform', 0.3, 0.8),
+    'C_D': ('normal', 2.2, 0.2),
+    'Isp': ('normal', 3500, 200),
+    'n_prop': ('uniform', 0.5, 0.8),
+    'Q_rejection': ('lognormal', np.log(1e6), 1)
+}
+
+
+def measure(function, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == '__main__':
+
+    # Low, medium and high solar activity
+    h = np.linspace(120, 300, 200)
+    regime = Regime(h, earth, epoch=np.full(3, np.datetime64('2005-01-01')), f107=[70.0, 150.0, 250.0], f107a=[70.0, 150.0, 250.0])
+    regime.atmos()  # Run NRLMSIS before timing, both methods share it
+
+    for n_samples in (10_000, 1_000_000):
+        print(f'{n_samples:.0e} samples x {len(h)} altitudes, full outputs would be {3 * n_samples * len(h) * 8 / 1e9:.1f} GB')
+        results, t_mc, m_mc = measure(Get_MonteCarlo, regime, DISTRIBUTIONS, n_samples, seed=0)
+        print(f'  Monte Carlo, chunks of 1e6:    {t_mc:6.2f} s, peak {m_mc / 1e6:6.0f} MB')
+
+        chunked, t_chunk, m_chunk = measure(Get_MonteCarlo, regime, DISTRIBUTIONS, n_samples, seed=0, chunk_size=20 * n_samples)
+        same = all(np.array_equal(results[key], chunked[key]) for key in ('m_gain', 'P_req', 'refuel_time'))
+        print(f'  Monte Carlo, chunks of {20 * n_samples:.0e}: {t_chunk:6.2f} s, peak {m_chunk / 1e6:6.0f} MB, same bands: {same}')
+
+    # One dictionary per sample, with the same samples
+    samples = results['samples']
+    start = time.perf_counter()
+    for i in range(LOOP_SAMPLES):
+        sc = dict(spacecraft, **{key: samples[key][i] for key in DISTRIBUTIONS})
+        m_gain = Getm_gain(regime, sc)[0][samples['epoch'][i]]
+        P_req = Get_PowReq(regime, sc)[0][samples['epoch'][i]]
+    loop_time = (time.perf_counter() - start) * len(samples['epoch']) / LOOP_SAMPLES
+    print(f'  Loop:                          {loop_time:6.2f} s (from {LOOP_SAMPLES} samples, without percentiles), {loop_time / t_mc:.0f}x slower')
+
+    # Bands of the time to refuel in days
+    for j in range(0, len(h), 40):
+        days = results['refuel_time'][:, j] / 86400
+        print(f'  {h[j]:5.0f} km: gain in {results["gain_probability"][j]:4.0%} of the samples, refuel time '
+              + ' '.join(f'p{p}={d:7.1f}' for p, d in zip(results['percentiles'], days)) + ' days')
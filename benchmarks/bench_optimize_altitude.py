@@ -0,0 +1,53 @@
+# Benchmark of optimize_altitude against the dense grid used before in altitude_analysis.py.
+# Run from the repository root: python benchmarks/bench_optimize_altitude.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from altitude_analysis import Get_minAlts, Get_DesignSweep, optimize_altitude, earth
+from classes import Regime, DesignBatch
+from spacecraft import spacecraft
+
+
+def grid(designs, n_h=1000):
+    # Dense grid of altitudes, masked with the limits of each design
+    regime = Regime(np.linspace(70, 300, n_h), earth)
+    m_gain = Get_DesignSweep(regime, designs)['m_gain']
+    h_drag = Get_minAlts(regime, {'A_ref': 1, 'C_D': 1, 'T_max': designs['T_max'] / (designs['A_ref'] * designs['C_D']),
+                                  'Q_rejection': spacecraft['Q_rejection']})[0]
+    m_gain[regime.h[None, :] < h_drag[:, None]] = -np.inf
+    return regime.h[np.argmax(m_gain, axis=1)], regime.msis_calls * n_h
+
+
+if __name__ == '__main__':
+
+    # Load NRLMSIS before timing
+    Regime(np.array([100.0]), earth).atmos()
+
+    for n_designs in (1, 100):
+        rng = np.random.default_rng(0)
+        designs = DesignBatch(dict(spacecraft, Isp=rng.uniform(2000, 5000, n_designs), T_max=rng.uniform(0.1, 3, n_designs)))
+
+        start = time.perf_counter()
+        h_grid, points_grid = grid(designs)
+        t_grid = time.perf_counter() - start
+
+        start = time.perf_counter()
+        h_fine, points_fine = grid(designs, 230_001)
+        t_fine = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = optimize_altitude(Regime(np.linspace(70, 300, 20), earth), designs)
+        t_opt = time.perf_counter() - start
+
+        print(f'{n_designs} designs:')
+        print(f'  Grid of 1000 altitudes: {t_grid:6.3f} s, {points_grid:6d} altitudes per design, precision 0.23 km')
+        print(f'  Grid of 230001:         {t_fine:6.3f} s, {points_fine:6d} altitudes per design, precision 0.001 km')
+        print(f"  optimize_altitude:      {t_opt:6.3f} s, {result['n_evals']:6d} altitudes per design, precision 0.001 km")
+        print(f"  Largest difference in the optimal altitude: {np.max(np.abs(result['h_opt'] - h_grid)):.3f} km (coarse grid),"
+              f" {np.max(np.abs(result['h_opt'] - h_fine)):.4f} km (fine grid)")
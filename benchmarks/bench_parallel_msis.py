@@ -0,0 +1,32 @@
+# Scaling benchmark of the parallel NRLMSIS evaluation in GetComposition.
+# Run from the repository root: python benchmarks/bench_parallel_msis.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the repository root to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from GMATAnalysis.atmos_functions import GetComposition
+from synthetic import GeoPosArrays
+
+
+if __name__ == '__main__':
+
+    n_points = 200_000
+    states = GeoPosArrays(n_points)
+    print(f'{n_points:.0e} trajectory points, {os.cpu_count()} CPUs available')
+
+    serial = None
+    for workers in [1, 2, 4, 8]:
+        start = time.perf_counter()
+        composition = GetComposition(states, verbose=False, workers=workers, chunk_size=10_000)
+        elapsed = time.perf_counter() - start
+
+        if serial is None:
+            serial, t_serial = composition, elapsed
+        same = all(np.array_equal(composition[key], serial[key]) for key in serial)
+
+        print(f'{workers} workers: {elapsed:6.2f} s, speedup x{t_serial / elapsed:.2f}, same as serial: {same}')
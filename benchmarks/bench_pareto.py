@@ -0,0 +1,94 @@
+# Benchmark of the Pareto front of power, time to refuel and altitude, against checking every point against all the others,
+# on the Isp x T_max grid of time_analysis, on points that all have a different altitude and on a design sweep processed in chunks.
+# Run from the repository root: python benchmarks/bench_pareto.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from altitude_analysis import Get_Drag, Get_LimitIdx, Get_DesignSweep, earth
+from time_analysis import time_analysis, power_analysis
+from pareto import pareto_front, ParetoFront
+from classes import Regime, DesignBatch
+from spacecraft import spacecraft
+
+# The pairwise check is only timed over this many points, and scaled to all of them (it is O(n^2))
+PAIRWISE_POINTS = 20_000
+
+
+def pareto_pairwise(power, refuel_time, altitude):
+    # Every point against all the others, one point at a time
+    valid = np.isfinite(refuel_time) & (refuel_time > 0)
+    front = []
+    for i in np.flatnonzero(valid):
+        better = (power <= power[i]) & (refuel_time <= refuel_time[i]) & (altitude >= altitude[i]) & valid
+        strictly = (power < power[i]) | (refuel_time < refuel_time[i]) | (altitude > altitude[i])
+        if not np.any(better & strictly):
+            front.append(i)
+    return np.array(front)
+
+
+if __name__ == '__main__':
+
+    # Isp x T_max grid, the altitude of each thrust is where it beats the drag
+    h = np.linspace(70, 500, 50000)
+    regime = Regime(h, earth)
+    T_max = np.linspace(0.01, 10, 1000)
+    Isp = np.linspace(1500, 5000, 1000)
+    refuel = time_analysis(regime, spacecraft, Isp, T_max)
+    power = power_analysis(spacecraft, Isp, T_max)
+    altitude = h[Get_LimitIdx(Get_Drag(regime, spacecraft), T_max) % len(h)]
+
+    start = time.perf_counter()
+    idx = pareto_front(power, refuel, altitude[None, :])
+    grid_time = time.perf_counter() - start
+    print(f'Isp x T_max grid, {refuel.size:,} points: {grid_time:6.3f} s, {len(idx)} on the front')
+
+    # Pairwise check over a random subset, compared with the front of the same subset
+    rng = np.random.default_rng(0)
+    subset = rng.choice(refuel.size, PAIRWISE_POINTS, replace=False)
+    p, t, a = power.ravel()[subset], refuel.ravel()[subset], np.tile(altitude, len(Isp))[subset]
+    start = time.perf_counter()
+    expected = pareto_pairwise(p, t, a)
+    pairwise_time = (time.perf_counter() - start) * (refuel.size / PAIRWISE_POINTS)**2
+    same = np.array_equal(np.sort(pareto_front(p, t, a)), expected)
+    print(f'Pairwise check: {pairwise_time:8.0f} s (from {PAIRWISE_POINTS:,} points), {pairwise_time / grid_time:.0f}x slower, '
+          f'same front on the subset: {same}')
+
+    # Continuous altitudes, like the optimal altitude of each design, every point at a different altitude
+    n = 1_000_000
+    p, t, a = rng.uniform(1e3, 1e5, n), rng.uniform(1, 100, n), rng.uniform(120, 400, n)
+    start = time.perf_counter()
+    idx = pareto_front(p, t, a)
+    unique_time = time.perf_counter() - start
+    same = np.array_equal(np.sort(pareto_front(p[:PAIRWISE_POINTS], t[:PAIRWISE_POINTS], a[:PAIRWISE_POINTS])),
+                          pareto_pairwise(p[:PAIRWISE_POINTS], t[:PAIRWISE_POINTS], a[:PAIRWISE_POINTS]))
+    print(f'Unique altitudes, {n:,} points: {unique_time:6.3f} s, {len(idx)} on the front, same front on a subset: {same}')
+
+    # Design sweep in chunks, 10 million points with the altitudes of the regime
+    n_designs = 10_000
+    A_intake = rng.uniform(1, 10, n_designs)
+    designs = DesignBatch(dict(spacecraft, A_intake=A_intake, A_ref=A_intake,
+                               eff_intake=rng.uniform(0.3, 0.9, n_designs),
+                               C_D=rng.uniform(1.5, 3, n_designs),
+                               Isp=rng.uniform(1000, 6000, n_designs),
+                               n_prop=rng.uniform(0.5, 0.9, n_designs)))
+    sweep_regime = Regime(np.linspace(120, 400, 1000), earth)
+    results = Get_DesignSweep(sweep_regime, designs)
+
+    start = time.perf_counter()
+    idx = pareto_front(results['P_req'], results['refuel_time'], sweep_regime.h[None, :])
+    full_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    front = ParetoFront()
+    for rows in np.array_split(np.arange(n_designs), 20):
+        front.update(results['P_req'][rows], results['refuel_time'][rows], sweep_regime.h[None, :], design=rows[:, None])
+    chunk_time = time.perf_counter() - start
+    same = np.array_equal(front.power, results['P_req'].ravel()[idx])
+    print(f'Design sweep, {results["P_req"].size:,} points: {full_time:6.3f} s at once, {chunk_time:6.3f} s in 20 chunks, '
+          f'{len(front)} on the front, same front: {same}')
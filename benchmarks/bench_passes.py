@@ -0,0 +1,84 @@
+# Benchmark of the pass segmentation (FindPasses, CropData, GetPassStatistics) against the previous list based CropData
+# and a loop over the passes.
+# Run from the repository root: python benchmarks/bench_passes.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the repository root to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from GMATAnalysis.data import CropData
+from GMATAnalysis.atmos_functions import GetPassStatistics, GetMassFlowMatrix
+from synthetic import GeoPosArrays
+
+H_MAX = 150
+
+
+def CropDataLegacy(GeoPos:dict, VelHist:dict, max_alt:float) -> dict:
+    # Previous implementation of CropData, kept for comparison
+    indices = [i for i, alt in enumerate(GeoPos['altitude']) if alt <= max_alt]
+    New_GeoPos = {key: [GeoPos[key][i] for i in indices] for key in ('altitude', 'latitude', 'longitude', 'date')}
+    New_VelHist = {key: [VelHist[key][i] for i in indices] for key in ('velocity', 'elapsed_seconds')}
+    return New_GeoPos, New_VelHist
+
+
+def PassStatisticsLoop(states:dict, composition:np.ndarray, h_max:float) -> dict:
+    # Same statistics with a Python loop over the samples to find the passes and one reduction per pass
+    m_dot, _ = GetMassFlowMatrix(states, composition, h_max=h_max)
+    t = states['elapsed_seconds']
+    weights = np.zeros(len(t))
+    weights[:-1] += np.diff(t) / 2
+    weights[1:] += np.diff(t) / 2
+
+    passes, start = [], None
+    for i, h in enumerate(states['altitude']):
+        if h < h_max and start is None:
+            start = i
+        elif h >= h_max and start is not None:
+            passes.append((start, i))
+            start = None
+    if start is not None:
+        passes.append((start, len(t)))
+
+    q = 0.5 * composition[:, 0] * states['velocity']**2
+    return {
+        'min_altitude': np.array([states['altitude'][i:j].min() for i, j in passes]),
+        'max_dynamic_pressure': np.array([q[i:j].max() for i, j in passes]),
+        'm_total': np.array([m_dot[:, i:j] @ weights[i:j] for i, j in passes]).T
+    }
+
+
+if __name__ == '__main__':
+
+    for n_rows in [1_000_000, 10_000_000]:
+
+        # Samples every 10 s, one pass below 150 km per 3 hour orbit. The composition only depends on the altitude here.
+        states = GeoPosArrays(n_rows)
+        composition = np.zeros((n_rows, 10))
+        composition[:, 0] = 1e-9 * np.exp(-(states['altitude'] - 120) / 10)
+        print(f'{n_rows:,} samples')
+
+        start = time.perf_counter()
+        CropData(states, states, H_MAX)
+        crop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        Passes = GetPassStatistics(states, composition, h_max=H_MAX)
+        stats_time = time.perf_counter() - start
+        print(f'  CropData:          {crop_time:6.3f} s, pass statistics {stats_time:6.3f} s ({len(Passes["start"]):,} passes)')
+
+        if n_rows <= 1_000_000:
+            start = time.perf_counter()
+            CropDataLegacy(states, states, H_MAX)
+            legacy_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            expected = PassStatisticsLoop(states, composition, H_MAX)
+            loop_time = time.perf_counter() - start
+
+            difference = max(np.max(np.abs(Passes[key] - expected[key]) / np.max(np.abs(expected[key]))) for key in expected)
+            print(f'  Previous CropData: {legacy_time:6.3f} s ({legacy_time / crop_time:.0f}x), '
+                  f'loop statistics {loop_time:6.3f} s ({loop_time / stats_time:.0f}x), largest relative difference {difference:.1e}')
@@ -0,0 +1,53 @@
+# Benchmark of Propagate with a batch of initial conditions against propagating one orbit at a time.
+# Run from the repository root: python benchmarks/bench_propagator.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the repository root and the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from GMATAnalysis.data import ReadState
+from GMATAnalysis.propagator import Propagate, OrbitState
+from classes import DensityTable
+
+EPOCH = '2025-01-01T12:00:37.184'
+
+# The loop is only timed over this many orbits, and scaled to the whole batch
+LOOP_ORBITS = 20
+
+
+if __name__ == '__main__':
+
+    table = DensityTable.build(70, 1000, dh=0.5)
+
+    # Check against the GMAT run (J2, no drag)
+    state = ReadState('GMAT_Data/StateVectorTest1.txt', cache=False)
+    States = Propagate(state[0, 3:6], state[0, 0:3], EPOCH, state[-1, 7], step=10, mass=7000, thrust=None,
+                       table=DensityTable(table.h, table.composition * 0))
+    print(f'Distance to GMAT after one orbit: {np.linalg.norm(States["r"][-1] - state[-1, 3:6]):.2f} km')
+
+    # 1000 eccentric orbits with perigees from 120 to 300 km, 3 hours with a step of 10 s
+    rng = np.random.default_rng(0)
+    n_orbits = 1000
+    r0, v0 = OrbitState(rng.uniform(120, 300, n_orbits), rng.uniform(1000, 8600, n_orbits),
+                        inclination=rng.uniform(0, 98, n_orbits), raan=rng.uniform(0, 360, n_orbits),
+                        arg_perigee=rng.uniform(0, 360, n_orbits), true_anomaly=rng.uniform(0, 360, n_orbits))
+    print(f'{n_orbits} orbits, 1080 steps each')
+
+    start = time.perf_counter()
+    States = Propagate(r0, v0, EPOCH, 10800, step=10, table=table, save_every=6)
+    batch_time = time.perf_counter() - start
+    print(f'Batch:         {batch_time:7.2f} s')
+
+    start = time.perf_counter()
+    difference = 0
+    for i in range(LOOP_ORBITS):
+        single = Propagate(r0[i], v0[i], EPOCH, 10800, step=10, table=table, save_every=6)
+        difference = max(difference, np.abs(single['r'] - States['r'][i]).max())
+    loop_time = (time.perf_counter() - start) * n_orbits / LOOP_ORBITS
+    print(f'One at a time: {loop_time:7.2f} s (from {LOOP_ORBITS} orbits), {loop_time / batch_time:.0f}x slower, '
+          f'largest difference {difference:.1e} km')
@@ -0,0 +1,42 @@
+# Benchmark of the approximate composition from a CompositionGrid against running NRLMSIS at every sample.
+# Run from the repository root: python benchmarks/bench_quantized_composition.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the repository root to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from GMATAnalysis.atmos_functions import GetComposition, CompositionGrid
+from synthetic import GeoPosArrays
+
+
+if __name__ == '__main__':
+
+    # Ten orbits of the eccentric trajectory, one sample per second
+    states = GeoPosArrays(108_000, step=1)
+    print(f'{len(states["altitude"]):,} samples')
+
+    # Load NRLMSIS before timing
+    GetComposition(GeoPosArrays(10), verbose=False)
+
+    start = time.perf_counter()
+    exact = GetComposition(states, verbose=False, Matrix=True)
+    exact_time = time.perf_counter() - start
+    print(f'Exact:                              {exact_time:6.2f} s')
+
+    valid = exact[:, 0] > 0
+    for spacing in [dict(dh=2, dlat=0.5, dlon=0.5, dt=300), dict(), dict(dh=10, dlat=2, dlon=2, dt=1800)]:
+        grid = CompositionGrid(**spacing)
+
+        start = time.perf_counter()
+        approx = GetComposition(states, verbose=False, Matrix=True, grid=grid)
+        grid_time = time.perf_counter() - start
+
+        stats = grid.stats()
+        error = np.abs(approx[valid, 0] / exact[valid, 0] - 1)
+        name = ', '.join(f'{key}={value}' for key, value in spacing.items()) or 'defaults'
+        print(f'{name:34s}  {grid_time:6.2f} s ({exact_time / grid_time:4.1f}x), hit rate {stats["hit_rate"]:.1%}, '
+              f'max error {stats["max_error"]:.1%} (checked), {error.max():.1%} (all), mean {error.mean():.2%}')
@@ -0,0 +1,87 @@
+# Benchmark of ReadGeoPos against the previous line by line reader, on synthetic GMAT reports.
+# Run from the repository root: python benchmarks/bench_read_geopos.py
+# The synthetic files are written to a temporary folder the first time (the 10M row one takes a couple of minutes),
+# next to their binary caches.
+
+import os
+import sys
+import time
+import numpy as np
+from datetime import datetime
+
+# Add the repository root to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from GMATAnalysis.data import ReadGeoPos
+from synthetic import GeoPosFile
+
+# The old reader is only timed up to this size, it takes minutes above it
+LEGACY_MAX_ROWS = 1_000_000
+
+
+def ReadGeoPosLegacy(filepath:str) -> dict:
+    # Previous implementation of ReadGeoPos, kept for comparison
+    with open(filepath, 'r') as file:
+        num_lines = sum(1 for _ in file) - 1
+
+    altitude = [0.0] * num_lines
+    latitude = [0.0] * num_lines
+    longitude = [0.0] * num_lines
+    date = [None] * num_lines
+    velocity = [0.0] * num_lines
+    elapsed_seconds = [0.0] * num_lines
+
+    with open(filepath, 'r') as file:
+        next(file)
+
+        for i, line in enumerate(file):
+            parts = line.split()
+            altitude[i] = float(parts[0])
+            latitude[i] = float(parts[1])
+            longitude[i] = float(parts[2])
+            date[i] = datetime.strptime(" ".join(parts[3:7]), "%d %b %Y %H:%M:%S.%f")
+            velocity[i] = float(parts[7]) * 1000
+            elapsed_seconds[i] = float(parts[8])
+
+    return {
+        "altitude": np.array(altitude),
+        "latitude": np.array(latitude),
+        "longitude": np.array(longitude),
+        "date": np.array(date),
+        "velocity": np.array(velocity),
+        "elapsed_seconds": np.array(elapsed_seconds)
+    }
+
+
+if __name__ == '__main__':
+
+    for n_rows in [1_000_000, 10_000_000]:
+        filepath = GeoPosFile(n_rows)
+
+        start = time.perf_counter()
+        states = ReadGeoPos(filepath, cache=False)
+        t_new = time.perf_counter() - start
+        line = f'{n_rows:.0e} rows: ReadGeoPos {t_new:6.2f} s ({n_rows / t_new:10,.0f} rows/s)'
+
+        # First cached read writes the .npy files, the second one memory-maps them
+        start = time.perf_counter()
+        ReadGeoPos(filepath, cache=True)
+        t_write = time.perf_counter() - start
+        start = time.perf_counter()
+        cached = ReadGeoPos(filepath, cache=True)
+        t_cached = time.perf_counter() - start
+        line += f' | cache write {t_write:6.2f} s, cached read {t_cached * 1e3:6.1f} ms'
+
+        for key in states:
+            assert np.array_equal(states[key], cached[key])
+
+        if n_rows <= LEGACY_MAX_ROWS:
+            start = time.perf_counter()
+            legacy = ReadGeoPosLegacy(filepath)
+            t_old = time.perf_counter() - start
+            line += f' | legacy {t_old:6.2f} s ({n_rows / t_old:10,.0f} rows/s), speedup x{t_old / t_new:.1f}'
+
+            for key in states:
+                assert np.array_equal(states[key], legacy[key].astype(states[key].dtype))
+
+        print(line)
@@ -0,0 +1,61 @@
+# Benchmark of a solar cycle sweep with one Regime over all the epochs against one Regime per epoch.
+# Run from the repository root: python benchmarks/bench_solar_cycle.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from altitude_analysis import Getm_gain, earth
+from classes import Regime
+from spacecraft import spacecraft
+
+
+def one_per_epoch(h, epochs, f107, ap):
+    return np.stack([Getm_gain(Regime(h, earth, epoch=epoch, f107=f, f107a=f, ap=a), spacecraft)[0]
+                     for epoch, f, a in zip(epochs, f107, ap)])
+
+
+def batched(h, epochs, f107, ap):
+    return Getm_gain(Regime(h, earth, epoch=epochs, f107=f107, f107a=f107, ap=ap), spacecraft)[0]
+
+
+if __name__ == '__main__':
+
+    # 11 year solar cycle sampled every 2 weeks, with a simple sinusoidal F10.7
+    h = np.linspace(70, 500, 1000)
+    epochs = np.datetime64('2008-12-01') + np.arange(0, 11 * 365, 14).astype('timedelta64[D]')
+    phase = np.arange(len(epochs)) / len(epochs)
+    f107 = 70 + 110 * np.sin(np.pi * phase)**2
+    ap = 5 + 10 * np.sin(np.pi * phase)**2
+    print(f'{len(epochs)} epochs x {len(h)} altitudes')
+
+    # Load NRLMSIS before timing
+    Regime(h[:1], earth, f107=150, f107a=150, ap=4).atmos()
+
+    start = time.perf_counter()
+    expected = one_per_epoch(h, epochs, f107, ap)
+    t_loop = time.perf_counter() - start
+    print(f'One Regime per epoch: {t_loop:6.3f} s')
+
+    start = time.perf_counter()
+    m_gain = batched(h, epochs, f107, ap)
+    t_batch = time.perf_counter() - start
+    print(f'One Regime:           {t_batch:6.3f} s, {t_loop / t_batch:4.1f}x')
+
+    assert np.array_equal(m_gain, expected)
+
+    # A second sweep over every other epoch plus a few new ones reuses the stored epochs
+    regime = Regime(h, earth, epoch=epochs, f107=f107, f107a=f107, ap=ap)
+    regime.atmos()
+    new = epochs[-1] + np.arange(1, 11).astype('timedelta64[D]')
+    start = time.perf_counter()
+    regime.epoch = np.concatenate([epochs[::2], new])
+    regime.f107 = regime.f107a = np.concatenate([f107[::2], np.full(10, 150)])
+    regime.ap = np.concatenate([ap[::2], np.full(10, 4)])
+    Getm_gain(regime, spacecraft)
+    t_reuse = time.perf_counter() - start
+    print(f'Second sweep, {len(regime.epoch)} epochs of which 10 new: {t_reuse:6.3f} s, {regime.msis_calls} NRLMSIS calls in total')
@@ -0,0 +1,59 @@
+# Benchmark of the space weather lookup for the dates of a long GMAT trajectory.
+# Compares SpaceWeather with pymsis.utils.get_f107_ap reading the same file.
+# Run from the repository root: python benchmarks/bench_space_weather.py
+
+import os
+import sys
+import time
+import warnings
+from pathlib import Path
+import numpy as np
+import pymsis.utils
+
+# Add the repository root to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from GMATAnalysis.data import SpaceWeather
+from synthetic import SpaceWeatherFile
+
+
+def best_of(function, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+if __name__ == '__main__':
+
+    filepath = SpaceWeatherFile()
+
+    start = time.perf_counter()
+    space_weather = SpaceWeather(filepath)
+    print(f'Loading {len(space_weather.dates)} days: {time.perf_counter() - start:.3f} s')
+
+    # Point pymsis at the same file
+    pymsis.utils._F107_AP_PATH = Path(filepath)
+    pymsis.utils._DATA = None
+    pymsis.utils._load_f107_ap_data()
+    warnings.simplefilter('ignore')
+
+    n = 10_000_000
+    sorted_dates = np.datetime64('2015-01-01') + (np.arange(n) * 10_000).astype('timedelta64[ms]')  # One every 10 s, about 3 years
+    random_dates = np.random.default_rng(0).permutation(sorted_dates)
+
+    for name, dates in (('Trajectory (sorted)', sorted_dates), ('Shuffled', random_dates)):
+        result, t_ours = best_of(space_weather, dates)
+        expected, t_pymsis = best_of(pymsis.utils.get_f107_ap, dates)
+        assert all(np.array_equal(a, b, equal_nan=True) for a, b in zip(result, expected))
+        print(f'{name}, {n:.0e} dates: SpaceWeather {t_ours:6.3f} s ({n / t_ours / 1e6:5.1f} M/s) | '
+              f'pymsis {t_pymsis:6.3f} s')
+
+        # Binary search used when the file has missing days
+        space_weather._contiguous = False
+        result, t_search = best_of(space_weather, dates)
+        space_weather._contiguous = True
+        assert all(np.array_equal(a, b, equal_nan=True) for a, b in zip(result, expected))
+        print(f'{name}, {n:.0e} dates: binary search {t_search:6.3f} s ({n / t_search / 1e6:5.1f} M/s), used for files with missing days')
@@ -0,0 +1,89 @@
+# Benchmark of StateToGeoPos (vectorized EarthMJ2000Eq to WGS-84 conversion) against a row by row conversion.
+# Run from the repository root: python benchmarks/bench_state_conversion.py
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the repository root to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from GMATAnalysis.data import ReadState, ReadGeoPos, StateToGeoPos, WGS84_RADIUS, WGS84_FLATTENING, EARTH_ROTATION, TT_UT1
+
+EPOCH = np.datetime64('2025-01-01T12:00:37.184')
+
+# The row by row conversion is only timed up to this size
+LOOP_MAX_ROWS = 10_000
+
+
+def StateToGeoPosLoop(state:np.ndarray, epoch:np.datetime64) -> dict:
+    # Same conversion one row at a time, with rotation matrices and a fixed point iteration for the latitude
+    a, f = WGS84_RADIUS, WGS84_FLATTENING
+    e2 = f * (2 - f)
+    arcsec = np.pi / (180 * 3600)
+    States = {key: [] for key in ('altitude', 'latitude', 'longitude', 'velocity')}
+
+    def Rz(angle):
+        return np.array([[np.cos(angle), np.sin(angle), 0], [-np.sin(angle), np.cos(angle), 0], [0, 0, 1]])
+
+    def Ry(angle):
+        return np.array([[np.cos(angle), 0, -np.sin(angle)], [0, 1, 0], [np.sin(angle), 0, np.cos(angle)]])
+
+    for row in state:
+        date = epoch + np.timedelta64(int(round(row[7] * 1000)), 'ms')
+        seconds = (date - np.datetime64('2000-01-01T12:00:00', 'ms')).astype(float) / 1e3
+        T, T_ut1 = seconds / (86400 * 36525), (seconds - TT_UT1) / (86400 * 36525)
+
+        zeta = (2306.2181 * T + 0.30188 * T**2 + 0.017998 * T**3) * arcsec
+        theta = (2004.3109 * T - 0.42665 * T**2 - 0.041833 * T**3) * arcsec
+        z = (2306.2181 * T + 1.09468 * T**2 + 0.018203 * T**3) * arcsec
+        gmst = (67310.54841 + (876600 * 3600 + 8640184.812866) * T_ut1 + 0.093104 * T_ut1**2 - 6.2e-6 * T_ut1**3) % 86400
+        x, y, z_ecef = Rz(gmst * 2 * np.pi / 86400) @ Rz(-z) @ Ry(theta) @ Rz(-zeta) @ row[3:6]
+
+        p = np.hypot(x, y)
+        lat = np.arctan2(z_ecef, p * (1 - e2))
+        for _ in range(10):
+            N = a / np.sqrt(1 - e2 * np.sin(lat)**2)
+            h = p / np.cos(lat) - N
+            lat = np.arctan2(z_ecef, p * (1 - e2 * N / (N + h)))
+
+        v_rel = row[0:3] - np.cross([0, 0, EARTH_ROTATION], row[3:6])
+        States['altitude'].append(h)
+        States['latitude'].append(np.degrees(lat))
+        States['longitude'].append(np.degrees(np.arctan2(y, x)))
+        States['velocity'].append(np.linalg.norm(v_rel) * 1000)
+
+    return {key: np.array(value) for key, value in States.items()}
+
+
+if __name__ == '__main__':
+
+    # Check against the GeoPos file of the same GMAT run
+    state = ReadState('GMAT_Data/StateVectorTest1.txt', cache=False)
+    geopos = ReadGeoPos('GMAT_Data/GeoPosData.txt', cache=False)
+    States = StateToGeoPos(state, EPOCH)
+    print('Largest difference with GeoPosData.txt: '
+          f'altitude {np.abs(States["altitude"] - geopos["altitude"]).max() * 1000:.2f} m, '
+          f'latitude {np.abs(States["latitude"] - geopos["latitude"]).max():.4f} deg, '
+          f'longitude {np.abs((States["longitude"] - geopos["longitude"] + 180) % 360 - 180).max():.4f} deg')
+
+    for n_rows in [10_000, 1_000_000, 5_000_000]:
+
+        # Repeat the orbit with new times
+        states = np.resize(state, (n_rows, 8))
+        states[:, 7] = np.arange(n_rows) * 60.0
+
+        start = time.perf_counter()
+        States = StateToGeoPos(states, EPOCH)
+        vector_time = time.perf_counter() - start
+        line = f'{n_rows:>10,} rows: vectorized {vector_time:7.3f} s ({n_rows / vector_time / 1e6:4.1f} M rows/s)'
+
+        if n_rows <= LOOP_MAX_ROWS:
+            start = time.perf_counter()
+            expected = StateToGeoPosLoop(states, EPOCH)
+            loop_time = time.perf_counter() - start
+            difference = max(np.abs(States[key] - expected[key]).max() for key in expected)
+            line += f', row by row {loop_time:7.3f} s ({loop_time / vector_time:5.0f}x), largest difference {difference:.1e}'
+
+        print(line)
@@ -0,0 +1,68 @@
+# Benchmark of the tiled time and power grids against time_analysis and power_analysis: peak memory, time and equality,
+# and a grid written to memory-mapped .npy files that wouldn't fit in memory with the full temporaries.
+# Run from the repository root: python benchmarks/bench_tiled_analysis.py
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+
+# Add the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from time_analysis import time_analysis, power_analysis, tiled_analysis, earth
+from classes import Regime
+from spacecraft import spacecraft
+
+
+def measure(function, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def in_memory(regime, Isp, T_max):
+    return time_analysis(regime, spacecraft, Isp, T_max), power_analysis(spacecraft, Isp, T_max)
+
+
+if __name__ == '__main__':
+
+    regime = Regime(np.linspace(70, 500, 50000), earth)
+    regime.atmos()  # Run NRLMSIS before timing, both methods share it
+
+    # In memory, 5000 x 5000
+    n = 5000
+    Isp, T_max = np.linspace(1500, 5000, n), np.linspace(0.01, 10, n)
+    (time_ref, power_ref), t_ref, m_ref = measure(in_memory, regime, Isp, T_max)
+    print(f'{n} x {n} grid, outputs {2 * n * n * 8 / 1e6:.0f} MB')
+    print(f'  time_analysis + power_analysis: {t_ref:6.2f} s, peak {m_ref / 1e6:7.0f} MB')
+
+    for max_memory, workers in ((256e6, 1), (16e6, 1), (16e6, 4)):
+        (time_grid, power_grid), t_tile, m_tile = measure(tiled_analysis, regime, spacecraft, Isp, T_max,
+                                                          max_memory=max_memory, workers=workers)
+        same = np.array_equal(time_grid, time_ref, equal_nan=True) and np.array_equal(power_grid, power_ref)
+        print(f'  Tiles of {max_memory / 1e6:3.0f} MB, {workers} workers:   {t_tile:6.2f} s, peak {m_tile / 1e6:7.0f} MB '
+              f'(outputs included), bit for bit: {same}')
+    del time_ref, power_ref, time_grid, power_grid
+
+    # Out of core, 30000 x 30000 written to .npy files
+    n = 30_000
+    Isp, T_max = np.linspace(1500, 5000, n), np.linspace(0.01, 10, n)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = os.path.join(folder, 'time.npy'), os.path.join(folder, 'power.npy')
+        _, t_tile, m_tile = measure(tiled_analysis, regime, spacecraft, Isp, T_max, *paths, max_memory=64e6)
+        print(f'{n} x {n} grid to .npy files, {2 * n * n * 8 / 1e9:.1f} GB: {t_tile:6.1f} s, peak {m_tile / 1e6:.0f} MB')
+
+        # Spot check some rows against the in-memory functions
+        rows = np.random.default_rng(0).choice(n, 5, replace=False)
+        time_grid, power_grid = np.load(paths[0], mmap_mode='r'), np.load(paths[1], mmap_mode='r')
+        same = (np.array_equal(time_grid[rows], time_analysis(regime, spacecraft, Isp[rows], T_max), equal_nan=True)
+                and np.array_equal(power_grid[rows], power_analysis(spacecraft, Isp[rows], T_max)))
+        print(f'  Rows equal to time_analysis and power_analysis: {same}')
+        del time_grid, power_grid
@@ -0,0 +1,205 @@
+# Benchmark suite of the hot paths, with a stored baseline of the time and peak memory of every case.
+# Run from the repository root:
+#     python benchmarks/run_benchmarks.py               compare with benchmarks/baseline.json, fail if anything regressed
+#     python benchmarks/run_benchmarks.py --save        run everything and store the results as the new baseline
+#     python benchmarks/run_benchmarks.py -k ReadGeoPos --threshold 0.5
+# The inputs are synthetic (see synthetic.py), including the space weather given to NRLMSIS, so nothing is downloaded
+# (without it pymsis would download SW-All.csv).
+# The baseline depends on the machine, save a new one when moving to another machine.
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import numpy as np
+
+# Add the repository root and the AltitudeAnalysis folder to the path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+from altitude_analysis import Get_minAlts, earth
+from time_analysis import time_analysis, power_analysis
+from classes import Regime, DensityTable
+from spacecraft import spacecraft
+from GMATAnalysis.data import ReadGeoPos, SpaceWeather
+from GMATAnalysis.atmos_functions import GetComposition, GetMassFlow
+from synthetic import GeoPosArrays, GeoPosFile, SpaceWeatherFile
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Synthetic space weather, and its values at the default epoch of Regime and DensityTable (F10.7, 81-day F10.7 and daily Ap)
+SPACE_WEATHER = SpaceWeather(SpaceWeatherFile())
+f107, f107a, ap = SPACE_WEATHER(np.array(['2000-01-01'], dtype='datetime64[ms]'))
+WEATHER = {'f107': f107[0], 'f107a': f107a[0], 'ap': ap[0, 0]}
+
+
+# ----------- CASES ------------
+# Every case is a function that prepares the inputs (not timed) and returns the function to time, called without arguments.
+
+def RegimeAtmos(n_h:int):
+    # NRLMSIS over the altitudes of a new regime, nothing stored yet
+    h = np.linspace(70, 500, n_h)
+    return lambda: Regime(h, earth, **WEATHER).atmos()
+
+
+def MinAlts(method:str, n_thrust:int):
+    # Drag and heating limits of many thrust levels, over a regime that already has its atmosphere
+    regime = Regime(np.linspace(70, 500, 20 if method == 'root' else 10_000), earth, **WEATHER)
+    regime.atmos()
+    sc = dict(spacecraft, T_max=np.geomspace(1e-3, 10, n_thrust))
+    return lambda: Get_minAlts(regime, sc, method=method)
+
+
+def TimeAnalysis(n:int):
+    # Refuel time over an Isp x T_max grid, like running time_analysis.py
+    regime = Regime(np.linspace(70, 500, 50000), earth, **WEATHER)
+    regime.atmos()
+    Isp, T_max = np.linspace(1500, 5000, n), np.linspace(0, 10, n)
+    return lambda: time_analysis(regime, spacecraft, Isp, T_max)
+
+
+def PowerAnalysis(n:int):
+    Isp, T_max = np.linspace(1500, 5000, n), np.linspace(0, 10, n)
+    return lambda: power_analysis(spacecraft, Isp, T_max)
+
+
+def ReadGeoPosFile(n_rows:int):
+    # Parse a synthetic GMAT report, without the binary cache
+    filepath = GeoPosFile(n_rows)
+    return lambda: ReadGeoPos(filepath, cache=False)
+
+
+def Composition(n_rows:int, table:bool):
+    # NRLMSIS at every point of a trajectory, or interpolated from a DensityTable
+    states = GeoPosArrays(n_rows)
+    density_table = DensityTable.build(70, 8700, dh=0.5, **WEATHER) if table else None
+    return lambda: GetComposition(states, table=density_table, verbose=False, Matrix=True, space_weather=SPACE_WEATHER)
+
+
+def MassFlow(n_rows:int, h_max:float):
+    # Mass flow rates and captured mass of every species
+    states = GeoPosArrays(n_rows)
+    states['velocity'] = states['velocity'] * 1000  # Convert from km/s to m/s, like ReadGeoPos
+    composition = GetComposition(states, table=DensityTable.build(70, 8700, dh=0.5, **WEATHER), verbose=False, Matrix=True)
+    return lambda: GetMassFlow(states, composition, h_max=h_max)
+
+
+CASES = {
+    'Regime.atmos h=1e3': lambda: RegimeAtmos(1_000),
+    'Regime.atmos h=1e5': lambda: RegimeAtmos(100_000),
+    'Get_minAlts grid T=1e5': lambda: MinAlts('grid', 100_000),
+    'Get_minAlts root T=1e3': lambda: MinAlts('root', 1_000),
+    'time_analysis 100x100': lambda: TimeAnalysis(100),
+    'time_analysis 1000x1000': lambda: TimeAnalysis(1_000),
+    'time_analysis 3000x3000': lambda: TimeAnalysis(3_000),
+    'power_analysis 100x100': lambda: PowerAnalysis(100),
+    'power_analysis 1000x1000': lambda: PowerAnalysis(1_000),
+    'power_analysis 3000x3000': lambda: PowerAnalysis(3_000),
+    'ReadGeoPos 1e5 rows': lambda: ReadGeoPosFile(100_000),
+    'ReadGeoPos 1e6 rows': lambda: ReadGeoPosFile(1_000_000),
+    'GetComposition msis 1e4 rows': lambda: Composition(10_000, table=False),
+    'GetComposition table 1e6 rows': lambda: Composition(1_000_000, table=True),
+    'GetMassFlow 1e6 rows': lambda: MassFlow(1_000_000, None),
+    'GetMassFlow 1e6 rows h_max=150': lambda: MassFlow(1_000_000, 150),
+}
+
+
+# ----------- MEASUREMENT ------------
+def Measure(function, repeats:int) -> dict:
+    """
+    Best time of repeats runs (after one warm up run), and the peak memory allocated by numpy and Python during one more run.
+    The memory is measured separately because tracemalloc slows the code down.
+    """
+    function()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'time': min(times), 'peak_memory': peak}
+
+
+def Machine() -> dict:
+    # Description of where the baseline was measured
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+
+def Compare(results:dict, baseline:dict, threshold:float, memory_threshold:float, min_time:float=1e-3) -> list:
+    # Cases slower or using more memory than the baseline by more than the thresholds (relative).
+    # Differences in time below min_time are noise for the fastest cases, they are not counted.
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        if result['time'] > baseline[name]['time'] * (1 + threshold) + min_time:
+            regressions.append(f'{name}: time {result["time"]:.4f} s against {baseline[name]["time"]:.4f} s')
+        if result['peak_memory'] > baseline[name]['peak_memory'] * (1 + memory_threshold):
+            regressions.append(f'{name}: peak memory {result["peak_memory"] / 1e6:.1f} MB against '
+                               f'{baseline[name]["peak_memory"] / 1e6:.1f} MB')
+    return regressions
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths and compare them with a stored baseline.')
+    parser.add_argument('--baseline', default=BASELINE, help='JSON file with the baseline.')
+    parser.add_argument('--save', action='store_true', help='Store the results as the baseline instead of comparing.')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed relative increase of the time.')
+    parser.add_argument('--memory-threshold', type=float, default=0.1, help='Allowed relative increase of the peak memory.')
+    parser.add_argument('--min-time', type=float, default=1e-3, help='Increase of the time in s always allowed, for the fastest cases.')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed runs of every case, the best one is kept.')
+    parser.add_argument('-k', dest='keyword', default='', help='Only run the cases with this text in their name.')
+    args = parser.parse_args()
+
+    stored = {'machine': None, 'results': {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            stored = json.load(file)
+    baseline = stored['results']
+
+    if not args.save and stored['machine'] not in (None, Machine()):
+        print(f'Warning: the baseline was measured on another machine, {stored["machine"]}')
+
+    # Run the cases
+    results = {}
+    print(f'{"Case":32s} {"Time (s)":>10s} {"Baseline":>10s} {"Peak (MB)":>10s} {"Baseline":>10s}')
+    for name, case in CASES.items():
+        if args.keyword not in name:
+            continue
+
+        results[name] = Measure(case(), args.repeats)
+        reference = baseline.get(name, {'time': np.nan, 'peak_memory': np.nan})
+        print(f'{name:32s} {results[name]["time"]:10.4f} {reference["time"]:10.4f} '
+              f'{results[name]["peak_memory"] / 1e6:10.1f} {reference["peak_memory"] / 1e6:10.1f}')
+
+    if args.save:
+        # Keep the cases that were not run this time
+        stored = {'machine': Machine(), 'results': dict(baseline, **results)}
+        with open(args.baseline, 'w') as file:
+            json.dump(stored, file, indent=4)
+        print(f'Baseline saved to {args.baseline}')
+        sys.exit(0)
+
+    missing = [name for name in results if name not in baseline]
+    if missing:
+        print(f'Not in the baseline, run with --save to add them: {", ".join(missing)}')
+
+    regressions = Compare(results, baseline, args.threshold, args.memory_threshold, args.min_time)
+    if regressions:
+        print(f'{len(regressions)} regressions beyond {args.threshold:.0%} in time or {args.memory_threshold:.0%} in memory:')
+        for regression in regressions:
+            print(f'  {regression}')
+        sys.exit(1)
+
+    print('No regressions.')
@@ -0,0 +1,86 @@
+# Synthetic inputs for the benchmarks, so they can run without GMAT or large data files.
+
+import os
+import tempfile
+import numpy as np
+
+# Folder where the synthetic files are kept between runs
+DATA_DIR = os.path.join(tempfile.gettempdir(), 'atmos_benchmarks')
+
+# Same columns and widths as GMAT_Data/GeoPosData.txt
+GEOPOS_HEADER = (('TestSC.Earth.Altitude', 26), ('TestSC.Earth.Latitude', 26), ('TestSC.Earth.Longitude', 26),
+                 ('TestSC.TDBGregorian', 27), ('TestSC.EarthMJ2000Eq.VMAG', 28), ('TestSC.ElapsedSecs', 26))
+
+
+def GeoPosArrays(n_rows:int, step:float=10, start:int=0) -> dict:
+    """
+    This function creates the data of an eccentric orbit like the one in GMAT_Data/GeoPosData.txt.
+    Perigee is at 120 km and apogee at 8600 km, one orbit every 3 hours, with one sample every step seconds.
+    start is the index of the first sample, so long trajectories can be created in pieces.
+    """
+    t = (start + np.arange(n_rows)) * step
+    phase = 2 * np.pi * t / 10800
+
+    r = 6371 + 120 + (8600 - 120) * (1 + np.cos(phase)) / 2
+    a = 6371 + (120 + 8600) / 2  # Semi-major axis in km
+
+    return {
+        'altitude': r - 6371,  # km
+        'latitude': 5 * np.sin(phase),  # deg
+        'longitude': (t / 240 + 180) % 360 - 180,  # deg
+        'date': np.datetime64('2025-01-01T12:00:00.000') + (t * 1000).astype('timedelta64[ms]'),
+        'velocity': np.sqrt(3.986e5 * (2 / r - 1 / a)),  # km/s
+        'elapsed_seconds': t
+    }
+
+
+def WriteGeoPos(filepath:str, n_rows:int, block_rows:int=100_000):
+    # Write a fixed width GMAT report with GeoPosArrays data, block by block to keep memory low
+    widths = [width for _, width in GEOPOS_HEADER]
+    row = ''.join(f'{{:<{width}}}' for width in widths) + '\n'
+
+    with open(filepath, 'w') as file:
+        file.write(''.join(f'{name:<{width}}' for name, width in GEOPOS_HEADER) + '\n')
+
+        for start in range(0, n_rows, block_rows):
+            data = GeoPosArrays(min(block_rows, n_rows - start), start=start)
+            dates = data['date'].astype(object)
+
+            file.write(''.join(row.format(repr(h), repr(lat), repr(lon), f'{d:%d %b %Y %H:%M:%S}.{d.microsecond // 1000:03d}', repr(v), repr(t))
+                               for h, lat, lon, d, v, t in zip(data['altitude'].tolist(), data['latitude'].tolist(),
+                                                               data['longitude'].tolist(), dates, data['velocity'].tolist(),
+                                                               data['elapsed_seconds'].tolist())))
+
+
+def GeoPosFile(n_rows:int) -> str:
+    # Path to a synthetic GeoPos report with n_rows rows, created the first time it is needed
+    os.makedirs(DATA_DIR, exist_ok=True)
+    filepath = os.path.join(DATA_DIR, f'GeoPos_{n_rows}.txt')
+
+    if not os.path.exists(filepath):
+        WriteGeoPos(filepath + '.tmp', n_rows)
+        os.replace(filepath + '.tmp', filepath)
+
+    return filepath
+
+
+def SpaceWeatherFile(start:str='1957-10-01', stop:str='2030-01-01') -> str:
+    # Path to a synthetic space weather file in the CelesTrak SW-All.csv format, with an 11 year solar cycle
+    os.makedirs(DATA_DIR, exist_ok=True)
+    filepath = os.path.join(DATA_DIR, f'SW-All_{start}_{stop}.csv')
+
+    if not os.path.exists(filepath):
+        days = np.arange(np.datetime64(start), np.datetime64(stop))
+        phase = 2 * np.pi * (days - days[0]).astype(float) / (11 * 365.25)
+        f107 = np.round(140 - 70 * np.cos(phase) + 20 * np.sin(phase * 40), 1)
+        ap = (8 + 6 * np.sin(phase[:, None] * 90 + np.arange(8))).astype(int)
+
+        with open(filepath + '.tmp', 'w') as file:
+            file.write('DATE,BSRN,ND,KP1,KP2,KP3,KP4,KP5,KP6,KP7,KP8,KP_SUM,AP1,AP2,AP3,AP4,AP5,AP6,AP7,AP8,AP_AVG,CP,C9,ISN,'
+                       'F10.7_OBS,F10.7_ADJ,F10.7_DATA_TYPE,F10.7_OBS_CENTER81,F10.7_OBS_LAST81,F10.7_ADJ_CENTER81,F10.7_ADJ_LAST81\n')
+            for day, f, a in zip(days, f107, ap):
+                file.write(f'{day},1,1,10,10,10,10,10,10,10,10,80,{",".join(map(str, a))},{round(a.mean())},0.1,0,100,'
+                           f'{f},{f},OBS,{f},{f},{f},{f}\n')
+        os.replace(filepath + '.tmp', filepath)
+
+    return filepath
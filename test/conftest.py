@@ -0,0 +1,48 @@
+import sys
+import os
+
+# The AltitudeAnalysis scripts import each other as top level modules (they are meant to be run from their own folder)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'AltitudeAnalysis')))
+
+import pytest
+import numpy as np
+import pymsis
+
+
+def fake_msis_values(alts:np.ndarray, f107:np.ndarray=None) -> np.ndarray:
+    # Exponential atmosphere with the same 11 columns as NRLMSIS, the densities are proportional to F10.7 (150 if not given)
+    alts = np.asarray(alts, dtype=float)
+    scale = np.ones(alts.shape) if f107 is None else np.broadcast_to(np.asarray(f107, dtype=float) / 150, alts.shape)
+    out = np.empty(alts.shape + (11,))
+    out[..., 0] = 1.225 * np.exp(-alts / 8) * scale  # kg/m^3
+    out[..., 1:10] = 1e25 * np.exp(-alts[..., None] / np.arange(7, 16)) * scale[..., None]  # m^-3
+    out[..., 10] = 200 + alts  # K
+    return out
+
+
+@pytest.fixture
+def fake_msis(monkeypatch):
+    """
+    Replaces pymsis.calculate by a cheap exponential atmosphere so the tests don't need NRLMSIS or space weather data.
+    Like NRLMSIS, inputs of the same length are points of a trajectory and inputs of different lengths make a grid.
+    The returned list stores the number of points of every call made.
+    """
+    calls = []
+
+    def calculate(dates, lons, lats, alts, f107s=None, f107as=None, aps=None, *args, **kwargs):
+        dates, lons, lats, alts = [np.atleast_1d(value) for value in (dates, lons, lats, alts)]
+        if f107s is not None:
+            f107s = np.broadcast_to(f107s, dates.shape)
+
+        if len(dates) == len(lons) == len(lats) == len(alts):
+            out = fake_msis_values(alts, f107s)
+        else:
+            grid = np.broadcast_to(alts, (len(dates), len(lons), len(lats), len(alts)))
+            out = fake_msis_values(grid, None if f107s is None else f107s[:, None, None, None])
+
+        calls.append(out.size // 11)
+        return out
+
+    monkeypatch.setattr(pymsis, 'calculate', calculate)
+    return calls
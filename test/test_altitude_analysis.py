@@ -0,0 +1,164 @@
+import numpy as np
+
+from AltitudeAnalysis.altitude_analysis import Get_minAlts, Get_Drag, Getm_gain, Get_PowReq, Get_DesignSweep, Get_MonteCarlo, optimize_altitude, _SolveLimit, earth
+from AltitudeAnalysis.classes import Regime, DesignBatch
+from spacecraft import spacecraft
+
+
+def test_minalts_root(fake_msis):
+    coarse = Regime(np.linspace(70, 300, 20), earth)
+    T_max = np.array([0.01, 0.1, 1, 5, 1e6, 1e-12])
+    sc = dict(spacecraft, T_max=T_max)
+
+    h_drag, h_heat = Get_minAlts(coarse, sc, method='root')
+    assert h_drag.shape == T_max.shape
+    assert h_heat == 70
+
+    # The drag at the solution is the thrust, T = 1e6 is reached everywhere and T = 1e-12 nowhere
+    np.testing.assert_allclose(Get_Drag(Regime(h_drag[:4], earth), sc), T_max[:4], rtol=1e-4)
+    assert h_drag[4] == 70
+    assert np.isnan(h_drag[5])
+
+    # All thrusts are solved together with a few MSIS calls
+    _, n_evals = _SolveLimit(coarse, sc, Get_Drag, T_max)
+    assert n_evals <= 10
+
+    # The grid method agrees to within the grid spacing
+    fine = Regime(np.linspace(70, 300, 20001), earth)
+    h_grid, _ = Get_minAlts(fine, dict(spacecraft, T_max=1))
+    assert abs(h_grid - Get_minAlts(coarse, dict(spacecraft, T_max=1), method='root')[0]) < fine.h[1] - fine.h[0]
+    assert h_grid == fine.h[np.argmax(Get_Drag(fine, spacecraft) < 1)]
+
+    # Both methods agree on the limits that are reached everywhere and nowhere
+    h_grid, h_heat = Get_minAlts(fine, sc)
+    assert h_grid[4] == 70 and np.isnan(h_grid[5])
+    assert h_heat == 70
+
+
+def test_minalts_root_epochs(fake_msis):
+    # With several epochs each one is solved on its own, the fake atmosphere is proportional to F10.7
+    epochs = np.array(['2001-01-01', '2008-01-01'], dtype='datetime64[ms]')
+    T_max = np.array([0.01, 0.1, 1])
+    sc = dict(spacecraft, T_max=T_max)
+    coarse = Regime(np.linspace(70, 300, 20), earth, epoch=epochs, f107=[70, 250], f107a=[70, 250], ap=4)
+
+    h_drag, h_heat = Get_minAlts(coarse, sc, method='root')
+    assert h_drag.shape == (2, 3)
+    assert h_heat == 70
+    assert np.all(h_drag[1] > h_drag[0])
+    for i, f107 in enumerate([70, 250]):
+        single = Regime(h_drag[i], earth, epoch=epochs[i], f107=f107, f107a=f107, ap=4)
+        np.testing.assert_allclose(Get_Drag(single, sc), T_max, rtol=1e-4)
+
+    # Same as the grid method to within the grid spacing
+    fine = Regime(np.linspace(70, 300, 20001), earth, epoch=epochs, f107=[70, 250], f107a=[70, 250], ap=4)
+    h_grid, _ = Get_minAlts(fine, sc)
+    assert h_grid.shape == (2, 3)
+    assert np.all(np.abs(h_grid - h_drag) < fine.h[1] - fine.h[0])
+
+
+def test_design_sweep(fake_msis):
+    regime = Regime(np.linspace(70, 300, 50), earth)
+    rng = np.random.default_rng(0)
+    designs = DesignBatch(dict(spacecraft, Isp=rng.uniform(1000, 5000, 10), C_D=rng.uniform(1.5, 3, 10), A_intake=rng.uniform(1, 10, 10)))
+
+    # Chunks that don't divide the number of designs
+    results = Get_DesignSweep(regime, designs, chunk_size=3)
+    assert results['m_gain'].shape == (10, 50)
+    assert len(fake_msis) == 1
+
+    # Same as evaluating each design on its own
+    for i in range(len(designs)):
+        sc = designs.design(i)
+        m_gain = Getm_gain(regime, sc)[0]
+        np.testing.assert_allclose(results['m_gain'][i], m_gain, rtol=1e-12)
+        np.testing.assert_allclose(results['P_req'][i], Get_PowReq(regime, sc)[0], rtol=1e-12)
+        np.testing.assert_allclose(results['refuel_time'][i], np.where(m_gain > 0, sc['Tank_load'] / m_gain, np.inf), rtol=1e-12)
+
+
+def test_design_sweep_epochs(fake_msis):
+    # Every design at every epoch, the same as a regime of each epoch on its own
+    epochs = np.array(['2001-01-01', '2008-01-01'], dtype='datetime64[ms]')
+    regime = Regime(np.linspace(70, 300, 50), earth, epoch=epochs, f107=[70, 250], f107a=[70, 250], ap=4)
+    designs = DesignBatch(dict(spacecraft, Isp=[1000.0, 3000.0, 5000.0]))
+    results = Get_DesignSweep(regime, designs, chunk_size=2)
+    assert results['m_gain'].shape == (2, 3, 50)
+    for i in range(2):
+        single = Get_DesignSweep(regime.with_epoch(i), designs)
+        for key in single:
+            np.testing.assert_array_equal(results[key][i], single[key])
+
+
+def test_optimize_altitude(fake_msis):
+    coarse = Regime(np.linspace(70, 300, 20), earth)
+    fine = Regime(np.linspace(70, 300, 230001), earth)
+    rng = np.random.default_rng(1)
+    designs = DesignBatch(dict(spacecraft, Isp=rng.uniform(100, 5000, 8), T_max=rng.uniform(1e-4, 3, 8)))
+
+    result = optimize_altitude(coarse, designs)
+    assert result['n_evals'] < 100
+
+    # Same optimum as a fine grid restricted to the allowed altitudes
+    for i in range(len(designs)):
+        sc = designs.design(i)
+        h_drag, h_heat = Get_minAlts(fine, sc)
+        mask = fine.h >= max(h_drag, h_heat)
+        m_gain = Getm_gain(fine, sc)[0][mask]
+        assert abs(result['h_opt'][i] - fine.h[mask][np.argmax(m_gain)]) < 2e-3
+        np.testing.assert_allclose(result['value'][i], m_gain.max(), rtol=1e-3)
+
+    # Below 2 * Isp * g0 * eff_intake = V * C_D (Isp of about 1500 s) the spacecraft loses mass everywhere,
+    # so the best is to fly as high as possible. Otherwise it is to fly as low as the drag allows.
+    assert set(result['constraint']) == {'drag', 'upper bound'}
+    assert (result['constraint'] == 'upper bound').tolist() == (designs['Isp'] < 1000).tolist()
+
+    # A single design gives scalars, and a thrust too small to fly in the regime is infeasible
+    single = optimize_altitude(coarse, dict(spacecraft, T_max=1e-12), objective='refuel_time')
+    assert single['constraint'] == 'infeasible' and np.isnan(single['h_opt'])
+    single = optimize_altitude(coarse, spacecraft, objective='refuel_time')
+    assert single['constraint'] == 'drag'
+    assert single['value'] == spacecraft['Tank_load'] / optimize_altitude(coarse, spacecraft)['value']
+
+
+def test_optimize_altitude_epochs(fake_msis):
+    # Each epoch is optimized on its own, with one row of results per epoch
+    epochs = np.array(['2001-01-01', '2008-01-01'], dtype='datetime64[ms]')
+    coarse = Regime(np.linspace(70, 300, 20), earth, epoch=epochs, f107=[70, 250], f107a=[70, 250], ap=4)
+    designs = DesignBatch(dict(spacecraft, Isp=np.linspace(2000, 5000, 8), T_max=np.linspace(0.1, 3, 8)))
+
+    result = optimize_altitude(coarse, designs)
+    assert result['h_opt'].shape == result['value'].shape == result['constraint'].shape == (2, 8)
+    for i in range(2):
+        single = optimize_altitude(coarse.with_epoch(i), designs)
+        np.testing.assert_array_equal(result['h_opt'][i], single['h_opt'])
+        np.testing.assert_array_equal(result['constraint'][i], single['constraint'])
+    assert np.all(result['h_opt'][1] > result['h_opt'][0])
+
+    # A single design gives one value per epoch
+    assert optimize_altitude(coarse, spacecraft)['h_opt'].shape == (2,)
+
+
+def test_monte_carlo(fake_msis):
+    h = np.linspace(70, 300, 50)
+    epochs = np.full(2, np.datetime64('2005-01-01'))
+    regime = Regime(h, earth, epoch=epochs, f107=[70.0, 250.0])
+    distributions = {'C_D': ('normal', 2.2, 0.2), 'eff_intake': ('uniform', 0.4, 0.8),
+                     'Isp': lambda rng, n: rng.choice([2000.0, 4000.0], size=n)}
+    out = {key: np.empty((1000, len(h))) for key in ('m_gain', 'P_req', 'refuel_time')}
+    results = Get_MonteCarlo(regime, distributions, 1000, seed=3, out=out)
+    samples = results['samples']
+
+    # Every sample is the same as the single design models with its own parameters and epoch
+    sc = dict(spacecraft, **{key: samples[key][:, None, None] for key in distributions})
+    m_gain = Getm_gain(regime, sc)[0][np.arange(1000), samples['epoch']]
+    P_req = Get_PowReq(regime, sc)[0][np.arange(1000), samples['epoch']]
+    np.testing.assert_allclose(out['m_gain'], m_gain, rtol=1e-10, atol=1e-20)
+    np.testing.assert_allclose(out['P_req'], P_req, rtol=1e-12)
+    np.testing.assert_array_equal(results['m_gain'], np.percentile(out['m_gain'], [5, 25, 50, 75, 95], axis=0))
+    np.testing.assert_array_equal(results['gain_probability'], np.mean(out['m_gain'] > 0, axis=0))
+
+    # The same seed gives the same results with any chunk size
+    chunked = Get_MonteCarlo(regime, distributions, 1000, seed=3, chunk_size=3000)
+    for key in ('m_gain', 'P_req', 'refuel_time', 'feasible_probability'):
+        np.testing.assert_array_equal(chunked[key], results[key])
+    assert not np.array_equal(Get_MonteCarlo(regime, distributions, 1000, seed=4)['m_gain'], results['m_gain'])
@@ -0,0 +1,199 @@
+import os
+import multiprocessing
+import numpy as np
+import pytest
+
+from GMATAnalysis.atmos_functions import GetComposition, GetMassFlow, GetMassFlowMatrix, GetMassFlowStream, GetPassStatistics, GetCumulativeMass, TimeToMass, IterCumulativeMass, GetTimeToMassStream, CompositionCache, CompositionGrid, SPECIES
+from GMATAnalysis.data import ReadGeoPos, SpaceWeather
+from spacecraft import spacecraft
+from conftest import fake_msis_values
+
+GEOPOS = os.path.join(os.path.dirname(__file__), os.pardir, 'GMAT_Data', 'GeoPosData.txt')
+
+
+@pytest.mark.parametrize('h_max', [None, 150])
+def test_mass_flow_matrix(fake_msis, h_max):
+    states = ReadGeoPos(GEOPOS, cache=False)
+    composition = GetComposition(states)
+    m_dot, m_total = GetMassFlow(states, composition, h_max=h_max)
+
+    # Same result as integrating each species on its own
+    active = states['altitude'] < h_max if h_max is not None else 1
+    for key in SPECIES:
+        expected = composition[key] * states['velocity'] * spacecraft['A_intake'] * spacecraft['eff_intake'] * active
+        np.testing.assert_allclose(m_dot[key], expected, rtol=1e-12)
+        np.testing.assert_allclose(m_total[key], np.trapezoid(m_dot[key], states['elapsed_seconds']), rtol=1e-12)
+
+    # The matrix output gives the same numbers
+    m_dot_matrix, m_total_matrix = GetMassFlowMatrix(states, GetComposition(states, Matrix=True), h_max=h_max)
+    assert m_dot_matrix.shape == (len(SPECIES), len(states['altitude']))
+    np.testing.assert_array_equal(m_total_matrix, [m_total[key] for key in SPECIES])
+
+    # Single precision mass flow rates, integrated in double precision
+    m_dot_single, m_total_single = GetMassFlowMatrix(states, GetComposition(states, Matrix=True), h_max=h_max, dtype=np.float32)
+    assert m_dot_single.dtype == np.float32 and m_total_single.dtype == np.float64
+    np.testing.assert_allclose(m_dot_single, m_dot_matrix, rtol=1e-6, atol=1e-30)  # The fake atmosphere underflows float32 far up
+    np.testing.assert_allclose(m_total_single, m_total_matrix, rtol=1e-6)
+
+
+def test_pass_statistics():
+    # Five orbits with the perigee between 100 and 140 km, starting and ending inside the atmosphere
+    t = np.linspace(0, 5 * 10800, 5001)
+    perigee = 120 + 20 * np.sin(t / 20000)
+    states = {
+        'altitude': perigee + 2000 * (1 - np.cos(2 * np.pi * t / 10800)),
+        'velocity': 7800 + 0 * t,
+        'elapsed_seconds': t,
+        'date': np.datetime64('2025-01-01') + (t * 1000).astype('timedelta64[ms]')
+    }
+    composition = fake_msis_values(states['altitude'])
+
+    Passes = GetPassStatistics(states, composition, h_max=150)
+    assert len(Passes['start']) == 6
+    assert Passes['start'][0] == 0 and Passes['stop'][-1] == len(t)
+
+    # The passes add up to the total, and match each pass on its own
+    _, m_total = GetMassFlowMatrix(states, composition, h_max=150)
+    np.testing.assert_allclose(Passes['m_total'].sum(axis=1), m_total, rtol=1e-12)
+    for i, (start, stop) in enumerate(zip(Passes['start'], Passes['stop'])):
+        lowest = start + np.argmin(states['altitude'][start:stop])
+        assert Passes['date'][i] == states['date'][lowest]
+        assert Passes['min_altitude'][i] == states['altitude'][lowest]
+        assert Passes['duration'][i] == t[stop - 1] - t[start]
+        assert Passes['max_dynamic_pressure'][i] == np.max(0.5 * composition[start:stop, 0] * 7800**2)
+
+    # No pass
+    Passes = GetPassStatistics(states, composition, h_max=80)
+    assert len(Passes['start']) == 0 and Passes['m_total'].shape == (10, 0)
+
+
+@pytest.mark.parametrize('h_max', [None, 150])
+def test_mass_flow_stream(fake_msis, h_max):
+    states = ReadGeoPos(GEOPOS, cache=False)
+    _, expected = GetMassFlow(states, GetComposition(states), h_max=h_max)
+
+    # Chunks that don't divide the number of rows, and a single row chunk at the end
+    for chunk_rows in (1, 7, 73, 1000):
+        m_total = GetMassFlowStream(GEOPOS, chunk_rows=chunk_rows, h_max=h_max)
+        assert list(m_total) == list(expected)
+        for key in expected:
+            np.testing.assert_allclose(m_total[key], expected[key], rtol=1e-12)
+
+
+def test_cumulative_mass(fake_msis):
+    # Linear mass flow, the captured mass is t + t^2 / 100
+    states = {'elapsed_seconds': np.linspace(0, 100, 11)}
+    m_dot = np.tile(np.linspace(1, 3, 11), (10, 1))
+    cumulative = GetCumulativeMass(states, m_dot)
+    np.testing.assert_allclose(cumulative[0], states['elapsed_seconds'] + states['elapsed_seconds']**2 / 100)
+    times = TimeToMass(states, m_dot, cumulative, [0, 50, 120, 200, 201])
+    np.testing.assert_allclose(times, [0, -50 + np.sqrt(2500 + 5000), -50 + np.sqrt(2500 + 12000), 100, np.inf])
+
+    # Over a trajectory, the curve ends at the total and every sample is found again
+    states = ReadGeoPos(GEOPOS, cache=False)
+    m_dot, m_total = GetMassFlowMatrix(states, GetComposition(states, Matrix=True), h_max=150)
+    cumulative = GetCumulativeMass(states, m_dot)
+    np.testing.assert_allclose(cumulative[:, -1], m_total, rtol=1e-12)
+    first = np.unique(cumulative[0], return_index=True)[1][1:]
+    np.testing.assert_allclose(TimeToMass(states, m_dot, cumulative, cumulative[0, first]), states['elapsed_seconds'][first])
+
+    # The dictionaries of GetMassFlow give the same result
+    m_dot_dict, _ = GetMassFlow(states, GetComposition(states), h_max=150)
+    cumulative_dict = GetCumulativeMass(states, m_dot_dict)
+    np.testing.assert_allclose(cumulative_dict['O'], cumulative[SPECIES.index('O')])
+
+    # In chunks, the running total carries over
+    targets = np.linspace(0, 1.1, 12) * m_total[0]
+    expected = TimeToMass(states, m_dot, cumulative, targets)
+    for chunk_rows in (1, 7, 1000):
+        chunks = list(IterCumulativeMass(GEOPOS, chunk_rows=chunk_rows, h_max=150))
+        np.testing.assert_allclose(np.concatenate([chunk[2] for chunk in chunks], axis=1), cumulative, rtol=1e-12, atol=1e-300)
+        np.testing.assert_allclose(GetTimeToMassStream(GEOPOS, targets, chunk_rows=chunk_rows, h_max=150), expected, rtol=1e-12)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='The fake MSIS only reaches the workers when they are forked')
+def test_composition_parallel(fake_msis):
+    states = ReadGeoPos(GEOPOS, cache=False)
+    serial = GetComposition(states)
+    parallel = GetComposition(states, workers=3, chunk_size=10)
+
+    for key in serial:
+        np.testing.assert_array_equal(parallel[key], serial[key])
+
+
+def test_composition_cache(fake_msis, tmp_path):
+    states = ReadGeoPos(GEOPOS, cache=False)
+    cache = CompositionCache(tmp_path / 'cache')
+
+    # The second call reads the stored result instead of running MSIS
+    first = GetComposition(states, cache=cache)
+    second = GetComposition(states, cache=cache)
+    assert len(fake_msis) == 1
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    for key in first:
+        np.testing.assert_array_equal(first[key], second[key])
+
+    # Other positions are a different entry
+    other = dict(states, altitude=states['altitude'] + 1)
+    GetComposition(other, cache=cache)
+    assert len(fake_msis) == 2
+    assert cache.stats()['entries'] == 2
+
+    # With room for a single entry, the least recently used one is deleted
+    os.utime(os.path.join(cache.folder, cache.key(states['date'], states['longitude'], states['latitude'], states['altitude']) + '.npy'), (0, 0))
+    cache.max_bytes = cache.stats()['bytes'] / 2
+    GetComposition(dict(states, altitude=states['altitude'] + 2), cache=cache)
+    assert cache.stats()['entries'] == 1
+    GetComposition(states, cache=cache)
+    assert len(fake_msis) == 4
+
+
+def test_composition_grid(fake_msis):
+    states = ReadGeoPos(GEOPOS, cache=False)
+    grid = CompositionGrid(dh=5, dlat=1, dlon=1, dt=600, check_samples=50)
+
+    # The fake atmosphere is exponential in altitude, so interpolating its log between nodes is exact
+    composition = GetComposition(states, grid=grid, Matrix=True)
+    np.testing.assert_allclose(composition, fake_msis_values(states['altitude']), rtol=1e-9, atol=1e-200)
+    stats = grid.stats()
+    assert stats['msis_points'] == stats['nodes'] == fake_msis[0]
+    assert stats['check_points'] == 50 and stats['max_error'] < 1e-9
+
+    # A second pass over the same cells only runs MSIS for the checked samples
+    GetComposition(states, grid=grid, Matrix=True)
+    assert grid.stats()['msis_points'] == stats['msis_points']
+    assert fake_msis[2:] == [50]
+    assert grid.stats()['hit_rate'] > stats['hit_rate']
+
+    # The nodes don't depend on how the trajectory is split
+    for total in GetMassFlowStream(GEOPOS, chunk_rows=7, grid=grid).values():
+        assert np.isfinite(total)
+    assert grid.stats()['msis_points'] == stats['msis_points']
+
+
+def test_composition_cache_folder(tmp_path, monkeypatch):
+    # The default folder is in the repository, not in the current directory
+    monkeypatch.chdir(tmp_path)
+    cache = CompositionCache()
+    assert os.path.samefile(cache.folder, os.path.join(os.path.dirname(GEOPOS), 'composition_cache'))
+    assert os.listdir(tmp_path) == []
+
+
+def test_composition_space_weather(fake_msis, tmp_path):
+    states = ReadGeoPos(GEOPOS, cache=False)
+    with open(tmp_path / 'SW-All.csv', 'w') as file:
+        file.write('DATE,F10.7_OBS,F10.7_OBS_CENTER81,AP_AVG\n')
+        for i, day in enumerate(np.arange(np.datetime64('2024-12-01'), np.datetime64('2026-01-01'))):
+            file.write(f'{day},{100 + i % 50},150,{i % 10}\n')
+    space_weather = SpaceWeather(tmp_path / 'SW-All.csv')
+
+    # The fake atmosphere is proportional to the F10.7 of the previous day
+    composition = GetComposition(states, space_weather=space_weather)
+    f107 = 100 + ((states['date'].astype('datetime64[D]') - np.datetime64('2024-12-01')).astype(int) - 1) % 50
+    np.testing.assert_allclose(composition['rho'], fake_msis_values(states['altitude'], f107)[:, 0], rtol=1e-12)
+
+    # Different space weather is a different cache entry
+    cache = CompositionCache(tmp_path / 'cache')
+    GetComposition(states, cache=cache)
+    GetComposition(states, cache=cache, space_weather=space_weather)
+    assert cache.stats()['misses'] == 2
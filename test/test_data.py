@@ -0,0 +1,208 @@
+import os
+import numpy as np
+import pytest
+import pymsis.utils
+from datetime import datetime
+
+from GMATAnalysis.data import ReadGeoPos, ReadReport, ReadState, SpaceWeather, StateToGeoPos, FindPasses, PassMask, CropData, EciToGeodetic, RelativeWind, WGS84_RADIUS, WGS84_FLATTENING, EARTH_ROTATION
+
+DATA = os.path.join(os.path.dirname(__file__), os.pardir, 'GMAT_Data')
+GEOPOS = os.path.join(DATA, 'GeoPosData.txt')
+STATE = os.path.join(DATA, 'StateVectorTest1.txt')
+
+
+def read_reference(filepath):
+    # Simple line by line reading of a GeoPos report
+    rows = [line.split() for line in open(filepath).readlines()[1:]]
+    return {
+        'altitude': np.array([float(p[0]) for p in rows]),
+        'latitude': np.array([float(p[1]) for p in rows]),
+        'longitude': np.array([float(p[2]) for p in rows]),
+        'date': np.array([datetime.strptime(' '.join(p[3:7]), '%d %b %Y %H:%M:%S.%f') for p in rows], dtype='datetime64[ms]'),
+        'velocity': np.array([float(p[7]) * 1000 for p in rows]),
+        'elapsed_seconds': np.array([float(p[8]) for p in rows])
+    }
+
+
+def test_read_geopos(tmp_path):
+    expected = read_reference(GEOPOS)
+    states = ReadGeoPos(GEOPOS, cache=False)
+
+    assert list(states) == list(expected)
+    for key in expected:
+        np.testing.assert_array_equal(states[key], expected[key])
+
+    # A value wider than its column breaks the alignment, the whitespace fallback gives the same result
+    lines = open(GEOPOS).readlines()
+    lines[5] = lines[5].replace('         ', ' ', 1)
+    misaligned = tmp_path / 'misaligned.txt'
+    misaligned.write_text(''.join(lines).rstrip('\n'))
+
+    states = ReadGeoPos(misaligned, cache=False)
+    for key in expected:
+        np.testing.assert_array_equal(states[key], expected[key])
+
+
+def test_read_report_columns():
+    report = ReadReport(STATE)
+
+    assert list(report)[:3] == ['TestSC.EarthMJ2000Eq.VX', 'TestSC.EarthMJ2000Eq.VY', 'TestSC.EarthMJ2000Eq.VZ']
+    np.testing.assert_array_equal(np.column_stack(list(report.values())), np.loadtxt(STATE, skiprows=1))
+
+
+def test_read_cache(tmp_path):
+    filepath = tmp_path / 'GeoPosData.txt'
+    filepath.write_bytes(open(GEOPOS, 'rb').read())
+    expected = ReadGeoPos(GEOPOS, cache=False)
+
+    # The first read creates the cache, the second one memory-maps it
+    ReadGeoPos(filepath, cache=True)
+    assert (tmp_path / 'GeoPosData.txt.cache' / 'manifest.json').exists()
+    report = ReadReport(filepath, cache=True)
+    assert all(isinstance(values, np.memmap) for values in report.values())
+    states = ReadGeoPos(filepath, cache=True)
+    for key in expected:
+        np.testing.assert_array_equal(states[key], expected[key])
+
+    # Touching the file keeps the cache
+    os.utime(filepath, ns=(0, 0))
+    assert isinstance(ReadReport(filepath, cache=True)['TestSC.Earth.Altitude'], np.memmap)
+
+    # Changing the contents rebuilds it, even with the same size
+    text = filepath.read_text()
+    filepath.write_text(text.replace('8620.371027052501', '9620.371027052501', 1))
+    states = ReadGeoPos(filepath, cache=True)
+    assert states['altitude'][0] == 9620.371027052501
+    assert isinstance(ReadReport(filepath, cache=True)['TestSC.Earth.Altitude'], np.memmap)
+
+    # ReadState uses the cache too
+    state = tmp_path / 'StateVectorTest1.txt'
+    state.write_bytes(open(STATE, 'rb').read())
+    np.testing.assert_array_equal(ReadState(state, cache=True), np.loadtxt(STATE, skiprows=1))
+    np.testing.assert_array_equal(ReadState(state, cache=True), np.loadtxt(STATE, skiprows=1))
+    assert (tmp_path / 'StateVectorTest1.txt.cache' / 'manifest.json').exists()
+
+
+def test_read_cache_rebuild(tmp_path):
+    # Arrays of an older cache stay readable after the report shrinks and the cache is rebuilt
+    filepath = tmp_path / 'GeoPosData.txt'
+    lines = open(GEOPOS).readlines()
+    filepath.write_text(''.join(lines))
+    ReadReport(filepath, cache=True)
+    old = ReadReport(filepath, cache=True)
+    expected = {key: np.array(values) for key, values in old.items()}
+
+    filepath.write_text(''.join(lines[:len(lines) // 10]))
+    new = ReadReport(filepath, cache=True)
+    assert len(new['TestSC.Earth.Altitude']) == len(lines) // 10 - 1
+    for key in expected:
+        np.testing.assert_array_equal(old[key], expected[key])
+    assert not any(name.endswith('.tmp') for name in os.listdir(tmp_path / 'GeoPosData.txt.cache'))
+
+
+def test_state_to_geopos():
+    # The state vector file and the GeoPos file come from the same GMAT run
+    states = StateToGeoPos(ReadState(STATE, cache=False), np.datetime64('2025-01-01T12:00:37.184'))
+    geopos = ReadGeoPos(GEOPOS, cache=False)
+    assert np.all(np.abs(states['date'] - geopos['date']) <= np.timedelta64(1, 'ms'))
+    np.testing.assert_allclose(states['altitude'], geopos['altitude'], atol=1e-3)
+    np.testing.assert_allclose(states['latitude'], geopos['latitude'], atol=3e-3)
+    np.testing.assert_allclose((states['longitude'] - geopos['longitude'] + 180) % 360 - 180, 0, atol=1e-3)
+
+    # The atmosphere rotates with the Earth, v - w x r
+    state = ReadState(STATE, cache=False)
+    v_rel = state[:, :3] - np.cross([0, 0, EARTH_ROTATION], state[:, 3:6])
+    np.testing.assert_allclose(RelativeWind(state[:, 3:6], state[:, :3]), v_rel, rtol=1e-12)
+    np.testing.assert_allclose(states['velocity'], np.linalg.norm(v_rel, axis=1) * 1000, rtol=1e-12)
+    assert np.all(states['velocity'] < geopos['velocity'])
+
+    # Over the poles, at J2000 where there is no precession
+    b = WGS84_RADIUS * (1 - WGS84_FLATTENING)
+    altitude, latitude, _ = EciToGeodetic([[0, 0, b + 100], [0, 0, -b - 200]], np.repeat(np.datetime64('2000-01-01T12:00:00'), 2))
+    np.testing.assert_allclose(altitude, [100, 200])
+    np.testing.assert_allclose(latitude, [90, -90])
+
+
+@pytest.mark.parametrize('altitude', [
+    [200, 120, 100, 130, 200, 90, 200],  # two passes
+    [100, 120, 200, 200, 140],  # passes cut by the start and the end of the data
+    [200, 300],  # no pass
+    [100, 100],  # always inside
+])
+def test_find_passes(altitude):
+    altitude = np.array(altitude, dtype=float)
+    passes = FindPasses(altitude, 150)
+
+    # Same runs as a simple loop
+    expected, start = [], None
+    for i, h in enumerate(np.append(altitude, np.inf)):
+        if h < 150 and start is None:
+            start = i
+        elif h >= 150 and start is not None:
+            expected.append([start, i])
+            start = None
+    np.testing.assert_array_equal(passes, np.array(expected, dtype=int).reshape(-1, 2))
+    np.testing.assert_array_equal(PassMask(passes, len(altitude)), altitude < 150)
+
+
+def test_crop_data():
+    states = ReadGeoPos(GEOPOS, cache=False)
+    geopos, velhist = CropData(states, states, 150)
+    keep = states['altitude'] <= 150
+    assert keep.any() and not keep.all()
+    for key in geopos:
+        np.testing.assert_array_equal(geopos[key], states[key][keep])
+    np.testing.assert_array_equal(velhist['velocity'], states['velocity'][keep])
+
+
+def write_space_weather(filepath, n_days, seed=0):
+    # Random space weather in the CelesTrak SW-All.csv format, with a radio burst and a monthly prediction row
+    rng = np.random.default_rng(seed)
+    header = ('DATE,BSRN,ND,KP1,KP2,KP3,KP4,KP5,KP6,KP7,KP8,KP_SUM,AP1,AP2,AP3,AP4,AP5,AP6,AP7,AP8,AP_AVG,CP,C9,ISN,'
+              'F10.7_OBS,F10.7_ADJ,F10.7_DATA_TYPE,F10.7_OBS_CENTER81,F10.7_OBS_LAST81,F10.7_ADJ_CENTER81,F10.7_ADJ_LAST81')
+    lines = [header]
+    for i, day in enumerate(np.datetime64('2020-01-01') + np.arange(n_days)):
+        ap = rng.integers(0, 100, 8)
+        f107 = 500.0 if i == 5 else round(rng.uniform(65, 250), 1)
+        f107a = round(rng.uniform(65, 250), 1)
+        lines.append(f'{day},1,1,{",".join(["10"] * 8)},80,{",".join(map(str, ap))},{int(ap.mean())},0.1,0,100,'
+                     f'{f107},{f107},{"PRD" if i > n_days - 5 else "OBS"},{f107a},{f107a},{f107a},{f107a}')
+    lines.append(f'{np.datetime64("2020-01-01") + n_days},,,,,,,,,,,,,,,,,,,,,,,,100.0,100.0,PRM,100.0,100.0,100.0,100.0')
+    with open(filepath, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def test_space_weather(tmp_path, monkeypatch):
+    filepath = tmp_path / 'SW-All.csv'
+    write_space_weather(filepath, 60)
+    sw = SpaceWeather(filepath)
+    assert sw.dates[-1] == np.datetime64('2020-02-29')
+
+    # Same values as pymsis reading the same file
+    monkeypatch.setattr(pymsis.utils, '_F107_AP_PATH', filepath)
+    monkeypatch.setattr(pymsis.utils, '_DATA', None)
+    dates = np.datetime64('2020-01-01') + np.random.default_rng(1).integers(0, 60 * 86400_000, 10_000).astype('timedelta64[ms]')
+    dates = np.concatenate([dates, np.array(['2020-01-01T00:00', '2020-01-06T02:59:59.999', '2020-02-29T23:59:59.999'], dtype='datetime64[ms]')])
+    with pytest.warns(UserWarning):
+        expected = pymsis.utils.get_f107_ap(dates)
+    for values, reference in zip(sw(dates), expected):
+        np.testing.assert_array_equal(values, reference)
+
+    with pytest.raises(ValueError):
+        sw(np.array(['2020-03-01'], dtype='datetime64[ms]'))
+
+    # The binary search used for files with missing days gives the same values, for shuffled and sorted dates
+    sw._contiguous = False
+    for order in (dates, np.sort(dates)):
+        for values, reference in zip(sw(order), SpaceWeather(filepath)(order)):
+            np.testing.assert_array_equal(values, reference)
+
+    # Dates on a missing day use the last values before them
+    lines = open(filepath).readlines()
+    with open(filepath, 'w') as file:
+        file.writelines(lines[:11] + lines[12:])
+    gap = SpaceWeather(filepath)
+    f107, f107a, ap = gap(np.array(['2020-01-10T23:00', '2020-01-11T05:00', '2020-01-12T01:00'], dtype='datetime64[ms]'))
+    assert f107a[0] == f107a[1] != f107a[2]
+    np.testing.assert_array_equal(ap[1], ap[0])
+    assert f107[2] == sw.f107[10]  # F10.7 observed on 2020-01-10
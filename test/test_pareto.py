@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from AltitudeAnalysis.pareto import pareto_front, ParetoFront
+
+
+def brute_force(a, b, c):
+    # Points not dominated by any other, and the first of equal points
+    front = []
+    for i in range(len(a)):
+        if not (np.isfinite(a[i]) and np.isfinite(b[i]) and np.isfinite(c[i]) and b[i] > 0):
+            continue
+        valid = np.isfinite(a) & np.isfinite(b) & np.isfinite(c) & (b > 0)
+        better = (a <= a[i]) & (b <= b[i]) & (c <= c[i]) & valid
+        strictly = (a < a[i]) | (b < b[i]) | (c < c[i])
+        equal = better & ~strictly & (np.arange(len(a)) < i)
+        if not np.any(better & strictly) and not np.any(equal):
+            front.append(i)
+    return np.array(front, dtype=int)
+
+
+@pytest.mark.parametrize('n_levels', [1, 5, 300])
+def test_pareto_front(n_levels):
+    rng = np.random.default_rng(n_levels)
+    n = 2000
+    power = rng.integers(1, 100, n).astype(float)
+    time = rng.integers(1, 100, n) / power
+    altitude = rng.integers(0, n_levels, n) * 10.0
+    time[:20] = [np.inf, np.nan, -1] * 6 + [0, 0]
+
+    idx = pareto_front(power, time, altitude)
+    np.testing.assert_array_equal(np.sort(idx), brute_force(power, time, -altitude))
+    assert np.all(np.diff(power[idx]) >= 0)
+
+    # Lower altitudes are better
+    np.testing.assert_array_equal(np.sort(pareto_front(power, time, altitude, maximize_altitude=False)),
+                                  brute_force(power, time, altitude))
+
+    # Without altitude
+    np.testing.assert_array_equal(np.sort(pareto_front(power, time)), brute_force(power, time, np.zeros(n)))
+
+
+def test_pareto_unique_altitudes():
+    # Every point at a different altitude, with repeated powers and times
+    rng = np.random.default_rng(7)
+    n = 3000
+    power = rng.integers(1, 50, n).astype(float)
+    time = rng.integers(1, 50, n).astype(float)
+    altitude = rng.uniform(100, 300, n)
+    altitude[:10] = altitude[10:20]
+
+    idx = pareto_front(power, time, altitude)
+    np.testing.assert_array_equal(np.sort(idx), brute_force(power, time, -altitude))
+    np.testing.assert_array_equal(np.sort(pareto_front(power, time, altitude, maximize_altitude=False)),
+                                  brute_force(power, time, altitude))
+
+    # Nothing left after dropping the points without mass gain
+    assert len(pareto_front(power, -time, altitude)) == 0
+
+
+def test_pareto_grid_and_chunks():
+    # Isp x T_max grid, with the altitude given per thrust
+    rng = np.random.default_rng(0)
+    power = rng.uniform(1, 10, (40, 50))
+    time = rng.uniform(1, 10, (40, 50))
+    altitude = np.linspace(100, 200, 50)
+    idx = pareto_front(power, time, altitude[None, :])
+    np.testing.assert_array_equal(np.sort(idx), brute_force(power.ravel(), time.ravel(), -np.tile(altitude, 40)))
+
+    # The same front from chunks of rows, with the row of each point stored
+    front = ParetoFront()
+    for rows in np.array_split(np.arange(40), 7):
+        front.update(power[rows], time[rows], altitude[None, :], row=rows[:, None], col=np.arange(50)[None, :])
+    assert len(front) == len(idx)
+    assert front.n_points == power.size
+    np.testing.assert_array_equal(front.power, power.ravel()[idx])
+    np.testing.assert_array_equal(front.data['row'] * 50 + front.data['col'], idx)
+
+    with pytest.raises(ValueError):
+        front.update(power, time)
@@ -0,0 +1,82 @@
+import os
+import numpy as np
+
+from GMATAnalysis.data import ReadState, SpaceWeather
+from GMATAnalysis.propagator import Propagate, OrbitState
+from GMATAnalysis.atmos_functions import GetComposition, GetMassFlow
+from conftest import fake_msis_values
+
+STATE = os.path.join(os.path.dirname(__file__), os.pardir, 'GMAT_Data', 'StateVectorTest1.txt')
+
+
+class FakeTable:
+    # Exponential atmosphere from 0 to 1000 km, used like a DensityTable
+    h = np.array([0.0, 1000.0])
+
+    def __init__(self, scale:float=1):
+        self.scale = scale
+
+    def __call__(self, h):
+        return fake_msis_values(h) * self.scale
+
+
+def test_propagate_gmat():
+    # The GMAT run has J2 gravity and no drag, one orbit with the perigee at 120 km
+    state = ReadState(STATE, cache=False)
+    States = Propagate(state[0, 3:6], state[0, 0:3], '2025-01-01T12:00:37.184', state[-1, 7], step=10, mass=7000,
+                       thrust=None, table=FakeTable(0))
+    assert States['r'].shape == (len(States['altitude']), 3)
+    assert np.linalg.norm(States['r'][-1] - state[-1, 3:6]) < 1
+    np.testing.assert_array_equal(States['mass'], 7000)
+    assert abs(States['altitude'].min() - 116) < 1
+
+
+def test_propagate_batch():
+    r, v = OrbitState([150, 200, 300], 1000, inclination=[0, 45, 90])
+    sc_parameters = {'A_intake': 1, 'eff_intake': 0.5, 'A_ref': 1, 'C_D': 2.2, 'Isp': 3000, 'g0': 9.81,
+                     'T_max': [1e-3, 1e-3, 10]}
+    States = Propagate(r, v, '2025-01-01', 3000, step=20, sc_parameters=sc_parameters, table=FakeTable(), save_every=5)
+    assert States['altitude'].shape == (3, 31)
+    np.testing.assert_allclose(States['altitude'][:, 0], [150, 200, 300], atol=1e-3)
+
+    # Every spacecraft gives the same result alone
+    single = Propagate(r[1], v[1], '2025-01-01', 3000, step=20, sc_parameters=dict(sc_parameters, T_max=1e-3),
+                       table=FakeTable(), save_every=5)
+    np.testing.assert_array_equal(States['date'][1], single.pop('date'))
+    for key in single:
+        np.testing.assert_allclose(States[key][1], single[key], rtol=1e-12, atol=1e-12)
+
+    # The engine follows the drag up to T_max, and the tank fills when the intake takes more than the engine spends
+    np.testing.assert_array_equal(States['thrust'], np.minimum(States['drag'], [[1e-3], [1e-3], [10]]))
+    assert States['mass'][2, -1] > States['mass'][2, 0]
+
+    # A trajectory is ready for the mass flow pipeline
+    trajectory = {key: value[0] for key, value in States.items()}
+    composition = GetComposition(trajectory, table=FakeTable(), verbose=False)
+    m_dot, m_total = GetMassFlow(trajectory, composition)
+    assert m_total['rho'] > 0
+
+
+def test_propagate_space_weather(fake_msis, tmp_path):
+    # Without a table NRLMSIS gets the space weather of every date, the fake atmosphere is proportional to F10.7
+    with open(tmp_path / 'SW-All.csv', 'w') as file:
+        file.write('DATE,F10.7_OBS,F10.7_OBS_CENTER81,AP_AVG\n')
+        for day in np.arange(np.datetime64('2024-12-01'), np.datetime64('2025-02-01')):
+            file.write(f'{day},300,300,10\n')
+
+    r, v = OrbitState(150, 1000)
+    States = Propagate(r, v, '2025-01-01', 100, step=20, thrust=None, space_weather=SpaceWeather(tmp_path / 'SW-All.csv'))
+    reference = Propagate(r, v, '2025-01-01', 100, step=20, thrust=None)
+    np.testing.assert_allclose(States['drag'][:, 0], 2 * reference['drag'][:, 0], rtol=1e-12)
+
+
+def test_propagate_dry_mass():
+    # Thrusting far more than the intake collects empties the tank, then the engine only spends the air it takes in
+    r, v = [value[0] for value in OrbitState(300, 1000)]
+    sc_parameters = {'A_intake': 1, 'eff_intake': 0.5, 'A_ref': 1, 'C_D': 2.2, 'Isp': 100, 'g0': 9.81, 'T_max': 1}
+    States = Propagate(r, v, '2025-01-01', 2000, step=20, sc_parameters=sc_parameters, mass=101, dry_mass=100,
+                       thrust='max', table=FakeTable())
+    assert States['mass'].min() == 100 and States['mass'][-1] == 100
+    assert States['thrust'][-1] < 1
+    np.testing.assert_array_equal(Propagate(r, v, '2025-01-01', 100, step=20, sc_parameters=sc_parameters, mass=200,
+                                            dry_mass=100, thrust='max', table=FakeTable())['thrust'], 1)
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from AltitudeAnalysis.classes import Regime, DensityTable
+from AltitudeAnalysis.altitude_analysis import Getm_gain, Get_PowReq, earth
+from spacecraft import spacecraft
+from conftest import fake_msis_values
+
+
+def test_regime_runs_msis_once(fake_msis):
+    h = np.linspace(70, 300, 1000)
+    regime = Regime(h, earth)
+
+    # A full sweep uses the atmosphere several times
+    Getm_gain(regime, spacecraft)
+    Get_PowReq(regime, spacecraft)
+    regime.atmos(Composition=True)
+
+    assert regime.msis_calls == 1
+    assert fake_msis == [1000]
+
+
+def test_regime_cache_cleared(fake_msis):
+    regime = Regime(np.linspace(70, 300, 100), earth)
+    rho = regime.atmos().copy()
+    v = regime.v_circ().copy()
+
+    # Changing the epoch reruns MSIS
+    regime.epoch = np.datetime64('2010-06-01T00:00:00')
+    regime.atmos()
+    assert regime.msis_calls == 2
+
+    # Changing the altitudes reruns MSIS and the velocity
+    regime.h = np.linspace(100, 200, 50)
+    assert regime.atmos().shape == (50,)
+    assert regime.v_circ().shape == (50,)
+    assert regime.msis_calls == 3
+
+    # The stored arrays can't be modified in place
+    with pytest.raises(ValueError):
+        regime.h[0] = 0
+    with pytest.raises(ValueError):
+        regime.atmos()[0] = 0
+
+    np.testing.assert_allclose(rho, Regime(np.linspace(70, 300, 100), earth).atmos())
+    np.testing.assert_allclose(v, Regime(np.linspace(70, 300, 100), earth).v_circ())
+
+
+def test_density_table(fake_msis, tmp_path):
+    # The fake atmosphere is exponential, so log-linear interpolation is exact
+    table = DensityTable.build(70, 500, dh=1)
+    h = np.random.default_rng(0).uniform(70, 500, 1000)
+    np.testing.assert_allclose(table(h), fake_msis_values(h), rtol=1e-9)
+
+    # Save and load
+    table.save(tmp_path / 'table.npz')
+    loaded = DensityTable.load(tmp_path / 'table.npz', method='pchip')
+    assert loaded.epoch == table.epoch
+    np.testing.assert_allclose(loaded(h), table(h), rtol=1e-6)
+
+    # A regime using the table doesn't run MSIS
+    regime = Regime(h, earth, table=loaded)
+    np.testing.assert_allclose(regime.atmos(), fake_msis_values(h)[:, 0], rtol=1e-6)
+    assert regime.msis_calls == 0
+    assert fake_msis == [431]
+
+    with pytest.raises(ValueError):
+        table(np.array([60.0]))
+    with pytest.raises(ValueError):
+        Regime(h, earth, epoch=np.datetime64('2020-01-01'), table=table).atmos()
+
+
+def test_regime_epochs(fake_msis):
+    h = np.linspace(70, 300, 100)
+    epochs = np.datetime64('2000-01-01') + np.arange(0, 3650, 365).astype('timedelta64[D]')
+    f107 = np.linspace(70, 250, 10)
+    regime = Regime(h, earth, epoch=epochs, f107=f107, f107a=f107, ap=4)
+
+    # One NRLMSIS call for all the epochs, with the space weather of each one
+    assert regime.atmos(Composition=True).shape == (10, 100, 11)
+    assert fake_msis == [1000]
+    np.testing.assert_allclose(regime.atmos(), fake_msis_values(np.broadcast_to(h, (10, 100)), f107[:, None])[..., 0])
+
+    # Same as one regime per epoch
+    m_gain = Getm_gain(regime, spacecraft)[0]
+    assert m_gain.shape == (10, 100)
+    single = Regime(h, earth, epoch=epochs[3], f107=f107[3], f107a=f107[3], ap=4)
+    np.testing.assert_allclose(m_gain[3], Getm_gain(single, spacecraft)[0], rtol=1e-12)
+
+    # Each epoch is stored, so only new epochs or space weather run NRLMSIS again
+    regime.epoch, regime.f107, regime.f107a = epochs[5:], f107[5:], f107[5:]
+    regime.atmos()
+    assert regime.msis_calls == 1
+    regime.f107 = f107[5:] * 2
+    regime.atmos()
+    assert regime.msis_calls == 2 and fake_msis[-1] == 500
+
+    # Changing the altitudes forgets everything
+    regime.h = h[:50]
+    assert regime.atmos().shape == (5, 50)
+    assert regime.msis_calls == 3
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from AltitudeAnalysis.altitude_analysis import Get_LimitIdx, Get_Drag, Get_DesignSweep, earth
+from AltitudeAnalysis.time_analysis import time_analysis, power_analysis, tiled_analysis, fill_simulation
+from AltitudeAnalysis.classes import Regime, DesignBatch
+from spacecraft import spacecraft
+
+
+def test_limit_idx_matches_argmax():
+    rng = np.random.default_rng(1)
+    h = np.linspace(70, 500, 5000)
+    limits = np.concatenate([rng.uniform(0, 2, 500), [0, 1e-9, 10, 1e6]])
+
+    monotone = np.exp(-h / 20)
+    noisy = monotone * rng.uniform(0.5, 1.5, h.size)  # Not monotone
+    steps = np.round(monotone, 3)  # Repeated values
+
+    for D in (monotone, noisy, steps):
+        for strict in (False, True):
+            mask = D[None, :] < limits[:, None] if strict else D[None, :] <= limits[:, None]
+            expected = np.where(mask.any(axis=1), np.argmax(mask, axis=1), len(D))
+            np.testing.assert_array_equal(Get_LimitIdx(D, limits, strict=strict), expected)
+
+
+def test_time_analysis_unchanged(fake_msis):
+    regime = Regime(np.linspace(70, 500, 2000), earth)
+    T_max = np.linspace(0, 10, 50)
+    Isp = np.linspace(1500, 5000, 40)
+    time = time_analysis(regime, spacecraft, Isp, T_max)
+
+    # Previous implementation with the full T >= D matrix
+    D = Get_Drag(regime, spacecraft)
+    idxs = np.argmax(D[None, :] <= T_max[:, None], axis=1)
+    V_rho = regime.v_circ()[idxs] * regime.atmos()[idxs]
+    thrust_ve = T_max[None, :] / (Isp * spacecraft['g0'])[:, None]
+    expected = spacecraft['Tank_load'] / (spacecraft['A_intake'] * spacecraft['eff_intake'] * V_rho - thrust_ve) / 3600 / 24
+
+    np.testing.assert_array_equal(time, expected)
+
+
+def test_time_analysis_epochs(fake_msis):
+    h = np.linspace(70, 500, 2000)
+    f107 = np.array([70.0, 150.0, 250.0])
+    epochs = np.array(['2001-01-01', '2005-01-01', '2009-01-01'], dtype='datetime64[ms]')
+    T_max = np.linspace(0, 10, 50)
+    Isp = np.linspace(1500, 5000, 40)
+
+    # One refuel time map per epoch, the same as running each epoch on its own
+    time = time_analysis(Regime(h, earth, epoch=epochs, f107=f107), spacecraft, Isp, T_max)
+    assert time.shape == (3, 40, 50)
+    for i in range(3):
+        expected = time_analysis(Regime(h, earth, epoch=epochs[i], f107=f107[i]), spacecraft, Isp, T_max)
+        np.testing.assert_array_equal(time[i], expected)
+
+
+def test_float32(fake_msis):
+    h = np.linspace(70, 500, 2000)
+    T_max = np.linspace(0.01, 10, 50)
+    Isp = np.linspace(1500, 5000, 40)
+    single = Regime(h, earth, dtype=np.float32)
+    time = time_analysis(single, spacecraft, Isp, T_max)
+    expected = time_analysis(Regime(h, earth), spacecraft, Isp, T_max)
+    assert single.atmos().dtype == single.v_circ().dtype == time.dtype == np.float32
+    np.testing.assert_allclose(time, expected, rtol=1e-3)  # Less precise where the gain is close to 0
+
+    # The tiles give the same single precision results
+    tiled, power = tiled_analysis(single, spacecraft, Isp, T_max, max_memory=4 * 30)
+    np.testing.assert_array_equal(tiled, time)
+    np.testing.assert_array_equal(power, power_analysis(spacecraft, Isp.astype(np.float32), T_max.astype(np.float32)))
+
+    # Changing the dtype converts the stored atmosphere without running NRLMSIS again
+    single.dtype = np.float64
+    assert single.atmos().dtype == np.float64 and single.msis_calls == 1
+    with pytest.raises(ValueError):
+        single.dtype = np.int32
+
+
+def test_tiled_analysis(fake_msis, tmp_path):
+    h = np.linspace(70, 500, 2000)
+    T_max = np.linspace(0, 10, 50)
+    Isp = np.linspace(1500, 5000, 40)
+    regime = Regime(h, earth)
+    time, power = tiled_analysis(regime, spacecraft, Isp, T_max, max_memory=8 * 30)
+    np.testing.assert_array_equal(time, time_analysis(regime, spacecraft, Isp, T_max))
+    np.testing.assert_array_equal(power, power_analysis(spacecraft, Isp, T_max))
+
+    # Several epochs with threads, written to .npy files
+    epochs = Regime(h, earth, epoch=np.array(['2001-01-01', '2009-01-01'], dtype='datetime64[ms]'), f107=[70.0, 250.0])
+    tiled_analysis(epochs, spacecraft, Isp, T_max, time_path=tmp_path / 'time.npy', power_path=tmp_path / 'power.npy',
+                   max_memory=8 * 2 * 100, workers=2)
+    np.testing.assert_array_equal(np.load(tmp_path / 'time.npy'), time_analysis(epochs, spacecraft, Isp, T_max))
+    np.testing.assert_array_equal(np.load(tmp_path / 'power.npy'), power)
+
+
+def test_fill_simulation(fake_msis):
+    regime = Regime(np.linspace(70, 500, 2000), earth)
+    h0 = np.array([150.0, 160.0, 170.0, 180.0])
+    designs = DesignBatch(dict(spacecraft, T_max=[1e3, 1e3, 0.5, 1e-3], P_max=[np.inf, 1e3, np.inf, np.inf]))
+    results = fill_simulation(regime, designs, h0, t_max=1e10)
+    assert results['fill_time'].shape == results['status'].shape == (4, 4)
+
+    # Enough thrust and power, the altitude is kept and the fill time is the refuel time of the design sweep
+    sweep = Get_DesignSweep(Regime(h0, earth), designs[:1])
+    np.testing.assert_allclose(results['fill_time'][0], sweep['refuel_time'][0], rtol=1e-6)
+    np.testing.assert_array_equal(results['altitude'][0], h0)
+    np.testing.assert_array_equal(results['status'][0], 0)
+
+    # Limited by the power or the thrust, the orbit decays until the tank is full or the spacecraft falls
+    for i in (1, 2, 3):
+        done = results['status'][i] < 3
+        assert np.all(results['altitude'][i][done] <= h0[done])
+    assert np.all(results['fill_time'][1] >= results['fill_time'][0])
+    np.testing.assert_array_equal(results['status'][3], 1)
+    assert np.all(results['altitude'][3] < 70)
+    assert np.all(np.isinf(results['fill_time'][3]))
+    np.testing.assert_array_equal(results['filled_fraction'], np.mean(results['status'] == 0, axis=0))